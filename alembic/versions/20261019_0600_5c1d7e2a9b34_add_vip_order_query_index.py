@@ -0,0 +1,39 @@
+"""add vip_order query index
+
+Revision ID: 5c1d7e2a9b34
+Revises: 
+Create Date: 2026-10-19 06:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d7e2a9b34'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 在线建索引，不阻塞订单写入
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_vip_order_user_paid_return_created",
+            "vip_order",
+            ["user_id", "is_paid", "is_return", "created_at"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_vip_order_user_paid_return_created",
+            table_name="vip_order",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,50 @@
+"""add job_queue
+
+Revision ID: 8f3a2b6c4d10
+Revises: 5c1d7e2a9b34
+Create Date: 2026-10-19 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a2b6c4d10'
+down_revision = '5c1d7e2a9b34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 应用启动时 create_all 可能已经建过表
+    if sa.inspect(op.get_bind()).has_table("job_queue"):
+        return
+    op.create_table(
+        "job_queue",
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("queue", sa.String(length=64), nullable=False),
+        sa.Column("dedup_key", sa.String(length=128), nullable=True),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("run_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("locked_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("queue", "dedup_key", name="uq_job_queue_queue_dedup_key"),
+    )
+    op.create_index(
+        "ix_job_queue_queue_status_run_at",
+        "job_queue",
+        ["queue", "status", "run_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_job_queue_queue_status_run_at", table_name="job_queue")
+    op.drop_table("job_queue")
@@ -0,0 +1,56 @@
+"""unique vip_order.trade_no
+
+Revision ID: b7e4c9a1f256
+Revises: 8f3a2b6c4d10
+Create Date: 2026-10-19 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4c9a1f256'
+down_revision = '8f3a2b6c4d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 在线把 ix_vip_order_trade_no 换成唯一索引，不阻塞订单写入；
+    # 已有重复的 trade_no 时建索引会失败，需要先人工处理重复订单
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_vip_order_trade_no_unique",
+            "vip_order",
+            ["trade_no"],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_vip_order_trade_no",
+            table_name="vip_order",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.execute("ALTER INDEX ix_vip_order_trade_no_unique RENAME TO ix_vip_order_trade_no")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_vip_order_trade_no_plain",
+            "vip_order",
+            ["trade_no"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_vip_order_trade_no",
+            table_name="vip_order",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.execute("ALTER INDEX ix_vip_order_trade_no_plain RENAME TO ix_vip_order_trade_no")
@@ -0,0 +1,28 @@
+"""add users.token_version
+
+Revision ID: 3d9a6e1c7f42
+Revises: b7e4c9a1f256
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d9a6e1c7f42'
+down_revision = 'b7e4c9a1f256'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 带常量默认值的 ADD COLUMN 只改元数据，不重写表
+    op.add_column(
+        "users",
+        sa.Column("token_version", sa.Integer(), server_default="0", nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "token_version")
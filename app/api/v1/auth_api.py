@@ -17,7 +17,9 @@ from app.models.order import VipOrder
 from app.models.user import User, UserInfo, CombineUser
 from app.models.vip import Vip
 from app.services.auth_service import AuthService
-from app.db.database import get_db
+from app.services.user_cache_service import user_cache_service
+from app.db.database import get_db, get_session, read_session
+from app.db.routing import read_your_writes, retry_on_primary, replica_lag_tracker
 from app.core.i18n import i18n, get_language
 from app.core.logger import logger
 
@@ -47,8 +49,7 @@ class WeChatUserInfo(BaseModel):
 
 async def get_current_user(
     request: Request,
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
+    token: str = Depends(oauth2_scheme)
 ) -> User:
     lang = get_language(request)
     credentials_exception = HTTPException(
@@ -68,26 +69,86 @@ async def get_current_user(
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-            
-        # 使用异步查询
-        result = await db.execute(select(User).filter(User.id == int(user_id)))
-        user = result.scalar_one_or_none()
-        
+
+        # 优先使用已认证用户缓存
+        iat = int(payload.get("iat", 0))
+        user = user_cache_service.get_user(int(user_id), iat)
+        if user is not None:
+            return user
+
+        # 使用异步查询，副本上查不到且副本落后（如刚注册、复制延迟）时回主库再查一次；
+        # 会话在查询后立即关闭，处理函数执行期间不占用连接
+        async with read_session() as db:
+            read_your_writes(db, int(user_id))
+            result = await db.execute(select(User).filter(User.id == int(user_id)))
+            user = result.scalar_one_or_none()
+            if user is None and await retry_on_primary(db, int(user_id)):
+                result = await db.execute(select(User).filter(User.id == int(user_id)))
+                user = result.scalar_one_or_none()
+
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=i18n.get_text("USER_NOT_FOUND", lang)
             )
-            
+
+        user_cache_service.put_user(user.id, iat, user)
         return user
     except Exception as e:
         raise credentials_exception
 
 
+async def load_combine_user(db: AsyncSession, user_id: int) -> Optional[CombineUser]:
+    """查询用户及其有效VIP订单，VIP已过期或用户不存在时返回None"""
+    result = await db.execute(
+        select(User, VipOrder, Vip)
+        .select_from(User)
+        .outerjoin(VipOrder, (User.id == VipOrder.user_id) &
+                   (VipOrder.is_paid == True) &
+                   (VipOrder.is_return == False))
+        .outerjoin(Vip, VipOrder.vip_id == Vip.id)
+        .where(
+            User.id == user_id,
+            User.vip_expire_date >= datetime.datetime.now()
+        )
+        .order_by(desc(Vip.id))
+    )
+    row = result.first()
+    if not row:
+        # 用户不存在
+        return None
+    user, order, vip = row
+    if order is None or vip is None:
+        order = None
+        vip = None
+
+    combine_user = CombineUser(
+        id=user.id,
+        wechat_openid=user.wechat_openid,
+        is_active=user.is_active,
+        is_vip=user.is_vip,
+        vip_start_date=user.vip_start_date,
+        vip_expire_date=user.vip_expire_date,
+        is_super_admin=user.is_super_admin,
+        token_version=user.token_version,
+    )
+    if order is not None:
+        combine_user.order_id = order.id
+    if vip is not None:
+        combine_user.vip_id = vip.id
+        combine_user.vip_level = vip.level
+    return combine_user
+
+
+async def load_token_version(db: AsyncSession, user_id: int) -> Optional[int]:
+    """查询用户当前的 token_version，用户不存在时返回None"""
+    result = await db.execute(select(User.token_version).where(User.id == user_id))
+    return result.scalar_one_or_none()
+
+
 async def get_current_user_vip(
         request: Request,
-        token: str = Depends(oauth2_scheme),
-        db: AsyncSession = Depends(get_db)
+        token: str = Depends(oauth2_scheme)
 ) -> CombineUser:
     lang = get_language(request)
     credentials_exception = HTTPException(
@@ -108,57 +169,56 @@ async def get_current_user_vip(
         if user_id is None:
             raise credentials_exception
 
-        # 使用异步查询
-        # result = await db.execute(select(User,VipOrder).filter(User.id == int(user_id)))
-        result = await db.execute(
-            select(User, VipOrder, Vip)
-            .select_from(User)
-            .outerjoin(VipOrder, (User.id == VipOrder.user_id) &
-                       (VipOrder.is_paid == True) &
-                       (VipOrder.is_return == False))
-            .outerjoin(Vip, VipOrder.vip_id == Vip.id)
-            .where(
-                User.id == int(user_id),
-                User.vip_expire_date >= datetime.datetime.now()
-            )
-            .order_by(desc(Vip.id))
-        )
-        row = result.first()
-        if row:
-            user, order, vip = row
-            if order is None or vip is None:
-                order = None
-                vip = None
-        else:
-            # 用户不存在
-            user = None
+        # 会话只在缓存未命中时才签出连接，返回前关闭，处理函数执行期间不占用连接
+        async with read_session() as db:
+            # 用户当前的 token_version 优先取缓存，未命中时才按主键查询；
+            # VIP状态变更后令牌声明和VIP缓存都不再命中（其他进程在缓存TTL内生效）
+            token_version = user_cache_service.get_token_version(int(user_id))
+            if token_version is None:
+                read_your_writes(db, int(user_id))
+                token_version = await load_token_version(db, int(user_id))
+                if token_version is None and await retry_on_primary(db, int(user_id)):
+                    token_version = await load_token_version(db, int(user_id))
+                if token_version is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_404_NOT_FOUND,
+                        detail=i18n.get_text("USER_NOT_FOUND", lang)
+                    )
+                user_cache_service.put_token_version(int(user_id), token_version)
 
-        if user is None:
+            # 优先使用令牌中的VIP声明，无需查询VIP订单
+            combine_user = auth_service.combine_user_from_claims(payload, token_version)
+            if combine_user is not None:
+                return combine_user
+
+            # 其次使用已认证用户缓存
+            combine_user = user_cache_service.get_combine_user(int(user_id), token_version)
+            if combine_user is not None:
+                return combine_user
+
+            # 用户存在但没有有效VIP是正常结果，不回主库重查（刚支付的用户由 read_your_writes 走主库）
+            combine_user = await load_combine_user(db, int(user_id))
+        if combine_user is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=i18n.get_text("USER_NOT_FOUND", lang)
             )
 
-        combine_user = CombineUser(
-            id=user.id,
-            wechat_openid=user.wechat_openid,
-            is_active=user.is_active,
-            is_vip=user.is_vip,
-            vip_start_date=user.vip_start_date,
-            vip_expire_date=user.vip_expire_date,
-            is_super_admin=user.is_super_admin,
-
-        )
-        if order is not None:
-            combine_user.order_id = order.id
-        if vip is not None:
-            combine_user.vip_id = vip.id
-            combine_user.vip_level = vip.level
-
+        user_cache_service.put_combine_user(combine_user.id, combine_user.token_version, combine_user)
         return combine_user
     except Exception as e:
         raise credentials_exception
 
+
+def create_user_token(user_id: int, combine_user: Optional[CombineUser] = None) -> str:
+    """签发访问令牌，用户VIP有效时嵌入VIP声明"""
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return auth_service.create_access_token(
+        data={"sub": str(user_id)},
+        expires_delta=access_token_expires,
+        combine_user=combine_user
+    )
+
 @router.post("/auth/wechat-login", response_model=Token)
 async def wechat_login(
     request: Request,
@@ -216,12 +276,10 @@ async def wechat_login(
             db.add(user)
             await db.commit()
             await db.refresh(user)
+            replica_lag_tracker.mark_written(user.id)
         # 创建访问令牌
-        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = auth_service.create_access_token(
-            data={"sub": str(user.id)},
-            expires_delta=access_token_expires
-        )
+        combine_user = await load_combine_user(db, user.id)
+        access_token = create_user_token(user.id, combine_user)
         
         return {
             "access_token": access_token,
@@ -235,6 +293,46 @@ async def wechat_login(
         )
 
 
+@router.post("/auth/token/refresh", response_model=Token)
+async def refresh_token(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    刷新访问令牌接口
+
+    按数据库中的最新VIP状态重新签发令牌（包含VIP声明）。支付完成后客户端应调用此接口，
+    以便后续请求直接从令牌授权。
+
+    Args:
+        request: FastAPI请求对象
+        current_user: 当前登录用户对象
+        db: 数据库会话依赖
+
+    Returns:
+        Token: 包含新访问令牌的响应对象
+
+    Raises:
+        HTTPException:
+            - 401: 未认证或认证失败
+            - 500: 服务器内部错误
+    """
+    lang = get_language(request)
+    try:
+        combine_user = await load_combine_user(db, current_user.id)
+        return {
+            "access_token": create_user_token(current_user.id, combine_user),
+            "token_type": "bearer"
+        }
+    except Exception as e:
+        logger.error(f"Failed to refresh token: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=i18n.get_text("INTERNAL_SERVER_ERROR", lang)
+        )
+
+
 @router.post("/auth/update/userinfo")
 async def update_user_info(
         request: Request,
@@ -296,7 +394,9 @@ async def update_user_info(
             )
             db.add(new_info)
 
-        db.commit()
+        await db.commit()
+        user_cache_service.invalidate_user(current_user.id)
+        replica_lag_tracker.mark_written(current_user.id)
 
         return {
             "code": 0,
@@ -315,7 +415,7 @@ async def update_user_info(
 async def get_user_info(
         request: Request,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_session(read_only=True))
 ):
     """
     获取用户信息接口
@@ -356,6 +456,7 @@ async def get_user_info(
     """
     lang = get_language(request)
     try:
+        read_your_writes(db, current_user.id)
         # 使用 join 查询用户信息和用户基本信息
         # result = db.query(User, UserInfo).outerjoin(UserInfo, User.id == UserInfo.user_id).filter(User.id == current_user.id).first()
         result = await db.execute(select(User, UserInfo).select_from(outerjoin(User, UserInfo, User.id == UserInfo.user_id)).where(User.id == current_user.id))
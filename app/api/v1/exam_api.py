@@ -19,11 +19,12 @@ from app.services.melody_service import melody_service
 from app.services.pitch_service import pitch_service
 from app.services.pitch_settings_service import pitch_settings_service
 from app.services.rhythm_service import rhythm_service
+from app.services.compact_service import compact_service, is_compact_request, vary_accept
 
 router = APIRouter(prefix="/exam", tags=["exam"])
 
 
-@router.post("", response_model=ExamResponse)
+@router.post("", response_model=ExamResponse, dependencies=[Depends(vary_accept)])
 async def generate_exam(
         request: Request,
         exam_request: ExamRequest,
@@ -47,6 +48,7 @@ async def generate_exam(
             - chord: 和弦听写题目
             - rhythm: 节奏听写题目
             - melody: 旋律听写题目
+        ?format=compact 或 Accept: application/vnd.lianer.compact+json 时音高以pitch_number、时值以tick返回
             
     Raises:
         HTTPException:
@@ -96,6 +98,8 @@ async def generate_exam(
             melody=melody,
         )
 
+        if is_compact_request(request):
+            return compact_service.response(compact_service.encode_exam(exam))
         return exam
     except Exception as e:
         logger.error(
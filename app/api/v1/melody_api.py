@@ -1,26 +1,36 @@
 # app/api/v1/rhythm_api.py
 import traceback
 
-from fastapi import APIRouter, Depends, HTTPException,Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
 
 from app.api.v1.auth_api import get_current_user, get_db, get_current_user_vip
 from app.api.v1.schemas.request.pitch_request import MelodySettingRequest
-from app.api.v1.schemas.response.pitch_response import MelodySettingResponse, MelodyQuestionResponse
+from app.api.v1.schemas.response.pitch_response import MelodySettingResponse, MelodyQuestionResponse, \
+    MelodyScorePitch, MelodyAssessmentResponse
+from app.core.config import settings
 from app.core.i18n import i18n, get_language
 from app.models.melody_settings import Tonality, TonalityChoice
 from app.models.user import User, CombineUser
 from app.services.ai_melody_service import ai_melody_service
+from app.services.compact_service import compact_service, is_compact_request, vary_accept
+from app.services.llm_client import LLMRateLimitError
 from app.services.melody_service import melody_service
+from app.services.melody_assessment_service import melody_assessment_service
+from app.services.score_render_service import score_render_service
 from app.models.rhythm import *
 from app.core.logger import logger
 from app.utils.UserChecker import check_year_vip_level
+from app.utils.upload_util import limit_request_body, UploadTooLargeError
 
 router = APIRouter(prefix="/melody", tags=["melody"])
 
 
-@router.post("/generate", response_model=MelodyQuestionResponse)
+@router.post("/generate", response_model=MelodyQuestionResponse, dependencies=[Depends(vary_accept)])
 async def generate_melody_question(
         request: Request,
         melody_question_request: MelodySettingRequest,
@@ -46,6 +56,7 @@ async def generate_melody_question(
         MelodyQuestionResponse: 包含生成的旋律题目数据
             - melody: 旋律数据
             - audio_url: 音频文件URL
+        ?format=compact 或 Accept: application/vnd.lianer.compact+json 时返回紧凑格式
             
     Raises:
         HTTPException:
@@ -61,6 +72,8 @@ async def generate_melody_question(
                 detail=i18n.get_text("USER_VIP_NOT_NORMAL", lang)
             )
         response = melody_service.generate_question(melody_question_request)
+        if is_compact_request(request):
+            return compact_service.response(compact_service.encode_melody_question(response))
         return response
     except Exception as e:
         logger.error(
@@ -71,7 +84,7 @@ async def generate_melody_question(
         )
 
 
-@router.post("/generate/ai", response_model=MelodyQuestionResponse)
+@router.post("/generate/ai", response_model=MelodyQuestionResponse, dependencies=[Depends(vary_accept)])
 async def generate_ai_melody_question(
     request: Request,
     melody_question_request: MelodySettingRequest,
@@ -100,6 +113,7 @@ async def generate_ai_melody_question(
             
     Raises:
         HTTPException:
+            - 429: 请求过于频繁
             - 500: 服务器内部错误
             
     """
@@ -111,7 +125,16 @@ async def generate_ai_melody_question(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=i18n.get_text("USER_VIP_NOT_NORMAL", lang)
             )
-        return await ai_melody_service.generate_melody_question(melody_question_request)
+        response = await ai_melody_service.generate_melody_question(melody_question_request, current_user.id)
+        if is_compact_request(request):
+            return compact_service.response(compact_service.encode_melody_question(response))
+        return response
+    except LLMRateLimitError as e:
+        logger.info(f"AI melody rate limited: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=i18n.get_text("TOO_MANY_REQUESTS", lang)
+        )
     except Exception as e:
         logger.error(
             f"Error in generate_ai_melody_question : {str(e)}\nTraceback: {traceback.format_exc()}")
@@ -121,6 +144,92 @@ async def generate_ai_melody_question(
         )
 
 
+@router.post("/render")
+async def render_melody_audio(
+    request: Request,
+    score: MelodyScorePitch,
+    audio_format: str = Query(None, description="opus 或 wav，默认 SCORE_RENDER_FORMAT"),
+    click: bool = Query(False, description="是否叠加节拍器"),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    渲染旋律音频接口
+
+    把生成接口返回的旋律（options中的一项）按其tempo用钢琴采样渲染成音频，边渲染边返回，
+    客户端收到首块即可开始播放。相同乐谱的结果按指纹缓存，ETag为乐谱指纹。
+
+    Raises:
+        HTTPException:
+            - 400: 参数错误（格式不支持、缺少采样、乐谱过长等）
+            - 500: 服务器内部错误
+    """
+    lang = get_language(request)
+    try:
+        return await score_render_service.response(request, score, audio_format, click)
+    except ValueError as e:
+        logger.error(f"Error in render_melody_audio: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=i18n.get_text("BAD_REQUEST", lang)
+        )
+    except Exception as e:
+        logger.error(f"Error in render_melody_audio : {str(e)}\nTraceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=i18n.get_text("INTERNAL_SERVER_ERROR", lang)
+        )
+
+
+@router.post("/assess", response_model=MelodyAssessmentResponse)
+async def assess_melody_singing(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+):
+    """
+    视唱评分接口
+
+    multipart/form-data 上传：
+        - score: 生成接口返回的旋律（options中的一项）JSON
+        - file: 演唱录音（wav/mp3/ogg/flac）
+    录音随请求体流式写入临时文件（超过1MB才落盘），超过 MELODY_ASSESS_MAX_UPLOAD_BYTES 直接拒绝；
+    分析在线程池中执行，只做一次逐帧基频和起音计算，DTW对齐后返回每个音的音分误差和节奏误差。
+
+    Raises:
+        HTTPException:
+            - 400: 旋律或录音无法解析
+            - 413: 录音过大
+            - 500: 服务器内部错误
+    """
+    lang = get_language(request)
+    try:
+        upload_request = limit_request_body(request, settings.MELODY_ASSESS_MAX_UPLOAD_BYTES)
+        form = await upload_request.form(max_files=1, max_fields=1)
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile) or not isinstance(form.get("score"), str):
+            raise ValueError("score and file are required")
+        score = MelodyScorePitch.model_validate_json(form["score"])
+        audio = await run_in_threadpool(melody_assessment_service.decode, upload.file)
+        return await run_in_threadpool(melody_assessment_service.assess, audio, score)
+    except UploadTooLargeError as e:
+        logger.info(f"Rejected melody assessment upload: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=i18n.get_text("BAD_REQUEST", lang)
+        )
+    except (ValueError, ValidationError) as e:
+        logger.info(f"Invalid melody assessment request: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=i18n.get_text("PITCH_FILE_ERROR", lang)
+        )
+    except Exception as e:
+        logger.error(f"Error in assess_melody_singing : {str(e)}\nTraceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=i18n.get_text("INTERNAL_SERVER_ERROR", lang)
+        )
+
+
 @router.get("/settings", response_model=MelodySettingResponse)
 async def get_melody_settings():
     """节奏听写设置选项"""
@@ -3,22 +3,30 @@ from __future__ import annotations
 import traceback
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import Optional
-from pydantic import BaseModel
+from typing import Optional, Any
+from pydantic import BaseModel, Field
 from datetime import datetime
 
-from app.services.order_service import OrderService
+from app.services.order_service import OrderService, PAYMENT_NOTIFY_QUEUE
+from app.services.job_queue_service import job_queue_service
 from app.models.user import User
 from app.models.order import VipOrder
 from app.api.v1.auth_api import get_current_user, get_db
+from app.db.database import get_session
+from app.db.routing import read_your_writes
+from app.core.config import settings
 from app.core.i18n import i18n, get_language
 from app.core.logger import logger
+from app.core.snowflake import SnowflakeId
+from app.core.wechatpay_crypto import WeChatPayCryptoError
 from app.services.vip_service import vip_service
 
 router = APIRouter(prefix="/order", tags=["order"])
 order_service = OrderService()
+job_queue_service.register(PAYMENT_NOTIFY_QUEUE, order_service.process_payment_job)
 
 class OrderCreate(BaseModel):
     vip_id: int
@@ -45,7 +53,7 @@ class OrderQuery(BaseModel):
     id: Optional[int] = None
     user_id: Optional[int] = None
     vip_id: Optional[int] = None
-    trade_no: Optional[int] = None
+    trade_no: Optional[SnowflakeId] = None
     prepay_id: Optional[str] = None
     is_paid: Optional[bool] = None
     paid_date_s: Optional[datetime] = None
@@ -55,12 +63,21 @@ class OrderQuery(BaseModel):
     return_date_s: Optional[datetime] = None
     return_date_e: Optional[datetime] = None
     return_amount: Optional[int] = None
+    limit: int = Field(20, ge=1, le=100)  # 每页条数
+    cursor: Optional[str] = None  # 上一页返回的 next_cursor
+    fields: Optional[list[str]] = None  # 只返回这些列，id和created_at总会返回
+    with_count: bool = False  # 是否统计符合条件的总数
     model_config = {
         "from_attributes": True,
         "arbitrary_types_allowed": True,
         "json_schema_extra": {
             "example": [
-
+                {
+                    "is_paid": True,
+                    "limit": 20,
+                    "fields": ["trade_no", "vip_id", "paid_date", "paid_amount"],
+                    "with_count": True
+                }
             ]
         }
     }
@@ -81,7 +98,7 @@ class OrderQuery(BaseModel):
 
 class OrderResponse(BaseModel):
     id: int
-    trade_no: int
+    trade_no: SnowflakeId
     user_id: int
     vip_id: int
     is_paid: bool | None
@@ -108,6 +125,18 @@ class OrderServiceResponse(BaseModel):
     }
 
 
+class OrderPageResponse(BaseModel):
+    count: int  # 本页条数
+    orders: list[dict[str, Any]]
+    next_cursor: Optional[str] = None  # 没有下一页时为空
+    total: Optional[int] = None  # 仅在 with_count 时返回
+
+    model_config = {
+        "from_attributes": True,
+        "arbitrary_types_allowed": True
+    }
+
+
 class WeChatPaymentResponse(BaseModel):
     prepay_id: str
     timeStamp: str
@@ -210,12 +239,12 @@ async def create_vip_order(
         )
 
 
-@router.post(path="/query", response_model=OrderServiceResponse)
+@router.post(path="/query", response_model=OrderPageResponse)
 async def get_vip_orders(
         request: Request,
         order_query: OrderQuery,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_session(read_only=True))
 ):
     """
     获取当前用户下单的VIP订单列表接口
@@ -238,39 +267,59 @@ async def get_vip_orders(
             - return_date_s: 起始退款日期（可选）
             - return_date_e: 结束退款日期（可选）
             - return_amount: 退款金额（可选）
+            - limit: 每页条数，默认20，最大100
+            - cursor: 上一页返回的 next_cursor（可选）
+            - fields: 需要返回的列（可选），默认全部
+            - with_count: 是否返回总数，默认否
         current_user: 当前登录用户对象
         db: 数据库会话依赖
         
     Returns:
-        OrderServiceResponse: 订单信息列表
+        OrderPageResponse: 按创建时间倒序的一页订单
+            - count: 本页条数
+            - orders: 订单列表
+            - next_cursor: 下一页游标，没有下一页时为空
+            - total: 符合条件的总数（仅 with_count 时返回）
         
     Raises:
         HTTPException:
+            - 400: 游标或列名无效
             - 500: 服务器内部错误
     """
     lang = get_language(request)
     try:
-        # 将查询参数转换为字典，并移除None值
-        query_params = {k: v for k, v in order_query.model_dump().items() if v is not None}
+        # 将查询参数转换为字典，并移除None值和分页参数
+        page_params = {"limit", "cursor", "fields", "with_count"}
+        query_params = {k: v for k, v in order_query.model_dump().items() if v is not None and k not in page_params}
         
-        # 调用服务层方法获取订单列表
-        orders = await order_service.get_vip_orders(
+        # 调用服务层方法获取一页订单
+        read_your_writes(db, current_user.id)
+        page = await order_service.query_vip_orders_page(
             db=db,
             query_params=query_params,
-            user_id=current_user.id
+            user_id=current_user.id,
+            limit=order_query.limit,
+            cursor=order_query.cursor,
+            fields=order_query.fields,
+            with_count=order_query.with_count
         )
 
-        if not orders:
-            return OrderServiceResponse(
-                count=0,
-                orders=[],
-            )
-
-        return OrderServiceResponse(
+        # trade_no 超过JS的安全整数，按字符串返回
+        orders = [{**order, "trade_no": str(order["trade_no"])} if "trade_no" in order else order
+                  for order in page["orders"]]
+        return OrderPageResponse(
             count=len(orders),
             orders=orders,
+            next_cursor=page["next_cursor"],
+            total=page["total"],
         )
         
+    except ValueError as e:
+        logger.info(f"Invalid order query for user {current_user.id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=i18n.get_text("BAD_REQUEST", lang)
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -286,7 +335,7 @@ async def get_vip_orders(
 async def get_vip_service(
         request: Request,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_session(read_only=True))
 ):
     """
     获取当前用户的生效的VIP订单列表接口
@@ -310,6 +359,7 @@ async def get_vip_service(
         # 将查询参数转换为字典，并移除None值
 
         # 调用服务层方法获取订单列表
+        read_your_writes(db, current_user.id)
         orders = await order_service.get_service_orders(
             db=db,
             user_id=current_user.id
@@ -420,7 +470,7 @@ async def wechat_payment_notify(
     """
     处理微信支付回调通知接口
     
-    接收并处理微信支付的异步通知，更新订单支付状态。
+    校验微信支付的异步通知签名后放入任务队列并立即应答，由后台worker更新订单支付状态。
     
     Args:
         request: FastAPI请求对象
@@ -440,22 +490,35 @@ async def wechat_payment_notify(
         ```
     """
     try:
-        # 解析微信支付回调数据
-        # TODO: 实现微信支付回调数据验证
-        notification_data = await request.json()
-        # 开发测试时模拟支付成功
-        # notification_data = {
-        #     "out_trade_no": "123",  # 订单ID
-        #     "trade_state": "SUCCESS"
-        # }
-        
-        order_id = int(notification_data["out_trade_no"])
-        payment_success = notification_data["trade_state"] == "SUCCESS"
-        
+        # 校验签名并解密微信支付回调数据
+        body = (await request.body()).decode("utf-8")
+        try:
+            notification_data = order_service.parse_payment_notification(request.headers, body)
+        except WeChatPayCryptoError as e:
+            logger.error(f"Rejected payment notification: {str(e)}")
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                content={"code": "FAIL", "message": "签名错误"}
+            )
+
+        trade_no = int(notification_data["out_trade_no"])
+        trade_state = notification_data["trade_state"]
+        payment_success = trade_state == "SUCCESS"
+
+        if settings.JOB_QUEUE_ENABLED:
+            # 只入队即返回，由后台worker结算；微信重复推送的同一通知按去重键只入队一次
+            await job_queue_service.enqueue(
+                db,
+                PAYMENT_NOTIFY_QUEUE,
+                {"trade_no": trade_no, "payment_success": payment_success, "trade_state": trade_state},
+                dedup_key=f"{trade_no}:{trade_state}",
+            )
+            return {"code": "SUCCESS", "message": "OK"}
+
         # 处理支付结果
         success = await order_service.handle_payment_notification(
             db=db,
-            order_id=order_id,
+            trade_no=trade_no,
             payment_success=payment_success
         )
         
@@ -467,4 +530,8 @@ async def wechat_payment_notify(
             
     except Exception as e:
         logger.error(f"Failed to process payment notification: {str(e)}", exc_info=True)
-        return {"code": "FAIL", "message": "处理失败"}
+        # 返回5xx，微信会按策略重新推送
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"code": "FAIL", "message": "处理失败"}
+        )
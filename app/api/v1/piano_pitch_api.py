@@ -1,11 +1,10 @@
-import os
 import traceback
 from dataclasses import replace
 from typing import Optional, List
 from urllib.parse import unquote
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from starlette.concurrency import run_in_threadpool
 
 
 from app.api.v1.auth_api import get_current_user, get_db, get_current_user_vip
@@ -16,9 +15,13 @@ from app.api.v1.schemas.response.pitch_response import PitchSingleSettingRespons
     PitchChordResponse, PitchGroupResponse, SinglePitchExamResponse, PitchGroupSettingResponse, GroupPitchExamResponse, \
     PitchIntervalSettingResponse, PitchIntervalExamResponse, PitchChordSettingResponse, PitchChordExamResponse, \
     PitchIntervalWithPitchesResponse
+from app.core.config import settings
 from app.core.i18n import get_language, i18n
 from app.core.logger import logger
 from app.services.pitch_service import pitch_service
+from app.services.audio_asset_service import audio_asset_service, etag_matches
+from app.services.audio_render_service import audio_render_service
+from app.services.audio_pack_service import audio_pack_service
 from app.models.user import User, CombineUser
 from app.services.pitch_settings_service import pitch_settings_service
 from app.utils.UserChecker import check_year_vip_level
@@ -180,8 +183,8 @@ async def get_wav_by_index(
         current_user: 当前登录用户对象
         
     Returns:
-        FileResponse: 音频文件响应
-            - Content-Type: audio/wav
+        Response: 音频文件响应，支持ETag（304）和Range（206）
+            - Content-Type: audio/mpeg
             - Content-Disposition: inline
             
     Raises:
@@ -199,17 +202,14 @@ async def get_wav_by_index(
                 detail=i18n.get_text("PITCH_NOT_FOUND", lang)
             )
 
-        if not os.path.exists(pitch.url):
+        asset = audio_asset_service.get(pitch.pitch_number)
+        if not asset:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=i18n.get_text("FILE_NOT_FOUND", lang)
             )
 
-        return FileResponse(
-            pitch.url,
-            media_type="audio/wav",
-            headers={"Content-Disposition": f"inline; filename={os.path.basename(pitch.name)}"}
-        )
+        return audio_asset_service.response(request, asset)
     except HTTPException:
         raise
     except Exception as e:
@@ -237,8 +237,8 @@ async def get_wav_by_name(
         current_user: 当前登录用户对象
         
     Returns:
-        FileResponse: 音频文件响应
-            - Content-Type: audio/wav
+        Response: 音频文件响应，支持ETag（304）和Range（206）
+            - Content-Type: audio/mpeg
             - Content-Disposition: inline
             
     Raises:
@@ -257,17 +257,14 @@ async def get_wav_by_name(
             )
         pitch = pitches[0]
 
-        if not os.path.exists(pitch.url):
+        asset = audio_asset_service.get(pitch.pitch_number)
+        if not asset:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=i18n.get_text("FILE_NOT_FOUND", lang)
             )
 
-        return FileResponse(
-            pitch.url,
-            media_type="audio/wav",
-            headers={"Content-Disposition": f"inline; filename={os.path.basename(pitch.name)}"}
-        )
+        return audio_asset_service.response(request, asset)
     except HTTPException:
         raise
     except Exception as e:
@@ -278,6 +275,156 @@ async def get_wav_by_name(
             detail=i18n.get_text("INTERNAL_SERVER_ERROR", lang)
         )
 
+@router.get("/pitch/audio/manifest")
+async def get_audio_manifest(
+    request: Request,
+    response: Response,
+):
+    """
+    获取钢琴采样清单接口
+
+    返回每个键位采样的内容哈希URL，客户端按URL长期缓存，采样更新后URL随之变化。
+
+    Returns:
+        dict: 键位号 -> {url, size, hash}
+    """
+    lang = get_language(request)
+    try:
+        response.headers["Cache-Control"] = "no-cache"
+        return {
+            asset.pitch_number: {
+                "url": audio_asset_service.url_for(asset),
+                "size": asset.size,
+                "hash": asset.digest,
+            }
+            for asset in audio_asset_service.all()
+        }
+    except Exception as e:
+        logger.error(f"Error in get_audio_manifest: {str(e)}\nTraceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=i18n.get_text("INTERNAL_SERVER_ERROR", lang)
+        )
+
+
+@router.get("/pitch/audio/asset/{digest}")
+async def get_audio_asset(
+    request: Request,
+    digest: str,
+):
+    """
+    通过内容哈希获取钢琴采样接口
+
+    URL包含内容哈希，响应带 Cache-Control: immutable，客户端不会重复下载。
+
+    Raises:
+        HTTPException:
+            - 404: 音频文件不存在
+    """
+    lang = get_language(request)
+    asset = audio_asset_service.get_by_digest(digest)
+    if not asset:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=i18n.get_text("FILE_NOT_FOUND", lang)
+        )
+    return audio_asset_service.response(request, asset, immutable=True)
+
+
+@router.get("/pitch/audio/pack")
+async def get_audio_pack_index(
+    request: Request,
+    network: Optional[str] = Query(None, description="wx.getNetworkType 返回的网络类型，如 wifi、4g、3g"),
+    profile: Optional[str] = Query(None, description="指定码率档位（low/medium/high），优先于网络类型"),
+):
+    """
+    获取钢琴采样包索引接口
+
+    按网络类型选择码率档位，返回该档位采样包的哈希URL和每个采样在包内的偏移，
+    客户端随后一次请求下载整个采样包，按 offset/length 切出各个键位的MP3。
+
+    Raises:
+        HTTPException:
+            - 404: 采样包尚未构建或档位不存在
+    """
+    lang = get_language(request)
+    chosen = audio_pack_service.profile_for(network, profile)
+    if chosen is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=i18n.get_text("FILE_NOT_FOUND", lang)
+        )
+    return audio_pack_service.index(chosen)
+
+
+@router.get("/pitch/audio/pack/{digest}")
+async def get_audio_pack(
+    request: Request,
+    digest: str,
+):
+    """
+    通过内容哈希下载钢琴采样包接口
+
+    响应带 Cache-Control: immutable，支持Range断点续传。
+
+    Raises:
+        HTTPException:
+            - 404: 采样包不存在
+    """
+    lang = get_language(request)
+    pack = audio_pack_service.get_by_digest(digest)
+    if not pack:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=i18n.get_text("FILE_NOT_FOUND", lang)
+        )
+    return audio_asset_service.response(request, pack, immutable=True)
+
+
+@router.get("/pitch/audio/render")
+async def render_question_audio(
+    request: Request,
+    pitches: str = Query(..., description="按发声顺序（含转位）排列的键位号，逗号分隔，如 40,44,47"),
+    kind: str = Query("interval", description="interval 或 chord"),
+    play_mode: int = Query(1, ge=1, le=4),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    渲染音程/和弦题目音频接口
+
+    把题目的各个音按播放方式（和声/上行/下行/上下行，柱式/分解）混成一段音频返回，
+    客户端每题只需请求一次。相同参数的结果会被缓存。
+
+    Raises:
+        HTTPException:
+            - 400: 参数错误
+            - 500: 服务器内部错误
+    """
+    lang = get_language(request)
+    try:
+        pitch_numbers = [int(number) for number in pitches.split(",")]
+        if not 1 <= len(pitch_numbers) <= 6 or not all(1 <= number <= 88 for number in pitch_numbers):
+            raise ValueError(f"Invalid pitches {pitches}")
+        clip = await run_in_threadpool(audio_render_service.render, pitch_numbers, kind, play_mode)
+    except ValueError as e:
+        logger.error(f"Error in render_question_audio: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=i18n.get_text("BAD_REQUEST", lang)
+        )
+    except Exception as e:
+        logger.error(f"Error in render_question_audio: {str(e)}\nTraceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=i18n.get_text("INTERNAL_SERVER_ERROR", lang)
+        )
+
+    headers = {"ETag": clip.etag, "Cache-Control": f"public, max-age={settings.AUDIO_ASSET_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), clip.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=clip.data, media_type=clip.media_type, headers=headers)
+
+
 @router.get("/pitchgroup", response_model=List[PitchGroupResponse])
 async def get_all_pitchgroups(
     request: Request,
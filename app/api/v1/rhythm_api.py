@@ -1,24 +1,42 @@
 # app/api/v1/rhythm_api.py
+import traceback
+from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import BaseModel, Field, ValidationError
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
 
 from app.api.v1.auth_api import get_current_user, get_db, get_current_user_vip
 from app.api.v1.schemas.request.pitch_request import RhythmSettingRequest
-from app.api.v1.schemas.response.pitch_response import RhythmQuestionResponse, RhythmSettingResponse
+from app.api.v1.schemas.response.pitch_response import RhythmQuestionResponse, RhythmSettingResponse, RhythmScore, \
+    RhythmAssessmentResponse
+from app.core.config import settings
 from app.core.i18n import get_language, i18n
+from app.core.logger import logger
 from app.models.user import User, CombineUser
 from app.services.rhythm_service import rhythm_service
+from app.services.rhythm_assessment_service import rhythm_assessment_service
+from app.services.compact_service import compact_service, is_compact_request, vary_accept
+from app.services.score_render_service import score_render_service
 from app.models.rhythm import *
 from app.utils.UserChecker import check_year_vip_level
+from app.utils.upload_util import limit_request_body, UploadTooLargeError
 
 router = APIRouter(prefix="/rhythm", tags=["rhythm"])
 
 
-@router.post("/generate", response_model=RhythmQuestionResponse)
+class RhythmAssessRequest(BaseModel):
+    score: RhythmScore  # 生成接口返回的节奏（options中的一项）
+    taps: List[float] = Field(..., description="拍点时间（秒），原点任意，如客户端记录的触屏时间")
+
+
+@router.post("/generate", response_model=RhythmQuestionResponse, dependencies=[Depends(vary_accept)])
 async def generate_rhythm_question(
         request: RhythmSettingRequest,
+        http_request: Request,
         current_user: CombineUser = Depends(get_current_user_vip),
         db: Session = Depends(get_db)
 ):
@@ -33,6 +51,7 @@ async def generate_rhythm_question(
             - time_signature: 拍号（如"4/4", "3/4"等）
             - measures_count: 小节数
             - tempo: 速度（BPM）
+        http_request: FastAPI请求对象，?format=compact 或 Accept: application/vnd.lianer.compact+json 时返回紧凑格式
         current_user: 当前登录用户对象
         db: 数据库会话依赖
         
@@ -56,7 +75,7 @@ async def generate_rhythm_question(
         }
         ```
     """
-    lang = get_language(request)
+    lang = get_language(http_request)
     try:
         vv = check_year_vip_level(current_user)
         if not vv:
@@ -65,11 +84,104 @@ async def generate_rhythm_question(
                 detail=i18n.get_text("USER_VIP_NOT_NORMAL", lang)
             )
         response = rhythm_service.generate_question(request)
+        if is_compact_request(http_request):
+            return compact_service.response(compact_service.encode_rhythm_question(response))
         return response
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/render")
+async def render_rhythm_audio(
+        http_request: Request,
+        score: RhythmScore,
+        audio_format: str = Query(None, description="opus 或 wav，默认 SCORE_RENDER_FORMAT"),
+        click: bool = Query(True, description="是否叠加节拍器（含一小节预备拍）"),
+        current_user: User = Depends(get_current_user),
+):
+    """
+    渲染节奏音频接口
+
+    把生成接口返回的节奏（options中的一项）按其tempo渲染成音频，默认叠加节拍器，
+    边渲染边返回。相同乐谱的结果按指纹缓存，ETag为乐谱指纹。
+
+    Raises:
+        HTTPException:
+            - 400: 参数错误（格式不支持、乐谱过长等）
+            - 500: 服务器内部错误
+    """
+    lang = get_language(http_request)
+    try:
+        return await score_render_service.response(http_request, score, audio_format, click)
+    except ValueError as e:
+        logger.error(f"Error in render_rhythm_audio: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=i18n.get_text("BAD_REQUEST", lang)
+        )
+    except Exception as e:
+        logger.error(f"Error in render_rhythm_audio: {str(e)}\nTraceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=i18n.get_text("INTERNAL_SERVER_ERROR", lang)
+        )
+
+
+@router.post("/assess", response_model=RhythmAssessmentResponse)
+async def assess_rhythm_tapping(
+        request: Request,
+        current_user: User = Depends(get_current_user),
+):
+    """
+    节奏拍打评分接口
+
+    两种提交方式：
+        - application/json: {"score": 节奏, "taps": [拍点时间（秒）...]}，客户端记录的触屏时间
+        - multipart/form-data: score（节奏JSON）+ file（拍手录音），服务端检测拍点
+    拍点按乐谱tempo与每个音的tick位置对齐，返回每个音的节奏误差和总分。
+
+    Raises:
+        HTTPException:
+            - 400: 节奏、拍点或录音无法解析
+            - 413: 录音过大
+            - 500: 服务器内部错误
+    """
+    lang = get_language(request)
+    try:
+        upload_request = limit_request_body(request, settings.RHYTHM_ASSESS_MAX_UPLOAD_BYTES)
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await upload_request.form(max_files=1, max_fields=1)
+            upload = form.get("file")
+            if not isinstance(upload, UploadFile) or not isinstance(form.get("score"), str):
+                raise ValueError("score and file are required")
+            score = RhythmScore.model_validate_json(form["score"])
+            audio = await run_in_threadpool(rhythm_assessment_service.decode, upload.file)
+            return await run_in_threadpool(rhythm_assessment_service.assess, audio, score)
+
+        body = RhythmAssessRequest.model_validate_json(await upload_request.body())
+        if len(body.taps) > settings.RHYTHM_ASSESS_MAX_TAPS:
+            raise ValueError("Too many taps")
+        return rhythm_assessment_service.assess_taps(body.taps, body.score)
+    except UploadTooLargeError as e:
+        logger.info(f"Rejected rhythm assessment upload: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=i18n.get_text("BAD_REQUEST", lang)
+        )
+    except (ValueError, ValidationError) as e:
+        logger.info(f"Invalid rhythm assessment request: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=i18n.get_text("BAD_REQUEST", lang)
+        )
+    except Exception as e:
+        logger.error(f"Error in assess_rhythm_tapping : {str(e)}\nTraceback: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=i18n.get_text("INTERNAL_SERVER_ERROR", lang)
+        )
+
+
 @router.get("/settings", response_model=RhythmSettingResponse)
 async def get_rhythm_settings():
     """
@@ -4104,4 +4104,43 @@ class PitchAnalysisResult(BaseModel):
                 }
             ]
         }
-    }
\ No newline at end of file
+    }
+
+class MelodyAssessmentNote(BaseModel):
+    index: int  # 目标旋律中第几个音（不含休止符，连音线合并）
+    pitch_number: int
+    expected_onset: float  # 期望起音时间（秒，相对录音开头）
+    sung_onset: Optional[float] = None  # 实际起音时间，未唱出为None
+    cents_error: Optional[float] = None  # 音分误差，正数偏高
+    timing_error: Optional[float] = None  # 节奏误差（秒），正数偏晚
+    pitch_correct: bool
+    timing_correct: bool
+
+
+class MelodyAssessmentResponse(BaseModel):
+    score: int  # 0~100
+    pitch_accuracy: float  # 音高正确的音占比
+    timing_accuracy: float  # 节奏正确的音占比
+    mean_abs_cents: Optional[float] = None
+    octave_shift: int  # 相对目标整体移动的八度数
+    missed_notes: int
+    extra_notes: int
+    notes: List[MelodyAssessmentNote]
+
+
+class RhythmAssessmentNote(BaseModel):
+    index: int  # 节奏中第几个音（不含休止符，连音线合并）
+    tick: int  # 起点位置（每拍 TICKS_PER_BEAT 个tick）
+    expected_onset: float  # 期望拍点时间（秒，相对录音开头或拍点时间的原点）
+    tapped_onset: Optional[float] = None  # 实际拍点时间，未拍出为None
+    deviation: Optional[float] = None  # 节奏误差（秒），正数偏晚
+    correct: bool
+
+
+class RhythmAssessmentResponse(BaseModel):
+    score: int  # 0~100
+    accuracy: float  # 节奏正确的音占比
+    mean_abs_deviation: Optional[float] = None  # 平均绝对误差（秒）
+    missed_notes: int
+    extra_taps: int
+    notes: List[RhythmAssessmentNote]
@@ -22,19 +22,39 @@ class Settings(BaseSettings):
 
     # 数据库连接池配置
     DB_POOL_SIZE: int = 20
-    DB_MAX_OVERFLOW: int = 100
+    DB_MAX_OVERFLOW: int = 10
     DB_POOL_TIMEOUT: int = 30
     DB_POOL_RECYCLE: int = 1800
+    DB_MAX_CONNECTIONS: int = 0  # 所有worker合计的最大连接数，0表示不限制，按 DB_POOL_SIZE + DB_MAX_OVERFLOW
+    DB_PGBOUNCER: bool = False  # 经由pgbouncer连接时使用NullPool并关闭预编译语句缓存
+    WEB_CONCURRENCY: int = 1  # uvicorn worker数量（与 uvicorn --workers 一致）
+    DB_REPLICA_URL: str = ""  # 只读副本连接URL，为空时只读查询也走主库
+    DB_REPLICA_LAG_SECONDS: float = 10.0  # 用户写入后多长时间内其只读查询走主库
+    DB_REPLICA_RETRY_LAG_SECONDS: float = 1.0  # 副本复制延迟超过此值时，副本查不到的数据才回主库重查
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 1.0  # 查询副本复制延迟的最小间隔（秒）
 
     @property
     def SQLALCHEMY_DATABASE_URL(self) -> str:
         """构建PostgreSQL数据库URL"""
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
+    # ID生成器配置
+    SNOWFLAKE_WORKER_ID_BASE: int = 0  # 本机可租用的起始worker id（0-1023），多台主机需配置不重叠的范围
+    SNOWFLAKE_WORKERS_PER_HOST: int = 64  # 本机可租用的worker id个数，不少于uvicorn worker数
+    SNOWFLAKE_LOCK_DIR: str = "/tmp/snowflake"  # 租用worker id的锁文件目录
+
     # JWT配置
     SECRET_KEY: str = secrets.token_urlsafe(32)
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+
+    # 已认证用户缓存配置
+    AUTH_USER_CACHE_TTL_SECONDS: int = 30  # 缓存有效期，0表示关闭
+    AUTH_USER_CACHE_MAX_SIZE: int = 10000  # 最大缓存条目数（LRU淘汰）
+
+    # 令牌VIP声明配置
+    VIP_CLAIMS_TTL_MINUTES: int = 60  # VIP声明有效期，过期后回退到数据库查询
+    TOKEN_REVOCATION_EPOCH: int = 0  # 吊销纪元，递增后所有已签发的VIP声明失效
     
     # 微信小程序配置
     # WECHAT_APP_ID: str = ""
@@ -57,15 +77,116 @@ class Settings(BaseSettings):
     WECHAT_PAY_CERT_PATH: str = APP_DIR + "/wepay/apiclient_cert.pem"  # 商户证书路径
     WECHAT_PAY_KEY_PATH: str = APP_DIR + "/wepay/apiclient_key.pem"  # 商户私钥路径
     WECHAT_NOTIFY_URL: str = "https://www..cn/api/v1/order/wechat-notify"
-    
+    WECHAT_PAY_PLATFORM_CERT_DIR: str = APP_DIR + "/wepay/platform"  # 平台证书目录（*.pem），用于回调验签；启动时从 /v3/certificates 下载
+    WECHAT_PAY_CERT_CHECK_INTERVAL: float = 60.0  # 检查密钥/证书文件是否更新的间隔（秒）
+    WECHAT_PAY_NOTIFY_TOLERANCE: int = 300  # 回调通知时间戳允许的偏差（秒）
+    WECHAT_PAY_VERIFY_NOTIFY: bool = True  # 是否校验回调通知签名，开启时没有可用的平台证书则启动失败
+
     # 音频处理配置
     AUDIO_UPLOAD_DIR: str = "uploads/audio"
     MAX_AUDIO_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_AUDIO_TYPES: list = ["audio/wav", "audio/mp3", "audio/m4a"]
+    AUDIO_ASSET_DIR: str = APP_DIR + "/static/audio"  # 钢琴采样目录
+    AUDIO_ASSET_MAX_AGE: int = 24 * 3600  # 非哈希URL的缓存时间（秒），过期后凭ETag再验证
+    AUDIO_ASSET_STORE: str = "mmap"  # mmap: 内存映射; memory: 全部读入内存; file: 每次读文件
+    AUDIO_ASSET_HOT_PITCHES: str = "28-63"  # 常驻内存的键位范围（中音区）
+    AUDIO_ASSET_SENDFILE: bool = False  # 服务器支持ASGI zerocopy扩展且未经BaseHTTPMiddleware包装时开启
+
+    # 采样包配置（python -m app.utils.audio_pack_builder 生成）
+    AUDIO_PACK_DIR: str = APP_DIR + "/static/packs"
+    AUDIO_PACK_PROFILES: str = "low:32:22050,medium:64:44100,high:128:44100"  # 名称:码率kbps:采样率
+    AUDIO_PACK_NETWORK_PROFILES: str = "wifi:high,5g:high,4g:medium,3g:low,2g:low"  # 网络类型:档位
+    AUDIO_PACK_DEFAULT_PROFILE: str = "medium"  # 网络类型未知时的档位
+
+    # 钢琴采样参考特征（python -m app.utils.audio_feature_builder 生成）
+    AUDIO_FEATURE_PATH: str = APP_DIR + "/data/piano_features.npz"
+    AUDIO_FEATURE_SAMPLE_RATE: int = 22050  # 提取特征时的采样率
+    AUDIO_FEATURE_HOP_LENGTH: int = 512  # 逐帧特征的帧移（采样点）
+    AUDIO_FEATURE_SECONDS: float = 2.0  # 每个采样分析的时长（秒）
+
+    # 视唱评分配置
+    MELODY_ASSESS_SAMPLE_RATE: int = 11025  # 分析采样率（人声基频不超过C6，足够）
+    MELODY_ASSESS_HOP_LENGTH: int = 128  # 帧移（采样点），约12毫秒
+    MELODY_ASSESS_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024  # 录音文件大小上限
+    MELODY_ASSESS_MAX_SECONDS: float = 180.0  # 录音时长上限（秒）
+    MELODY_ASSESS_CENTS_TOLERANCE: float = 50.0  # 音高误差在该音分内算正确
+    MELODY_ASSESS_TIMING_TOLERANCE: float = 0.15  # 节奏误差在该秒数内算正确
+
+    # 节奏拍打评分配置
+    RHYTHM_ASSESS_SAMPLE_RATE: int = 11025  # 起音检测采样率
+    RHYTHM_ASSESS_HOP_LENGTH: int = 64  # 帧移（采样点），约6毫秒
+    RHYTHM_ASSESS_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024  # 录音文件大小上限
+    RHYTHM_ASSESS_MAX_SECONDS: float = 180.0  # 录音时长上限（秒）
+    RHYTHM_ASSESS_MAX_TAPS: int = 2000  # 直接提交拍点时的数量上限
+    RHYTHM_ASSESS_TOLERANCE: float = 0.08  # 拍点与期望时间相差在该秒数内算正确
+
+    # 静态资源目录清单配置
+    ASSET_CATALOG_POLL_INTERVAL: float = 30.0  # 轮询目录变化的间隔（秒），0表示只在启动时扫描
+    ASSET_CATALOG_PAGE_SIZE: int = 100  # 默认每页条数
+    ASSET_CATALOG_MAX_PAGE_SIZE: int = 500  # 每页最大条数
+
+    # 题目音频渲染配置
+    AUDIO_RENDER_SAMPLE_RATE: int = 22050  # PCM缓存和输出的采样率
+    AUDIO_RENDER_NOTE_SECONDS: float = 2.5  # 每个音截取的时长（秒）
+    AUDIO_RENDER_NOTE_SPACING: float = 1.0  # 依次发声时相邻两音的间隔（秒）
+    AUDIO_RENDER_FORMAT: str = "mp3"  # mp3 或 wav
+    AUDIO_RENDER_CACHE_SIZE: int = 512  # 渲染结果LRU缓存条目数
+    AUDIO_RENDER_PRELOAD: bool = True  # 启动时解码全部采样
+
+    # 乐谱音频渲染配置
+    SCORE_RENDER_FORMAT: str = "opus"  # opus 或 wav
+    SCORE_RENDER_CHUNK_SECONDS: float = 2.0  # 每次混音并输出的时长（秒）
+    SCORE_RENDER_CACHE_BYTES: int = 64 * 1024 * 1024  # 按乐谱指纹缓存的渲染结果总字节数
+    SCORE_RENDER_CACHE_MAX_ITEM_BYTES: int = 1024 * 1024  # 超过此大小的结果（主要是长WAV）不缓存
+    SCORE_RENDER_MAX_SECONDS: float = 300.0  # 允许渲染的最长乐谱（秒）
+    SCORE_RENDER_RHYTHM_PITCH: int = 52  # 节奏题使用的键位（C5）
+    SCORE_RENDER_COUNT_IN_MEASURES: int = 1  # 加节拍器时的预备小节数
     
     # DeepSeek API settings
     DEEPSEEK_API_KEY: str = "sk-"
     DEEPSEEK_API_URL: str = "https://api.deepseek.com/v1/chat/completions"
+    DEEPSEEK_TIMEOUT: float = 60.0  # 读取超时（秒）
+    DEEPSEEK_MODEL: str = "deepseek-chat"
+    DEEPSEEK_MAX_TOKENS: int = 5000
+    DEEPSEEK_STREAM: bool = True  # 流式读取，解析到足够小节后提前结束
+    DEEPSEEK_MAX_CONCURRENCY: int = 8  # 全局同时进行的补全数量
+    DEEPSEEK_USER_RATE_PER_MINUTE: int = 5  # 每个用户每分钟AI出题次数，0表示不限
+
+    # AI旋律库配置
+    MELODY_BANK_ENABLED: bool = True
+    MELODY_BANK_PATH: str = APP_DIR + "/data/melody_bank.sqlite3"  # 多个worker进程共用的SQLite文件
+    MELODY_BANK_LOW_WATERMARK: int = 3  # 桶内旋律少于该值时开始补充
+    MELODY_BANK_HIGH_WATERMARK: int = 10  # 补充到该值为止
+    MELODY_BANK_REFILL_INTERVAL: float = 30.0  # 后台补充间隔（秒）
+    MELODY_BANK_REFILL_LEASE: float = 300.0  # 补充一个桶的租约（秒），每生成一条旋律续期，进程崩溃后由其他进程接手
+
+    # AI提示词缓存配置
+    PROMPT_CACHE_ENABLED: bool = True
+    PROMPT_CACHE_PATH: str = APP_DIR + "/data/prompt_cache.sqlite3"
+    PROMPT_CACHE_VARIANTS: int = 5  # 每个提示词最多保存的响应数
+    PROMPT_CACHE_HIT_PROBABILITY: float = 0.8  # 返回缓存变体的概率，其余情况重新请求
+    PROMPT_CACHE_MAX_KEYS: int = 1000
+    PROMPT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # 后台任务队列配置（支付回调结算等）
+    JOB_QUEUE_ENABLED: bool = True
+    JOB_WORKER_CONCURRENCY: int = 4  # 每个进程每个队列的worker数
+    JOB_POLL_INTERVAL: float = 1.0  # 队列为空时的轮询间隔（秒）
+    JOB_MAX_ATTEMPTS: int = 8  # 超过后进入死信
+    JOB_RETRY_BACKOFF_BASE: float = 2.0  # 重试退避基数（秒），按 2^n 增长
+    JOB_RETRY_BACKOFF_MAX: float = 600.0
+    JOB_LOCK_TIMEOUT: int = 300  # running状态超过该时间视为worker崩溃，重新领取
+
+    # 外部HTTP调用配置（微信登录、微信支付、DeepSeek共用）
+    HTTP_CONNECT_TIMEOUT: float = 3.0
+    HTTP_READ_TIMEOUT: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_RETRIES: int = 2
+    HTTP_RETRY_BACKOFF_BASE: float = 0.2  # 退避基数（秒）
+    HTTP_CIRCUIT_FAILURE_THRESHOLD: int = 5  # 连续失败多少次后熔断
+    HTTP_CIRCUIT_RESET_SECONDS: float = 30.0  # 熔断后多久放行试探请求
     
 
     class Config:
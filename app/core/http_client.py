@@ -0,0 +1,183 @@
+import asyncio
+import random
+import time
+from typing import Dict, Optional, Any
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """
+    简单的熔断器
+
+    连续失败达到阈值后打开，reset_timeout 秒后进入半开状态放行一个试探请求，
+    试探成功则关闭，失败则重新打开。试探结束前其余请求仍被拒绝；
+    试探请求超过 reset_timeout 仍未结束（如被取消）时，放行下一个试探。
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # 半开状态下试探请求的开始时间，None表示没有进行中的试探
+        self.probe_started_at: Optional[float] = None
+
+    def before_request(self) -> None:
+        if self.state == self.CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit {self.name} is open")
+            self.state = self.HALF_OPEN
+            logger.info(f"Circuit {self.name} half-open, allowing trial request")
+        elif self.probe_started_at is not None and now - self.probe_started_at < self.reset_timeout:
+            raise CircuitOpenError(f"Circuit {self.name} is half-open, trial request in flight")
+        self.probe_started_at = now
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.probe_started_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.probe_started_at = None
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.error(f"Circuit {self.name} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    """
+    共享的异步HTTP客户端
+
+    - 复用一个 httpx.AsyncClient，保持长连接池
+    - 统一的连接/读取超时，可按请求覆盖
+    - 连接错误、5xx、429 时按指数退避加随机抖动重试
+    - 按上游服务名（wechat、wechatpay、deepseek等）分别熔断
+    """
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """首次使用时创建客户端，保证绑定到当前运行的事件循环"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.HTTP_READ_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=settings.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        if name not in self._breakers:
+            self._breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=settings.HTTP_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.HTTP_CIRCUIT_RESET_SECONDS,
+            )
+        return self._breakers[name]
+
+    def backoff_delay(self, attempt: int) -> float:
+        """指数退避 + 全抖动"""
+        return random.uniform(0, settings.HTTP_RETRY_BACKOFF_BASE * (2 ** attempt))
+
+    async def request(
+            self,
+            service: str,
+            method: str,
+            url: str,
+            retries: Optional[int] = None,
+            timeout: Optional[float] = None,
+            **kwargs: Any
+    ) -> httpx.Response:
+        """
+        发送请求
+
+        Args:
+            service: 上游服务名，用于熔断统计
+            method: HTTP方法
+            url: 请求URL
+            retries: 重试次数，默认使用配置；非幂等请求可传0
+            timeout: 读取超时（秒），默认使用配置
+            **kwargs: 透传给 httpx.AsyncClient.request
+
+        Returns:
+            httpx.Response: 最后一次的响应（5xx重试用尽后也会返回）
+
+        Raises:
+            CircuitOpenError: 熔断器打开
+            httpx.TransportError: 网络错误且重试用尽
+        """
+        breaker = self.breaker(service)
+        breaker.before_request()
+
+        if retries is None:
+            retries = settings.HTTP_RETRIES
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=settings.HTTP_CONNECT_TIMEOUT)
+
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code in self.RETRY_STATUS_CODES:
+                    if attempt < retries:
+                        logger.info(f"{service} {method} returned {response.status_code}, retrying ({attempt + 1}/{retries})")
+                        await asyncio.sleep(self.backoff_delay(attempt))
+                        attempt += 1
+                        continue
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                return response
+            except httpx.TransportError as e:
+                if attempt < retries:
+                    logger.info(f"{service} {method} failed: {e!r}, retrying ({attempt + 1}/{retries})")
+                    await asyncio.sleep(self.backoff_delay(attempt))
+                    attempt += 1
+                    continue
+                breaker.record_failure()
+                raise
+
+    async def get(self, service: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request(service, "GET", url, **kwargs)
+
+    async def post(self, service: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request(service, "POST", url, **kwargs)
+
+    async def close(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+# 创建全局HTTP客户端实例
+http_client = HttpClient()
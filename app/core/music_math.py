@@ -0,0 +1,143 @@
+"""
+音高换算工具
+
+频率（Hz）、MIDI音高、钢琴键位号（1~88，A0=1）、音名和音分之间的换算。
+所有函数都按ufunc的方式工作：标量输入返回标量，数组输入逐元素换算并保持形状；
+整数音高的频率和音名查预先计算好的表，音名解析查字典，不在每次调用时拆字符串。
+"""
+from typing import Dict
+
+import numpy as np
+
+A4_FREQUENCY = 440.0
+A4_MIDI = 69
+# 钢琴键位号 = MIDI - 20（A0 = MIDI 21 = 第1键，C8 = MIDI 108 = 第88键）
+PIANO_KEY_OFFSET = 20
+PIANO_KEY_MIN = 1
+PIANO_KEY_MAX = 88
+MIDI_MAX = 127
+
+NOTE_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+_LETTER_SEMITONES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+_ACCIDENTALS = {"": 0, "#": 1, "♯": 1, "b": -1, "♭": -1, "##": 2, "bb": -2}
+
+# MIDI 0~127 的十二平均律频率和音名（升号写法，与Pitch表的name一致）
+MIDI_FREQUENCIES = A4_FREQUENCY * 2.0 ** ((np.arange(MIDI_MAX + 1) - A4_MIDI) / 12.0)
+MIDI_NOTE_NAMES = np.array([f"{NOTE_NAMES[m % 12]}{m // 12 - 1}" for m in range(MIDI_MAX + 1)])
+
+
+def _build_name_table() -> Dict[str, int]:
+    table = {}
+    for octave in range(-1, 10):
+        for letter, semitone in _LETTER_SEMITONES.items():
+            for accidental, shift in _ACCIDENTALS.items():
+                midi = (octave + 1) * 12 + semitone + shift
+                if 0 <= midi <= MIDI_MAX:
+                    table[f"{letter}{accidental}{octave}"] = midi
+                    table[f"{letter.lower()}{accidental}{octave}"] = midi
+    return table
+
+
+# 音名 -> MIDI，包含升降号、重升重降和小写字母的写法
+NOTE_TO_MIDI: Dict[str, int] = _build_name_table()
+
+
+def _output(values: np.ndarray, scalar: bool):
+    return values.item() if scalar else values
+
+
+def hz_to_midi(frequency):
+    """频率 -> MIDI音高（小数），非正频率为NaN"""
+    f = np.asarray(frequency, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        midi = np.where(f > 0, A4_MIDI + 12.0 * np.log2(f / A4_FREQUENCY), np.nan)
+    return _output(midi, f.ndim == 0)
+
+
+def midi_to_hz(midi):
+    """MIDI音高 -> 频率；整数音高查表"""
+    m = np.asarray(midi)
+    if np.issubdtype(m.dtype, np.integer) and m.size and m.min() >= 0 and m.max() <= MIDI_MAX:
+        return _output(MIDI_FREQUENCIES[m], m.ndim == 0)
+    return _output(A4_FREQUENCY * 2.0 ** ((m.astype(np.float64) - A4_MIDI) / 12.0), m.ndim == 0)
+
+
+def key_to_midi(key):
+    return _output(np.asarray(key) + PIANO_KEY_OFFSET, np.ndim(key) == 0)
+
+
+def midi_to_key(midi):
+    return _output(np.asarray(midi) - PIANO_KEY_OFFSET, np.ndim(midi) == 0)
+
+
+def hz_to_key(frequency):
+    """频率 -> 钢琴键位号（小数）"""
+    return _output(np.asarray(hz_to_midi(frequency)) - PIANO_KEY_OFFSET, np.ndim(frequency) == 0)
+
+
+def key_to_hz(key):
+    """钢琴键位号 -> 十二平均律频率（第49键 A4 = 440Hz）"""
+    return midi_to_hz(key_to_midi(key))
+
+
+def cents(frequency, reference):
+    """frequency 相对 reference 的音分偏差，正数偏高"""
+    f = np.asarray(frequency, dtype=np.float64)
+    r = np.asarray(reference, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.where((f > 0) & (r > 0), 1200.0 * np.log2(f / r), np.nan)
+    return _output(result, result.ndim == 0)
+
+
+def nearest_key(frequency, low: int = PIANO_KEY_MIN, high: int = PIANO_KEY_MAX):
+    """
+    最接近的钢琴键位号及相对该键的音分偏差
+
+    Returns:
+        (键位号, 音分偏差)；超出 [low, high] 时取边界键位，非正频率的偏差为NaN
+    """
+    midi = np.asarray(hz_to_midi(frequency))
+    key = np.clip(np.rint(np.nan_to_num(midi, nan=low + PIANO_KEY_OFFSET)) - PIANO_KEY_OFFSET, low, high)
+    deviation = (midi - PIANO_KEY_OFFSET - key) * 100.0
+    scalar = np.ndim(frequency) == 0
+    return _output(key.astype(np.int64), scalar), _output(deviation, scalar)
+
+
+def midi_to_note(midi, unknown: str = ""):
+    """MIDI音高 -> 最接近的音名（查表），超出 0~127 或NaN时为 unknown"""
+    m = np.asarray(midi, dtype=np.float64)
+    index = np.rint(np.nan_to_num(m, nan=-1.0))
+    valid = (index >= 0) & (index <= MIDI_MAX)
+    names = np.where(valid, MIDI_NOTE_NAMES[np.where(valid, index, 0).astype(np.intp)], unknown)
+    return _output(names, m.ndim == 0)
+
+
+def hz_to_note(frequency, unknown: str = ""):
+    """频率 -> 最接近的音名，如 261.6 -> "C4"；非正频率为 unknown"""
+    return midi_to_note(hz_to_midi(frequency), unknown)
+
+
+def note_to_midi(note):
+    """音名 -> MIDI音高，支持 "C#4"、"Db4"、"C♯4"；无法识别时抛出 ValueError"""
+    if isinstance(note, str):
+        midi = NOTE_TO_MIDI.get(note.strip())
+        if midi is None:
+            raise ValueError(f"Invalid note name: {note}")
+        return midi
+    names = np.asarray(note, dtype=object)
+    try:
+        midi = np.fromiter(map(NOTE_TO_MIDI.__getitem__, names.ravel()), dtype=np.int64, count=names.size)
+    except (KeyError, TypeError):
+        # 逐个解析以给出具体的音名（含首尾空白的写法也在这里处理）
+        midi = np.array([note_to_midi(name) for name in names.ravel()], dtype=np.int64)
+    return midi.reshape(names.shape)
+
+
+def note_to_key(note):
+    """音名 -> 钢琴键位号"""
+    return midi_to_key(note_to_midi(note))
+
+
+def note_to_hz(note):
+    """音名 -> 十二平均律频率（查表）"""
+    return midi_to_hz(note_to_midi(note))
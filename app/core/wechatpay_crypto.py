@@ -0,0 +1,199 @@
+import base64
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class WeChatPayCryptoError(Exception):
+    """微信支付密钥/证书加载失败或回调数据无法解密"""
+
+
+class WeChatPayCrypto:
+    """
+    微信支付V3签名/验签上下文
+
+    - 商户私钥、商户证书序列号、平台证书只解析一次，文件修改后（mtime变化）自动重新加载
+    - sign/verify 可在多线程中复用，重新加载时加锁替换
+    - 校验回调通知签名并解密 resource
+    """
+
+    def __init__(
+            self,
+            key_path: Optional[str] = None,
+            cert_path: Optional[str] = None,
+            platform_cert_dir: Optional[str] = None,
+            api_v3_key: Optional[str] = None
+    ):
+        self.key_path = key_path or settings.WECHAT_PAY_KEY_PATH
+        self.cert_path = cert_path or settings.WECHAT_PAY_CERT_PATH
+        self.platform_cert_dir = platform_cert_dir or settings.WECHAT_PAY_PLATFORM_CERT_DIR
+        self.api_v3_key = api_v3_key if api_v3_key is not None else settings.WECHAT_PAY_KEY
+        self._lock = threading.Lock()
+        self._private_key = None
+        self._key_mtime: Optional[float] = None
+        self._serial_no: Optional[str] = None
+        self._cert_mtime: Optional[float] = None
+        # 平台证书序列号 -> 公钥
+        self._platform_keys: Dict[str, object] = {}
+        self._platform_mtimes: Tuple = ()
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[float]:
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _platform_cert_files(self):
+        return sorted(glob.glob(os.path.join(self.platform_cert_dir, "*.pem")))
+
+    def _refresh(self, force: bool = False) -> None:
+        """文件有变化时重新加载，最多每 WECHAT_PAY_CERT_CHECK_INTERVAL 秒检查一次"""
+        now = time.monotonic()
+        if not force and self._private_key is not None and now - self._checked_at < settings.WECHAT_PAY_CERT_CHECK_INTERVAL:
+            return
+        with self._lock:
+            if not force and self._private_key is not None and now - self._checked_at < settings.WECHAT_PAY_CERT_CHECK_INTERVAL:
+                return
+            self._checked_at = now
+
+            key_mtime = self._mtime(self.key_path)
+            if key_mtime is None and self._private_key is None:
+                raise WeChatPayCryptoError(f"WeChat Pay private key not found: {self.key_path}")
+            if key_mtime is not None and key_mtime != self._key_mtime:
+                with open(self.key_path, "rb") as f:
+                    self._private_key = load_pem_private_key(f.read(), password=None)
+                self._key_mtime = key_mtime
+                logger.info(f"Loaded WeChat Pay private key {self.key_path}")
+
+            cert_mtime = self._mtime(self.cert_path)
+            if cert_mtime is not None and cert_mtime != self._cert_mtime:
+                with open(self.cert_path, "rb") as f:
+                    cert = x509.load_pem_x509_certificate(f.read())
+                self._serial_no = format(cert.serial_number, "X")
+                self._cert_mtime = cert_mtime
+
+            files = self._platform_cert_files()
+            mtimes = tuple((path, self._mtime(path)) for path in files)
+            if mtimes != self._platform_mtimes:
+                keys = {}
+                for path in files:
+                    try:
+                        with open(path, "rb") as f:
+                            cert = x509.load_pem_x509_certificate(f.read())
+                        keys[format(cert.serial_number, "X")] = cert.public_key()
+                    except Exception as e:
+                        logger.error(f"Failed to load WeChat Pay platform certificate {path}: {str(e)}")
+                self._platform_keys = keys
+                self._platform_mtimes = mtimes
+                logger.info(f"Loaded {len(keys)} WeChat Pay platform certificates")
+
+    def platform_serials(self) -> List[str]:
+        """重新扫描平台证书目录，返回已加载的平台证书序列号"""
+        self._refresh(force=True)
+        return sorted(self._platform_keys)
+
+    def save_platform_certificate(self, pem: bytes) -> str:
+        """
+        校验并保存平台证书到平台证书目录（{序列号}.pem），返回序列号
+
+        先写同目录的临时文件再原子替换，多个进程同时下载时不会读到半个文件。
+        """
+        serial = format(x509.load_pem_x509_certificate(pem).serial_number, "X")
+        os.makedirs(self.platform_cert_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.platform_cert_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pem)
+            os.replace(tmp_path, os.path.join(self.platform_cert_dir, f"{serial}.pem"))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return serial
+
+    @property
+    def serial_no(self) -> str:
+        """商户证书序列号，优先使用配置"""
+        if settings.WECHAT_PAY_SERIAL_NO:
+            return settings.WECHAT_PAY_SERIAL_NO
+        self._refresh()
+        return self._serial_no or ""
+
+    def sign(self, message: str) -> str:
+        """SHA256withRSA 签名，返回Base64"""
+        self._refresh()
+        signature = self._private_key.sign(message.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256())
+        return base64.b64encode(signature).decode("utf-8")
+
+    def verify(self, serial: str, message: str, signature: str) -> bool:
+        """使用指定序列号的平台证书验签"""
+        self._refresh()
+        public_key = self._platform_keys.get(serial.upper())
+        if public_key is None:
+            logger.error(f"Unknown WeChat Pay platform certificate serial {serial}")
+            return False
+        try:
+            public_key.verify(base64.b64decode(signature), message.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256())
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+
+    def verify_notification(self, headers: Mapping[str, str], body: str) -> bool:
+        """
+        校验回调通知签名
+
+        验签串为 "时间戳\\n随机串\\n报文主体\\n"，时间戳与当前时间相差超过
+        WECHAT_PAY_NOTIFY_TOLERANCE 秒的通知视为重放，直接拒绝。
+        """
+        timestamp = headers.get("Wechatpay-Timestamp")
+        nonce = headers.get("Wechatpay-Nonce")
+        signature = headers.get("Wechatpay-Signature")
+        serial = headers.get("Wechatpay-Serial")
+        if not (timestamp and nonce and signature and serial):
+            logger.error("WeChat Pay notification missing signature headers")
+            return False
+        try:
+            if abs(time.time() - int(timestamp)) > settings.WECHAT_PAY_NOTIFY_TOLERANCE:
+                logger.error(f"WeChat Pay notification timestamp {timestamp} out of range")
+                return False
+        except ValueError:
+            return False
+        return self.verify(serial, f"{timestamp}\n{nonce}\n{body}\n", signature)
+
+    def decrypt(self, resource: Mapping[str, str]) -> bytes:
+        """使用APIv3密钥解密（AEAD_AES_256_GCM），回调通知的resource和平台证书下载接口的encrypt_certificate格式相同"""
+        try:
+            aesgcm = AESGCM(self.api_v3_key.encode("utf-8"))
+            return aesgcm.decrypt(
+                resource["nonce"].encode("utf-8"),
+                base64.b64decode(resource["ciphertext"]),
+                (resource.get("associated_data") or "").encode("utf-8"),
+            )
+        except Exception as e:
+            raise WeChatPayCryptoError(f"Failed to decrypt WeChat Pay resource: {str(e)}") from e
+
+    def decrypt_resource(self, resource: Mapping[str, str]) -> dict:
+        """解密回调通知中的resource"""
+        try:
+            return json.loads(self.decrypt(resource))
+        except ValueError as e:
+            raise WeChatPayCryptoError(f"Invalid WeChat Pay resource: {str(e)}") from e
+
+
+# 创建全局微信支付签名上下文，首次使用时才加载密钥
+wechatpay_crypto = WeChatPayCrypto()
@@ -1,44 +1,130 @@
-from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
+from app.db.engine import create_engine
+
+# 创建异步引擎，连接池参数见 app/db/engine.py
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URL)
+
+# 只读副本引擎，未配置副本时与主库共用
+replica_engine = create_engine(settings.DB_REPLICA_URL, name="replica") if settings.DB_REPLICA_URL else engine
+
+
+class TrackedSession(Session):
+    """记录是否发生过写操作的会话，请求结束时只在有写操作时提交"""
+
+
+@event.listens_for(TrackedSession, "do_orm_execute")
+def _track_execute(orm_execute_state):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(TrackedSession, "before_flush")
+def _check_flush(session, flush_context, instances):
+    if session.info.get("read_only"):
+        raise InvalidRequestError("Cannot flush a read-only session")
+    session.info["has_writes"] = True
+
+
+@event.listens_for(TrackedSession, "after_commit")
+@event.listens_for(TrackedSession, "after_rollback")
+def _reset_writes(session):
+    session.info.pop("has_writes", None)
+
+
+class RoutingSession(TrackedSession):
+    """只读会话：默认查询只读副本，标记 use_primary 后改查主库（读己之写）"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.info.get("use_primary"):
+            return engine.sync_engine
+        return replica_engine.sync_engine
+
+
+def has_replica() -> bool:
+    return replica_engine is not engine
+
+
+def has_writes(session: AsyncSession) -> bool:
+    """会话是否有未提交的写操作"""
+    return bool(session.info.get("has_writes") or session.new or session.dirty or session.deleted)
 
-# 创建异步引擎
-engine = create_async_engine(
-    settings.SQLALCHEMY_DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=20,  # 基础连接池大小
-    max_overflow=100,  # 最大溢出连接数
-    pool_timeout=30,  # 连接超时时间
-    pool_recycle=1800,  # 连接回收时间（30分钟）
-    pool_pre_ping=True,  # 连接池健康检查
-    echo=False  # 是否打印SQL语句
-)
 
 # 创建异步会话工厂
 AsyncSessionLocal = sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=TrackedSession,
     expire_on_commit=False,
     autocommit=False,
     autoflush=False
 )
 
+# 只读会话工厂，由 RoutingSession 选择副本或主库
+ReadSessionLocal = sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+    info={"read_only": True}
+)
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     获取数据库会话的异步生成器
     使用上下文管理器确保会话正确关闭
+
+    会话在第一次执行语句时才从连接池签出连接，没用到数据库的请求不会占用连接；
+    请求结束时只在有写操作时提交，只读请求直接归还连接，省去一次COMMIT往返。
     """
     async with AsyncSessionLocal() as session:
         try:
             yield session
-            await session.commit()
+            if has_writes(session):
+                await session.commit()
         except Exception:
             await session.rollback()
             raise
         finally:
             await session.close()
 
-Base = declarative_base()
\ No newline at end of file
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    获取只读数据库会话，配置了 DB_REPLICA_URL 时查询只读副本
+    会话禁止flush，结束时直接回滚归还连接
+    """
+    async with read_session() as session:
+        yield session
+
+
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    """
+    短时只读会话，退出时立即关闭并归还连接
+
+    作为依赖注入的会话要到响应发送后才关闭，认证依赖这类只在处理函数之前查一次的场景用它，
+    避免处理函数执行期间连接一直签出（副本上 idle in transaction），也不和 get_db 同时占用两个连接。
+    """
+    async with ReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+def get_session(read_only: bool = False):
+    """
+    按读写类型返回会话依赖，用法: db: AsyncSession = Depends(get_session(read_only=True))
+    同一个请求内相同的依赖只创建一个会话
+    """
+    return get_read_db if read_only else get_db
+
+Base = declarative_base()
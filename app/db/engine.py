@@ -0,0 +1,156 @@
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class PoolMetrics:
+    """连接池指标：签出次数、当前占用、等待连接的耗时及超时次数"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.checked_out = 0
+        self.connects = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.pool = None
+
+    def on_connect(self, dbapi_connection, connection_record) -> None:
+        self.connects += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        self.checkouts += 1
+        self.checked_out += 1
+
+    def on_checkin(self, dbapi_connection, connection_record) -> None:
+        self.checked_out = max(0, self.checked_out - 1)
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        self.waits += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        if timed_out:
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "checkouts": self.checkouts,
+            "checked_out": self.checked_out,
+            "connects": self.connects,
+            "wait_avg_ms": round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "timeouts": self.timeouts,
+        }
+        if isinstance(self.pool, AsyncAdaptedQueuePool):
+            data.update({
+                "pool_size": self.pool.size(),
+                "overflow": self.pool.overflow(),
+                "idle": self.pool.checkedin(),
+            })
+        return data
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """记录等待可用连接耗时的异步连接池"""
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        if self.metrics is not None:
+            self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # dispose() 时连接池会被重建，沿用原来的指标对象
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+# 引擎名 -> 指标，供健康检查接口输出
+pool_metrics: Dict[str, PoolMetrics] = {}
+
+
+def pool_limits() -> Tuple[int, int]:
+    """
+    计算单个worker进程的连接池大小
+
+    配置了 DB_MAX_CONNECTIONS 时，把总连接数平均分给 WEB_CONCURRENCY 个uvicorn worker，
+    保证所有进程加起来不超过数据库的 max_connections。
+    """
+    pool_size = settings.DB_POOL_SIZE
+    max_overflow = settings.DB_MAX_OVERFLOW
+    if settings.DB_MAX_CONNECTIONS > 0:
+        workers = max(1, settings.WEB_CONCURRENCY)
+        budget = max(1, settings.DB_MAX_CONNECTIONS // workers)
+        pool_size = min(pool_size, budget)
+        max_overflow = max(0, min(max_overflow, budget - pool_size))
+    return pool_size, max_overflow
+
+
+def create_engine(url: str, name: str = "primary", pgbouncer: Optional[bool] = None) -> AsyncEngine:
+    """
+    按配置创建异步引擎
+
+    Args:
+        url: 数据库连接URL
+        name: 引擎名，用于指标
+        pgbouncer: 是否经由pgbouncer（事务模式）连接，默认使用配置。
+            此时由pgbouncer管理连接，本地使用NullPool并关闭asyncpg的预编译语句缓存
+    """
+    if pgbouncer is None:
+        pgbouncer = settings.DB_PGBOUNCER
+    metrics = PoolMetrics(name)
+    kwargs: Dict[str, Any] = {"echo": False}
+
+    if url.startswith("sqlite") and ":memory:" in url:
+        # 内存SQLite（本地测试）每个连接是独立的库，不使用连接池
+        pass
+    elif pgbouncer:
+        kwargs["poolclass"] = NullPool
+        kwargs["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            # 事务模式下连接会被不同客户端复用，预编译语句名不能重复
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    else:
+        pool_size, max_overflow = pool_limits()
+        kwargs.update(
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=pool_size,  # 基础连接池大小
+            max_overflow=max_overflow,  # 最大溢出连接数
+            pool_timeout=settings.DB_POOL_TIMEOUT,  # 等待连接超时时间
+            pool_recycle=settings.DB_POOL_RECYCLE,  # 连接回收时间
+            pool_pre_ping=True,  # 连接池健康检查
+        )
+        logger.info(f"Database engine {name}: pool_size={pool_size}, max_overflow={max_overflow}")
+
+    engine = create_async_engine(url, **kwargs)
+    pool = engine.sync_engine.pool
+    if isinstance(pool, InstrumentedAsyncQueuePool):
+        pool.metrics = metrics
+    metrics.pool = pool
+    event.listen(engine.sync_engine, "connect", metrics.on_connect)
+    event.listen(engine.sync_engine, "checkout", metrics.on_checkout)
+    event.listen(engine.sync_engine, "checkin", metrics.on_checkin)
+    pool_metrics[name] = metrics
+    return engine
@@ -0,0 +1,92 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db.database import has_replica
+
+
+class ReplicaLagTracker:
+    """
+    记录用户最近一次写入时间
+
+    用户刚支付、下单或修改信息后的 DB_REPLICA_LAG_SECONDS 秒内，该用户的只读查询改走主库，
+    避免因副本复制延迟读到旧数据。记录是进程内的，其他worker依赖 retry_on_primary 的兜底。
+    同时缓存副本当前的复制延迟，供 retry_on_primary 判断是否值得回主库重查。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._written_at: Dict[int, float] = {}
+        self._replica_lag = 0.0
+        self._lag_checked_at: Optional[float] = None
+
+    def mark_written(self, user_id: int) -> None:
+        if not has_replica():
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._written_at[user_id] = now
+            # 顺便清理过期记录，避免无限增长
+            if len(self._written_at) > 10000:
+                expired = now - settings.DB_REPLICA_LAG_SECONDS
+                self._written_at = {k: v for k, v in self._written_at.items() if v >= expired}
+
+    def is_recent(self, user_id: int) -> bool:
+        written_at = self._written_at.get(user_id)
+        return written_at is not None and time.monotonic() - written_at < settings.DB_REPLICA_LAG_SECONDS
+
+    async def replica_lag(self, db: AsyncSession) -> float:
+        """
+        副本的复制延迟（秒），最多每 DB_REPLICA_LAG_CHECK_INTERVAL 秒在副本上查询一次
+
+        已回放完收到的WAL时视为没有延迟（主库空闲时 pg_last_xact_replay_timestamp 会很旧）；
+        非PostgreSQL或查询失败时返回0。
+        """
+        now = time.monotonic()
+        if self._lag_checked_at is not None and now - self._lag_checked_at < settings.DB_REPLICA_LAG_CHECK_INTERVAL:
+            return self._replica_lag
+        self._lag_checked_at = now
+        if db.get_bind().dialect.name != "postgresql":
+            self._replica_lag = 0.0
+            return self._replica_lag
+        try:
+            result = await db.execute(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            ))
+            self._replica_lag = float(result.scalar() or 0.0)
+        except Exception as e:
+            logger.warning(f"Failed to query replica lag: {str(e)}")
+            self._replica_lag = 0.0
+        return self._replica_lag
+
+
+replica_lag_tracker = ReplicaLagTracker()
+
+
+def read_your_writes(db: AsyncSession, user_id: int) -> None:
+    """用户最近有写入时，让只读会话改查主库"""
+    if replica_lag_tracker.is_recent(user_id):
+        db.info["use_primary"] = True
+
+
+async def retry_on_primary(db: AsyncSession, user_id: int) -> bool:
+    """
+    只读会话在副本上没查到数据时调用，切换到主库并返回True，调用方据此重查一次
+
+    只有该用户最近有写入、或副本复制延迟超过 DB_REPLICA_RETRY_LAG_SECONDS 时才回主库，
+    副本已追上时查不到就是真的没有，不能让每个未命中的请求都打到主库。
+    已经在主库上或未配置副本时返回False。
+    """
+    if not db.info.get("read_only") or db.info.get("use_primary") or not has_replica():
+        return False
+    if not replica_lag_tracker.is_recent(user_id) and \
+            await replica_lag_tracker.replica_lag(db) <= settings.DB_REPLICA_RETRY_LAG_SECONDS:
+        return False
+    db.info["use_primary"] = True
+    return True
@@ -1,18 +1,18 @@
 import time
-import uuid
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from typing import Callable
 import traceback
 
 from app.core.logger import logger
+from app.core.snowflake import snowflake
 from app.core.i18n import i18n, get_language
 
 
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next: Callable):
         # 生成请求ID
-        request_id = str(uuid.uuid4())
+        request_id = str(snowflake.next_id())
         
         # 获取请求开始时间
         start_time = time.time()
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, DateTime, BigInteger, String, Text, JSON, Index, UniqueConstraint
+from sqlalchemy.sql import func
+
+from app.db.database import Base
+
+
+class JobStatus:
+    PENDING = "pending"  # 等待执行（包括等待重试）
+    RUNNING = "running"  # 已被worker领取
+    DONE = "done"  # 执行成功
+    DEAD = "dead"  # 超过最大重试次数（死信）
+
+
+class Job(Base):
+    """后台任务队列表，worker通过 FOR UPDATE SKIP LOCKED 并发领取"""
+    __tablename__ = "job_queue"
+    __table_args__ = (
+        # worker按队列、状态和执行时间领取任务
+        Index("ix_job_queue_queue_status_run_at", "queue", "status", "run_at"),
+        # 同一队列内相同去重键只入队一次（微信支付会重复推送同一通知），死信行在再次入队时重新排队
+        UniqueConstraint("queue", "dedup_key", name="uq_job_queue_queue_dedup_key"),
+    )
+    # SQLite只有INTEGER主键才会自增
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    queue = Column(String(64), nullable=False)
+    dedup_key = Column(String(128), nullable=True)
+    payload = Column(JSON, nullable=False)
+
+    status = Column(String(16), nullable=False, default=JobStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime, nullable=False, server_default=func.now())
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
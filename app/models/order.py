@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, Double, Boolean, BigInteger, String
+from sqlalchemy import Column, Integer, DateTime, Double, Boolean, BigInteger, String, Index
 from sqlalchemy.sql import func
 
 from app.db.database import Base
@@ -6,8 +6,13 @@ from app.db.database import Base
 
 class VipOrder(Base):
     __tablename__ = "vip_order"
-    id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
-    trade_no = Column(BigInteger, index=True, nullable=False)
+    __table_args__ = (
+        # 订单查询按用户、支付/退款状态过滤并按创建时间分页
+        Index("ix_vip_order_user_paid_return_created", "user_id", "is_paid", "is_return", "created_at"),
+    )
+    # SQLite 只有 INTEGER 主键会自增
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, index=True, autoincrement=True)
+    trade_no = Column(BigInteger, index=True, unique=True, nullable=False)  # Snowflake ID
     user_id = Column(Integer, index=True)
     vip_id = Column(Integer, index=True)
 
@@ -31,6 +31,8 @@ class User(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     is_super_admin = Column(Boolean, default=False)
+    # VIP状态变更时递增，令牌中VIP声明的 ver 与之不符即失效（各进程共享）
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
 
 @dataclass
 class CombineUser:
@@ -49,6 +51,7 @@ class CombineUser:
     vip_id: Optional[int] = None
     vip_level: Optional[VipLevel] = None
     order_id: Optional[int] = None
+    token_version: int = 0
 
 
 class UserInfo(Base):
@@ -1,4 +1,6 @@
+import asyncio
 import time
+from contextlib import aclosing
 from typing import List, Optional, Dict, Any
 import random
 
@@ -9,7 +11,9 @@ from app.core.logger import logger
 from app.models.rhythm_settings import RhythmDifficulty
 from app.services.melody_service import MelodyService, melody_service
 from app.core.config import settings
-import requests
+from app.services.llm_client import llm_client, StreamingJsonArrayParser
+from app.services.melody_bank_service import melody_bank_service
+from app.services.prompt_cache_service import prompt_cache_service
 import json
 
 from app.services.pitch_service import pitch_service
@@ -32,14 +36,18 @@ class AIMelodyService:
         }
         logger.info("AIMelodyService initialized with DeepSeek API configuration")
 
-    async def generate_melody_question(self, request: MelodySettingRequest) -> MelodyQuestionResponse:
+    async def generate_melody_question(self, request: MelodySettingRequest, user_id: Optional[int] = None) -> MelodyQuestionResponse:
         """生成旋律听写题，使用AI生成主旋律"""
         try:
             logger.info(f"Generating melody question with parameters: {request.dict()}")
             
-            # 1. 使用DeepSeek生成主旋律
-            correct_melody = await self._generate_ai_melody(request)
-            logger.info("Successfully generated correct melody")
+            # 1. 优先从旋律库取主旋律，桶为空时实时调用DeepSeek生成
+            correct_melody = await melody_bank_service.take(request)
+            if correct_melody is not None:
+                logger.info("Served correct melody from melody bank")
+            else:
+                correct_melody = await self._generate_ai_melody(request, user_id)
+                logger.info("Successfully generated correct melody")
 
             # 使用系统化方法生成错误选项
             wrong_options = melody_service._generate_wrong_options_systematic(correct_melody, request, count=4)
@@ -92,29 +100,83 @@ class AIMelodyService:
             logger.error(f"Error generating AI melody question: {str(e)}", exc_info=True)
             raise
 
-    async def _generate_ai_melody(self, request: MelodySettingRequest) -> MelodyScorePitch:
-        """使用DeepSeek生成旋律"""
+    async def _generate_ai_melody(self, request: MelodySettingRequest, user_id: Optional[int] = None,
+                                  use_cache: bool = True) -> MelodyScorePitch:
+        """使用DeepSeek生成旋律，优先使用提示词缓存"""
         try:
             logger.info("Starting AI melody generation")
-            
+
             # 构建提示词
             prompt = self._build_melody_prompt(request)
             logger.debug(f"Generated prompt: {prompt}")
-            
-            # 调用DeepSeek API
-            response = await self._call_deepseek_api(prompt)
-            logger.info("Successfully received response from DeepSeek API")
-            
-            # 解析响应并转换为MelodyScorePitch对象
-            melody = self._parse_ai_response(response, request)
-            # melody = self._parse_ai_response({}, request)
+            key = prompt_cache_service.make_key(prompt)
+
+            if use_cache:
+                cached = prompt_cache_service.get(key)
+                if cached is not None:
+                    logger.info("Served AI melody from prompt cache")
+                    return MelodyScorePitch(**json.loads(cached))
+
+            # 按用户限流，超限抛出 LLMRateLimitError
+            llm_client.check_rate_limit(user_id)
+
+            # 相同参数的并发请求共享一次上游调用
+            melody = await llm_client.run_deduplicated(key, lambda: self._request_ai_melody(prompt, request, key))
             logger.info("Successfully parsed AI response into melody")
-            
-            return melody
+
+            # 共享结果时每个调用方拿到独立副本，后续生成错误选项不会互相影响
+            return melody.copy(deep=True)
         except Exception as e:
             logger.error(f"Error generating AI melody: {str(e)}", exc_info=True)
             raise
 
+    async def _request_ai_melody(self, prompt: str, request: MelodySettingRequest, cache_key: str) -> MelodyScorePitch:
+        """调用DeepSeek API并转换为MelodyScorePitch对象，结果作为新变体写入提示词缓存"""
+        if settings.DEEPSEEK_STREAM:
+            melody = await self._stream_ai_melody(prompt, request)
+        else:
+            response = await self._call_deepseek_api(prompt)
+            logger.info("Successfully received response from DeepSeek API")
+            melody = self._parse_ai_response(response, request)
+
+        prompt_cache_service.put(cache_key, melody.json())
+        return melody
+
+    async def _stream_ai_melody(self, prompt: str, request: MelodySettingRequest) -> MelodyScorePitch:
+        """流式调用DeepSeek，每解析出一个完整小节就转换，小节数足够后立即断开"""
+        logger.info("Streaming DeepSeek API")
+        start_time = time.time()
+        target = request.measures_count.value
+        parser = StreamingJsonArrayParser("measures")
+        measures = []
+
+        async with aclosing(llm_client.stream_chat(prompt)) as chunks:
+            async for chunk in chunks:
+                for measure_group in parser.feed(chunk):
+                    measures.append(self._convert_measure_group(measure_group))
+                if len(measures) >= target or parser.done:
+                    break
+
+        if not measures:
+            logger.error(f"No measures parsed from DeepSeek stream: {parser.buffer}")
+            raise Exception("DeepSeek API returned no measures")
+        if len(measures) < target:
+            logger.warning(f"DeepSeek returned {len(measures)} measures, expected {target}")
+        logger.info(f"Parsed {len(measures)} measures from DeepSeek stream. Time cost={time.time()-start_time}")
+
+        return MelodyScorePitch(
+            measures=measures[:target],
+            time_signature=request.time_signature,
+            tempo=request.tempo,
+            is_correct=True
+        )
+
+    def start_bank_worker(self) -> asyncio.Task:
+        """启动旋律库后台补充任务，补充时总是请求新旋律"""
+        return asyncio.create_task(melody_bank_service.run_worker(
+            lambda request: self._generate_ai_melody(request, use_cache=False)
+        ))
+
     def _build_melody_prompt(self, request: MelodySettingRequest) -> str:
         """构建提示词"""
         logger.debug("Building melody prompt")
@@ -176,38 +238,12 @@ class AIMelodyService:
         return prompt
 
     async def _call_deepseek_api(self, prompt: str) -> Dict[str, Any]:
-        """调用DeepSeek API"""
+        """调用DeepSeek API（非流式）"""
         logger.info("Calling DeepSeek API")
         start_time = time.time()
-        headers = {
-            "Authorization": f"Bearer {self.deepseek_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "deepseek-chat",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.5,
-            "max_tokens": 5000,
-            "stream": False,
-            "top_p": 0.9,
-        }
-        
-        logger.debug(f"API request data: {data}")
-        
-        response = requests.post(
-            self.deepseek_api_url,
-            headers=headers,
-            json=data
-        )
-        
-        if response.status_code != 200:
-            logger.error(f"DeepSeek API error: {response.text}")
-            raise Exception(f"DeepSeek API error: {response.text}")
-            
+        response = await llm_client.chat(prompt)
         logger.info(f"Successfully received response from DeepSeek API. Time cost={time.time()-start_time}")
-        return response.json()
-
+        return response
 
     def _parse_ai_response(self, response: Dict[str, Any], request: MelodySettingRequest) -> MelodyScorePitch:
         """解析AI响应并转换为MelodyScorePitch对象"""
@@ -344,30 +380,7 @@ class AIMelodyService:
             
             # 转换为MelodyScorePitch对象
             # 创建measures列表
-            measures = []
-            for measure_group in melody_data["measures"]:
-                measures_sub = []
-                for measure in measure_group:
-                    notes = []
-                    for note_data in measure["notes"]:
-                        # 创建Pitch对象
-                        pitch_name = note_data["pitch"]
-                        # 根据音高名称获取pitch_number
-                        pitch = pitch_service.get_pitch_by_name(pitch_name)
-                        if pitch is None or len(pitch) != 1:
-                            logger.error(f"Pitch {pitch_name} not found")
-                            continue
-
-                        melody_note = MelodyNotePitch(
-                            duration=note_data["duration"],
-                            pitch=pitch[0],
-                            is_rest = note_data.get("is_rest", False),
-                            is_dotted= note_data.get("is_dotted", False),
-                            tied_to_next= note_data.get("tied_to_next", False),
-                        )
-                        notes.append(melody_note)
-                    measures_sub.append(MelodyMeasurePitch(notes=notes))
-                measures.append(measures_sub)
+            measures = [self._convert_measure_group(measure_group) for measure_group in melody_data["measures"]]
 
             # 创建MelodyScorePitch对象
             melody = MelodyScorePitch(
@@ -385,4 +398,29 @@ class AIMelodyService:
 
 
 
+    def _convert_measure_group(self, measure_group: List[Dict[str, Any]]) -> List[MelodyMeasurePitch]:
+        """将AI返回的一个小节转换为MelodyMeasurePitch列表"""
+        measures_sub = []
+        for measure in measure_group:
+            notes = []
+            for note_data in measure["notes"]:
+                # 根据音高名称获取pitch
+                pitch_name = note_data["pitch"]
+                pitch = pitch_service.get_pitch_by_name(pitch_name)
+                if pitch is None or len(pitch) != 1:
+                    logger.error(f"Pitch {pitch_name} not found")
+                    continue
+
+                melody_note = MelodyNotePitch(
+                    duration=note_data["duration"],
+                    pitch=pitch[0],
+                    is_rest=note_data.get("is_rest", False),
+                    is_dotted=note_data.get("is_dotted", False),
+                    tied_to_next=note_data.get("tied_to_next", False),
+                )
+                notes.append(melody_note)
+            measures_sub.append(MelodyMeasurePitch(notes=notes))
+        return measures_sub
+
+
 ai_melody_service = AIMelodyService()
\ No newline at end of file
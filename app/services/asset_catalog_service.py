@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+import soundfile as sf
+
+from app.core.config import settings
+from app.core.logger import logger
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac")
+
+
+@dataclass
+class CatalogEntry:
+    name: str
+    size: int
+    digest: str  # 内容哈希（sha256前16位）
+    duration: Optional[float]  # 音频时长（秒），非音频或无法解析时为None
+    mtime_ns: int
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("mtime_ns")
+        return data
+
+
+@dataclass
+class AssetCatalog:
+    directory: str
+    entries: List[CatalogEntry]
+    digest: str  # 整个目录清单的哈希，作为ETag
+    exists: bool
+    # 扫描时的 (文件名, 大小, 修改时间)，轮询时比较
+    signature: Tuple[Tuple[str, int, int], ...] = ()
+
+
+class AssetCatalogService:
+    """
+    静态资源目录清单服务
+
+    启动时扫描一次已登记的目录，记录每个文件的名称、大小、内容哈希和音频时长，
+    之后请求直接返回内存中的有序清单，不再访问文件系统。
+    - 后台按 ASSET_CATALOG_POLL_INTERVAL 轮询文件大小和修改时间，有变化时重新扫描，未变化的文件沿用原哈希
+    - 清单按文件名排序，支持分页，ETag为清单哈希
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AssetCatalogService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self._directories: Dict[str, str] = {}
+            self._catalogs: Dict[str, AssetCatalog] = {}
+
+    def register(self, name: str, directory: str) -> None:
+        self._directories[name] = directory
+
+    @staticmethod
+    def _signature(directory: str) -> Tuple[Tuple[str, int, int], ...]:
+        """目录下普通文件的 (名称, 大小, 修改时间)，按名称排序"""
+        with os.scandir(directory) as it:
+            files = [(entry.name, entry.stat()) for entry in it if entry.is_file()]
+        return tuple(sorted((name, stat.st_size, stat.st_mtime_ns) for name, stat in files))
+
+    @staticmethod
+    def _describe(path: str, name: str, size: int, mtime_ns: int) -> CatalogEntry:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        duration = None
+        if name.lower().endswith(AUDIO_EXTENSIONS):
+            try:
+                duration = round(sf.info(path).duration, 3)
+            except Exception as e:
+                logger.warning(f"Failed to read audio info of {path}: {str(e)}")
+        return CatalogEntry(name=name, size=size, digest=sha.hexdigest()[:16], duration=duration, mtime_ns=mtime_ns)
+
+    def scan(self, name: str) -> AssetCatalog:
+        """扫描目录；大小和修改时间都未变的文件沿用上次的哈希和时长"""
+        directory = self._directories[name]
+        if not os.path.isdir(directory):
+            catalog = AssetCatalog(directory=directory, entries=[], digest="", exists=False)
+            self._catalogs[name] = catalog
+            return catalog
+        previous = {entry.name: entry for entry in self._catalogs[name].entries} if name in self._catalogs else {}
+        signature = self._signature(directory)
+        entries = []
+        for filename, size, mtime_ns in signature:
+            entry = previous.get(filename)
+            if entry is None or entry.size != size or entry.mtime_ns != mtime_ns:
+                entry = self._describe(os.path.join(directory, filename), filename, size, mtime_ns)
+            entries.append(entry)
+        digest = hashlib.sha256("\n".join(f"{entry.name}:{entry.digest}" for entry in entries).encode()).hexdigest()[:16]
+        catalog = AssetCatalog(directory=directory, entries=entries, digest=digest, exists=True, signature=signature)
+        self._catalogs[name] = catalog
+        logger.info(f"Scanned asset catalog {name}: {len(entries)} files in {directory}")
+        return catalog
+
+    def scan_all(self) -> None:
+        for name in self._directories:
+            self.scan(name)
+
+    def refresh(self, name: str) -> bool:
+        """目录内容有变化时重新扫描，返回是否发生了变化"""
+        catalog = self._catalogs.get(name)
+        directory = self._directories[name]
+        exists = os.path.isdir(directory)
+        if catalog is not None and catalog.exists == exists and \
+                (not exists or catalog.signature == self._signature(directory)):
+            return False
+        self.scan(name)
+        return True
+
+    async def run_poller(self, interval: Optional[float] = None) -> None:
+        """后台轮询循环"""
+        interval = interval or settings.ASSET_CATALOG_POLL_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            for name in list(self._directories):
+                try:
+                    await asyncio.to_thread(self.refresh, name)
+                except Exception as e:
+                    logger.error(f"Failed to refresh asset catalog {name}: {str(e)}", exc_info=True)
+
+    def start_poller(self) -> asyncio.Task:
+        return asyncio.create_task(self.run_poller())
+
+    def get(self, name: str) -> AssetCatalog:
+        catalog = self._catalogs.get(name)
+        if catalog is None:
+            catalog = self.scan(name)
+        return catalog
+
+    def page(self, name: str, offset: int = 0, limit: Optional[int] = None) -> Tuple[dict, str]:
+        """
+        分页返回清单
+
+        Returns:
+            (JSON内容, ETag)；目录不存在时抛出 FileNotFoundError
+        """
+        catalog = self.get(name)
+        if not catalog.exists:
+            raise FileNotFoundError(catalog.directory)
+        limit = min(limit or settings.ASSET_CATALOG_PAGE_SIZE, settings.ASSET_CATALOG_MAX_PAGE_SIZE)
+        items = catalog.entries[offset:offset + limit]
+        body = {
+            "total": len(catalog.entries),
+            "offset": offset,
+            "limit": limit,
+            "items": [entry.to_dict() for entry in items],
+        }
+        return body, f'"{catalog.digest}-{offset}-{limit}"'
+
+
+# 创建全局资源清单服务实例
+asset_catalog_service = AssetCatalogService()
@@ -0,0 +1,312 @@
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# tone_{钢琴键位号}_{音名}.mp3
+TONE_FILE_PATTERN = re.compile(r"^tone_(\d+)_.+\.(mp3|wav)$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# ASGI零拷贝扩展（服务器支持时用sendfile发送）
+ZEROCOPY_EXTENSION = "http.response.zerocopy"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否匹配；使用弱比较，W/"..." 与强ETag视为匹配，支持逗号分隔的多个ETag和 *"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+@dataclass
+class AudioAsset:
+    pitch_number: Optional[int]  # 采样包等非单个键位的资源为None
+    path: str
+    filename: str
+    size: int
+    digest: str  # 内容哈希（sha256前16位）
+    media_type: str
+    stat: os.stat_result
+    # 内存映射或常驻内存的内容，AUDIO_ASSET_STORE=file 时为None
+    buffer: Optional[memoryview] = field(default=None, repr=False)
+    in_memory: bool = False
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+@dataclass
+class AssetHitStats:
+    hits: int = 0
+    range_hits: int = 0
+    not_modified: int = 0
+    bytes_sent: int = 0
+
+
+class SampleResponse(Response):
+    """
+    直接发送采样缓冲区的响应
+
+    开启 AUDIO_ASSET_SENDFILE 且服务器支持 http.response.zerocopy 扩展时用sendfile从页缓存发送；
+    否则按块切片 memoryview，每块只在交给服务器时复制一次，不读文件也不复制整个采样。
+    """
+    chunk_size = 256 * 1024
+
+    def __init__(self, asset: AudioAsset, start: int, end: int, status_code: int, headers: Dict[str, str]):
+        self.asset = asset
+        self.start = start
+        self.end = end
+        super().__init__(
+            status_code=status_code,
+            headers={**headers, "Content-Length": str(end - start + 1)},
+            media_type=asset.media_type,
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        count = self.end - self.start + 1
+        if settings.AUDIO_ASSET_SENDFILE and ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.asset.path, "rb") as f:
+                await send({"type": ZEROCOPY_EXTENSION, "file": f, "offset": self.start, "count": count, "more_body": False})
+            return
+        view = self.asset.buffer
+        position = self.start
+        while True:
+            chunk_end = min(position + self.chunk_size, self.end + 1)
+            more_body = chunk_end <= self.end
+            # ASGI要求body为bytes
+            await send({"type": "http.response.body", "body": bytes(view[position:chunk_end]), "more_body": more_body})
+            if not more_body:
+                break
+            position = chunk_end
+
+
+class AudioAssetService:
+    """
+    钢琴音频资源服务
+
+    启动时扫描音频目录，预先计算每个采样的内容哈希和大小，之后请求不再访问文件元数据。
+    - 支持 ETag / If-None-Match 返回304
+    - 支持单段 Range 请求（206 / 416）
+    - 以内容哈希作为URL的一部分（/piano/pitch/audio/asset/{digest}），可长期不可变缓存
+    - 采样内存映射（AUDIO_ASSET_STORE=mmap），中音区热门采样读入内存，响应直接发送 memoryview 切片
+    - 按键位统计命中次数和发送字节数
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AudioAssetService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.directory = settings.AUDIO_ASSET_DIR
+            self._by_pitch: Dict[int, AudioAsset] = {}
+            self._by_digest: Dict[str, AudioAsset] = {}
+            self._stats: Dict[int, AssetHitStats] = {}
+            self._loaded = False
+
+    @staticmethod
+    def _hot_range() -> Tuple[int, int]:
+        first, last = settings.AUDIO_ASSET_HOT_PITCHES.split("-")
+        return int(first), int(last)
+
+    def _open_buffer(self, path: str, pitch_number: int, size: int) -> Tuple[Optional[memoryview], bool]:
+        """按存储模式返回 (缓冲区, 是否常驻内存)"""
+        store = settings.AUDIO_ASSET_STORE
+        if store == "file" or size == 0:
+            return None, False
+        first, last = self._hot_range()
+        if store == "memory" or first <= pitch_number <= last:
+            with open(path, "rb") as f:
+                return memoryview(f.read()), True
+        with open(path, "rb") as f:
+            # 映射在没有memoryview引用后（重新加载且响应结束）由垃圾回收释放
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)), False
+
+    @staticmethod
+    def _hash(buffer: Optional[memoryview], path: str) -> str:
+        sha = hashlib.sha256()
+        if buffer is not None:
+            sha.update(buffer)
+        else:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(chunk)
+        return sha.hexdigest()[:16]
+
+    def load(self, directory: Optional[str] = None) -> None:
+        """扫描目录，计算哈希并映射内容；同一键位同时有mp3和wav时使用mp3（体积小）"""
+        self.directory = directory or self.directory
+        files: Dict[int, str] = {}
+        for filename in sorted(os.listdir(self.directory)):
+            match = TONE_FILE_PATTERN.match(filename)
+            if not match:
+                continue
+            pitch_number = int(match.group(1))
+            if files.get(pitch_number, "").endswith(".mp3"):
+                continue
+            files[pitch_number] = filename
+
+        by_pitch: Dict[int, AudioAsset] = {}
+        for pitch_number, filename in files.items():
+            path = os.path.join(self.directory, filename)
+            stat = os.stat(path)
+            buffer, in_memory = self._open_buffer(path, pitch_number, stat.st_size)
+            by_pitch[pitch_number] = AudioAsset(
+                pitch_number=pitch_number,
+                path=path,
+                filename=filename,
+                size=stat.st_size,
+                digest=self._hash(buffer, path),
+                media_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                stat=stat,
+                buffer=buffer,
+                in_memory=in_memory,
+            )
+        self._by_pitch = by_pitch
+        self._by_digest = {asset.digest: asset for asset in by_pitch.values()}
+        self._loaded = True
+        resident = sum(asset.size for asset in by_pitch.values() if asset.in_memory)
+        logger.info(f"Loaded {len(by_pitch)} audio assets from {self.directory} "
+                    f"({settings.AUDIO_ASSET_STORE}, {resident} bytes resident)")
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def get(self, pitch_number: int) -> Optional[AudioAsset]:
+        self._ensure_loaded()
+        return self._by_pitch.get(pitch_number)
+
+    def get_by_digest(self, digest: str) -> Optional[AudioAsset]:
+        self._ensure_loaded()
+        return self._by_digest.get(digest)
+
+    def all(self) -> List[AudioAsset]:
+        self._ensure_loaded()
+        return [self._by_pitch[number] for number in sorted(self._by_pitch)]
+
+    @staticmethod
+    def url_for(asset: AudioAsset) -> str:
+        """带内容哈希的URL，内容变化时URL随之变化"""
+        return f"{settings.API_V1_STR}/piano/pitch/audio/asset/{asset.digest}"
+
+    def _record(self, asset: AudioAsset, status_code: int, sent: int) -> None:
+        if asset.pitch_number is None:
+            return
+        stats = self._stats.get(asset.pitch_number)
+        if stats is None:
+            stats = self._stats[asset.pitch_number] = AssetHitStats()
+        if status_code == 304:
+            stats.not_modified += 1
+            return
+        stats.hits += 1
+        if status_code == 206:
+            stats.range_hits += 1
+        stats.bytes_sent += sent
+
+    def hit_stats(self) -> Dict[int, dict]:
+        """每个键位的命中统计，按命中次数倒序"""
+        ordered = sorted(self._stats.items(), key=lambda item: item[1].hits + item[1].not_modified, reverse=True)
+        return {
+            pitch_number: {
+                "hits": stats.hits,
+                "range_hits": stats.range_hits,
+                "not_modified": stats.not_modified,
+                "bytes_sent": stats.bytes_sent,
+                "in_memory": self._by_pitch[pitch_number].in_memory if pitch_number in self._by_pitch else False,
+            }
+            for pitch_number, stats in ordered
+        }
+
+    @staticmethod
+    def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+        """
+        解析单段Range头，返回闭区间 (start, end)
+
+        多段Range、非bytes单位和语法无效的Range（如 bytes=10-5）返回None，按完整内容响应；
+        范围无法满足（起点超出内容长度）时抛出ValueError
+        """
+        match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", header)
+        if not match:
+            return None
+        first, last = match.groups()
+        if first == "" and last == "":
+            return None
+        if first == "":
+            # 后缀范围：最后N个字节
+            length = int(last)
+            if length == 0:
+                raise ValueError(f"Unsatisfiable range: {header}")
+            return max(0, size - length), size - 1
+        start = int(first)
+        if last != "" and int(last) < start:
+            return None
+        if start >= size:
+            raise ValueError(f"Unsatisfiable range: {header}")
+        return start, size - 1 if last == "" else min(int(last), size - 1)
+
+    def _read(self, asset: AudioAsset, start: int, end: int) -> bytes:
+        with open(asset.path, "rb") as f:
+            f.seek(start)
+            return f.read(end - start + 1)
+
+    def _body_response(self, asset: AudioAsset, start: int, end: int, status_code: int,
+                       headers: Dict[str, str]) -> Response:
+        self._record(asset, status_code, end - start + 1)
+        if asset.buffer is not None:
+            return SampleResponse(asset, start, end, status_code, headers)
+        if status_code == 200:
+            return FileResponse(asset.path, media_type=asset.media_type, headers=headers, stat_result=asset.stat)
+        return Response(content=self._read(asset, start, end), status_code=status_code,
+                        media_type=asset.media_type, headers=headers)
+
+    def response(self, request: Request, asset: AudioAsset, immutable: bool = False) -> Response:
+        """按请求头返回 304 / 206 / 416 / 200 响应"""
+        headers = {
+            "ETag": asset.etag,
+            "Accept-Ranges": "bytes",
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else f"public, max-age={settings.AUDIO_ASSET_MAX_AGE}",
+            "Content-Disposition": f"inline; filename={asset.filename}",
+        }
+        if_none_match = request.headers.get("if-none-match")
+        if etag_matches(if_none_match, asset.etag):
+            self._record(asset, 304, 0)
+            return Response(status_code=304, headers=headers)
+
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (not if_range or if_range.strip() == asset.etag):
+            try:
+                byte_range = self.parse_range(range_header, asset.size)
+            except ValueError:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{asset.size}"})
+            if byte_range is not None:
+                start, end = byte_range
+                headers["Content-Range"] = f"bytes {start}-{end}/{asset.size}"
+                return self._body_response(asset, start, end, 206, headers)
+        return self._body_response(asset, 0, asset.size - 1, 200, headers)
+
+
+# 创建全局音频资源服务实例
+audio_asset_service = AudioAssetService()
@@ -0,0 +1,152 @@
+import os
+import zipfile
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from app.core import music_math
+from app.core.config import settings
+from app.core.logger import logger
+
+# zip本地文件头固定部分长度
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def mmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """
+    内存映射未压缩的 .npz
+
+    np.load 对 .npz 会忽略 mmap_mode，这里直接定位每个 .npy 成员在zip中的数据偏移，用 np.memmap 映射。
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} member {info.filename} is compressed and cannot be memory-mapped")
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + ZIP_LOCAL_HEADER_SIZE + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            shape, fortran_order, dtype = np.lib.format._read_array_header(f, version)
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", shape=shape,
+                                     order="F" if fortran_order else "C", offset=f.tell())
+    return arrays
+
+
+@dataclass
+class ReferenceFeatures:
+    pitch_number: int
+    f0: float
+    f0_nominal: float
+    f0_track: np.ndarray
+    harmonics: np.ndarray
+    onset_envelope: np.ndarray
+    rms: np.ndarray
+
+    @property
+    def cents_offset(self) -> float:
+        """采样相对十二平均律的音分偏差"""
+        return music_math.cents(self.f0, self.f0_nominal)
+
+
+class AudioFeatureService:
+    """
+    钢琴采样参考特征服务
+
+    启动时内存映射 app.utils.audio_feature_builder 生成的 .npz，请求中按键位查询参考基频、谐波谱、
+    起音包络和RMS，不再在请求时分析参考采样。特征文件尚未生成时 available 为False。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AudioFeatureService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.path = settings.AUDIO_FEATURE_PATH
+            self._arrays: Dict[str, np.ndarray] = {}
+            self._index: Dict[int, int] = {}
+            self._log_f0: Optional[np.ndarray] = None
+            self.sample_rate = 0
+            self.hop_length = 0
+
+    def load(self, path: Optional[str] = None) -> None:
+        self.path = path or self.path
+        if not os.path.exists(self.path):
+            logger.warning(f"Audio feature file not found: {self.path}")
+            self._arrays, self._index, self._log_f0 = {}, {}, None
+            return
+        arrays = mmap_npz(self.path)
+        self._arrays = arrays
+        self._index = {int(number): row for row, number in enumerate(arrays["pitch_numbers"])}
+        self._log_f0 = np.log2(np.asarray(arrays["f0"], dtype=np.float64))
+        self.sample_rate = int(arrays["sample_rate"])
+        self.hop_length = int(arrays["hop_length"])
+        logger.info(f"Mapped reference features of {len(self._index)} piano samples from {self.path}")
+
+    @property
+    def available(self) -> bool:
+        return bool(self._index)
+
+    def frame_times(self) -> np.ndarray:
+        """逐帧特征对应的时间（秒）"""
+        return np.arange(self._arrays["f0_track"].shape[1]) * self.hop_length / self.sample_rate
+
+    def _row(self, pitch_number: int) -> int:
+        row = self._index.get(pitch_number)
+        if row is None:
+            raise KeyError(f"No reference features for pitch {pitch_number}")
+        return row
+
+    def get(self, pitch_number: int) -> ReferenceFeatures:
+        """单个键位的参考特征，数组为内存映射的只读视图"""
+        row = self._row(pitch_number)
+        arrays = self._arrays
+        return ReferenceFeatures(
+            pitch_number=pitch_number,
+            f0=float(arrays["f0"][row]),
+            f0_nominal=float(arrays["f0_nominal"][row]),
+            f0_track=arrays["f0_track"][row],
+            harmonics=arrays["harmonics"][row],
+            onset_envelope=arrays["onset_envelope"][row],
+            rms=arrays["rms"][row],
+        )
+
+    def f0(self, pitch_numbers: Sequence[int]) -> np.ndarray:
+        """批量查询参考基频"""
+        rows = np.array([self._row(number) for number in pitch_numbers], dtype=np.intp)
+        return np.asarray(self._arrays["f0"][rows], dtype=np.float64)
+
+    def nearest(self, frequencies) -> np.ndarray:
+        """按实测参考基频（对数距离）找最近的键位，支持数组输入"""
+        if self._log_f0 is None:
+            raise KeyError("Reference features are not loaded")
+        log_f = np.log2(np.asarray(frequencies, dtype=np.float64))
+        rows = np.abs(log_f[..., None] - self._log_f0).argmin(axis=-1)
+        return np.asarray(self._arrays["pitch_numbers"])[rows].astype(np.int64)
+
+    def cents_from_reference(self, pitch_number: int, frequencies) -> np.ndarray:
+        """相对参考采样实测基频的音分偏差"""
+        reference = self.get(pitch_number).f0
+        return music_math.cents(frequencies, reference)
+
+    def harmonic_similarity(self, pitch_number: int, profile) -> float:
+        """与参考谐波谱的余弦相似度"""
+        reference = np.asarray(self.get(pitch_number).harmonics, dtype=np.float64)
+        profile = np.asarray(profile, dtype=np.float64)[:len(reference)]
+        reference = reference[:len(profile)]
+        norm = np.linalg.norm(reference) * np.linalg.norm(profile)
+        return float(reference @ profile / norm) if norm > 0 else 0.0
+
+
+# 创建全局参考特征服务实例
+audio_feature_service = AudioFeatureService()
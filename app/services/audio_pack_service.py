@@ -0,0 +1,113 @@
+import json
+import os
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.services.audio_asset_service import AudioAsset
+from app.utils.audio_pack_builder import MANIFEST_NAME
+
+
+class AudioPackService:
+    """
+    钢琴采样包服务
+
+    读取 app.utils.audio_pack_builder 生成的 manifest.json，每个码率一个采样包，启动时读入内存。
+    小程序先按网络类型取索引（包的哈希URL和每个采样的偏移），再一次请求下载整个包，
+    按偏移切出各个采样；包的URL带内容哈希，可长期不可变缓存，响应支持Range断点续传。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AudioPackService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.directory = settings.AUDIO_PACK_DIR
+            self._packs: Dict[str, dict] = {}
+            self._by_digest: Dict[str, AudioAsset] = {}
+            self._loaded = False
+
+    def load(self, directory: Optional[str] = None) -> None:
+        """读取manifest和采样包；尚未构建时不提供采样包"""
+        self.directory = directory or self.directory
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        packs: Dict[str, dict] = {}
+        by_digest: Dict[str, AudioAsset] = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            for name, pack in manifest["packs"].items():
+                path = os.path.join(self.directory, pack["file"])
+                with open(path, "rb") as f:
+                    data = f.read()
+                by_digest[pack["digest"]] = AudioAsset(
+                    pitch_number=None,
+                    path=path,
+                    filename=pack["file"],
+                    size=len(data),
+                    digest=pack["digest"],
+                    media_type="application/octet-stream",
+                    stat=os.stat(path),
+                    buffer=memoryview(data),
+                    in_memory=True,
+                )
+                packs[name] = pack
+        else:
+            logger.warning(f"Audio pack manifest not found: {manifest_path}")
+        self._packs = packs
+        self._by_digest = by_digest
+        self._loaded = True
+        logger.info(f"Loaded {len(packs)} audio packs from {self.directory}")
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    @staticmethod
+    def _network_profiles() -> Dict[str, str]:
+        return dict(item.strip().split(":") for item in settings.AUDIO_PACK_NETWORK_PROFILES.split(","))
+
+    def profile_for(self, network: Optional[str] = None, profile: Optional[str] = None) -> Optional[str]:
+        """
+        选择采样包
+
+        Args:
+            network: 小程序 wx.getNetworkType 返回的网络类型（wifi/5g/4g/3g/2g/unknown）
+            profile: 客户端指定的码率档位，优先于网络类型
+        """
+        self._ensure_loaded()
+        if profile:
+            return profile if profile in self._packs else None
+        chosen = self._network_profiles().get((network or "").lower(), settings.AUDIO_PACK_DEFAULT_PROFILE)
+        if chosen in self._packs:
+            return chosen
+        # 配置的档位没有构建时退回码率最低的包
+        return min(self._packs, key=lambda name: self._packs[name]["bitrate"], default=None)
+
+    def index(self, profile: str) -> dict:
+        """采样包索引：包的哈希URL和每个采样在包内的偏移"""
+        self._ensure_loaded()
+        pack = self._packs[profile]
+        return {
+            "profile": profile,
+            "bitrate": pack["bitrate"],
+            "sample_rate": pack["sample_rate"],
+            "media_type": pack["media_type"],
+            "digest": pack["digest"],
+            "size": pack["size"],
+            "url": f"{settings.API_V1_STR}/piano/pitch/audio/pack/{pack['digest']}",
+            "entries": pack["entries"],
+        }
+
+    def get_by_digest(self, digest: str) -> Optional[AudioAsset]:
+        self._ensure_loaded()
+        return self._by_digest.get(digest)
+
+
+# 创建全局采样包服务实例
+audio_pack_service = AudioPackService()
@@ -6,6 +6,9 @@ from pathlib import Path
 import io
 from scipy.signal import find_peaks
 
+from app.core import music_math
+from app.services.melody_assessment_service import melody_assessment_service, TargetNotes
+
 
 class AudioProcessor:
     def __init__(self):
@@ -189,9 +192,7 @@ class AudioProcessor:
         Returns:
             str: 音符名称
         """
-        # 使用librosa将频率转换为音符名称
-        note = librosa.hz_to_note(frequency)
-        return note
+        return music_math.hz_to_note(frequency)
     
     def compare_pitch_accuracy(self, target_note: str, recorded_pitch: float) -> float:
         """比较目标音符和录制音高的准确度
@@ -203,43 +204,39 @@ class AudioProcessor:
         Returns:
             float: 音分偏差
         """
-        target_hz = librosa.note_to_hz(target_note)
-        cents_diff = 1200 * np.log2(recorded_pitch / target_hz)
-        return cents_diff
+        return music_math.cents(recorded_pitch, music_math.note_to_hz(target_note))
     
     def analyze_melody(self, audio: np.ndarray, target_notes: List[str]) -> Tuple[float, float]:
-        """分析旋律的音高和节奏准确度"""
-        # 检测音高
-        pitches = self.detect_pitch(audio)
-        
-        # 获取音符时间点
-        onset_frames = librosa.onset.onset_detect(y=audio, sr=self.sample_rate)
-        onset_times = librosa.frames_to_time(onset_frames, sr=self.sample_rate)
-        
-        # 计算音高准确度
-        pitch_accuracies = []
-        for i, target_note in enumerate(target_notes):
-            if i < len(onset_frames):
-                frame_idx = onset_frames[i]
-                if frame_idx < len(pitches):
-                    detected_pitch = pitches[frame_idx]
-                    accuracy = self.compare_pitch_accuracy(target_note, detected_pitch)
-                    pitch_accuracies.append(accuracy)
-        
-        # 计算节奏准确度（基于音符间隔的一致性）
-        timing_accuracy = 100.0  # 默认完美
-        if len(onset_times) > 1:
-            target_intervals = np.diff(np.linspace(0, len(target_notes), len(target_notes)+1)[:-1])
-            detected_intervals = np.diff(onset_times)
-            if len(detected_intervals) > 0:
-                # 归一化间隔并计算差异
-                target_intervals = target_intervals / np.mean(target_intervals)
-                detected_intervals = detected_intervals / np.mean(detected_intervals)
-                timing_accuracy = max(0, 100 - 50 * np.mean(np.abs(target_intervals - detected_intervals[:len(target_intervals)])))
-        
+        """分析旋律的音高和节奏准确度
+
+        逐帧基频和起音只计算一次，用DTW把唱出的音与目标音对齐；目标音按等时值处理，
+        拍长取唱出的音的起音间隔中位数。
+
+        Args:
+            audio: 音频数据（self.sample_rate）
+            target_notes: 目标音符名称列表，如 ["C4", "E4", "G4"]
+
+        Returns:
+            Tuple[float, float]: (平均绝对音分偏差, 节奏准确度0~100)
+
+        注意第一个值的含义与原实现不同：原来是带符号的平均音分偏差（正数偏高），
+        现在是所有对齐上的音的平均绝对偏差，不再区分偏高偏低；
+        一个音都没有对齐上时返回 NaN，而不是表示完全准确的 0。
+        """
+        y = melody_assessment_service.resample(audio, self.sample_rate)
+        sung = melody_assessment_service.analyze(y)
+        beat_seconds = float(np.median(np.diff(sung.onsets))) if len(sung.onsets) > 1 else 1.0
+        count = len(target_notes)
+        target = TargetNotes(
+            onsets=np.arange(count) * beat_seconds,
+            durations=np.full(count, beat_seconds),
+            pitch_numbers=music_math.note_to_key(target_notes),
+            beat_seconds=beat_seconds,
+        )
+        result = melody_assessment_service.grade(sung, target)
         return (
-            float(np.mean(pitch_accuracies)) if pitch_accuracies else 0.0,
-            float(timing_accuracy)
+            float(result.mean_abs_cents) if result.mean_abs_cents is not None else float("nan"),
+            float(result.timing_accuracy * 100)
         )
     
     def save_audio(self, audio: np.ndarray, file_path: str) -> None:
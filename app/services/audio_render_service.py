@@ -0,0 +1,181 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from math import gcd
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.pitch_setting import PlayMode, ChordPlayMode
+from app.services.audio_asset_service import audio_asset_service, TONE_FILE_PATTERN
+
+# 输出格式 -> (soundfile格式, 编码, Content-Type)
+RENDER_FORMATS = {
+    "mp3": ("MP3", "MPEG_LAYER_III", "audio/mpeg"),
+    "wav": ("WAV", "PCM_16", "audio/wav"),
+}
+RENDER_KINDS = ("interval", "chord")
+FADE_OUT_SECONDS = 0.05
+
+
+@dataclass
+class RenderedClip:
+    data: bytes
+    media_type: str
+    digest: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+class AudioRenderService:
+    """
+    题目音频渲染服务
+
+    把音程、和弦题的2~4个钢琴采样按播放方式混成一段音频，客户端每题只需请求一次，
+    在慢速手机上也不会出现各音不同步的问题。
+    - 采样只解码一次，转为单声道 float32 PCM（AUDIO_RENDER_SAMPLE_RATE）缓存在内存中
+    - 和声/柱式同时发声，上行/下行/分解依次发声，用NumPy切片整体叠加
+    - 渲染结果按 (音高序列, 题型, 播放方式) 做LRU缓存；转位已体现在音高顺序中
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AudioRenderService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.sample_rate = settings.AUDIO_RENDER_SAMPLE_RATE
+            self._pcm: Dict[int, np.ndarray] = {}
+            self._sources: Optional[Dict[int, str]] = None
+            self._clips: "OrderedDict[Tuple, RenderedClip]" = OrderedDict()
+            self._lock = threading.Lock()
+            self.hits = 0
+            self.misses = 0
+
+    def _source_paths(self) -> Dict[int, str]:
+        """优先使用 origin 目录下的无损WAV，没有时使用压缩后的采样"""
+        if self._sources is None:
+            sources = {asset.pitch_number: asset.path for asset in audio_asset_service.all()}
+            origin_dir = os.path.join(audio_asset_service.directory, "origin")
+            if os.path.isdir(origin_dir):
+                for filename in os.listdir(origin_dir):
+                    match = TONE_FILE_PATTERN.match(filename)
+                    if match:
+                        sources[int(match.group(1))] = os.path.join(origin_dir, filename)
+            self._sources = sources
+        return self._sources
+
+    def _decode(self, path: str) -> np.ndarray:
+        data, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+        pcm = data.mean(axis=1)
+        if sample_rate != self.sample_rate:
+            divisor = gcd(sample_rate, self.sample_rate)
+            pcm = resample_poly(pcm, self.sample_rate // divisor, sample_rate // divisor).astype(np.float32)
+        pcm = pcm[:int(settings.AUDIO_RENDER_NOTE_SECONDS * self.sample_rate)].copy()
+        fade = min(len(pcm), int(FADE_OUT_SECONDS * self.sample_rate))
+        if fade:
+            pcm[-fade:] *= np.linspace(1.0, 0.0, fade, dtype=np.float32)
+        return pcm
+
+    def pcm(self, pitch_number: int) -> np.ndarray:
+        """键位采样的PCM，首次使用时解码"""
+        pcm = self._pcm.get(pitch_number)
+        if pcm is None:
+            path = self._source_paths().get(pitch_number)
+            if path is None:
+                raise ValueError(f"No sample for pitch {pitch_number}")
+            pcm = self._pcm.setdefault(pitch_number, self._decode(path))
+        return pcm
+
+    def preload(self) -> None:
+        for pitch_number in sorted(self._source_paths()):
+            self.pcm(pitch_number)
+        size = sum(pcm.nbytes for pcm in self._pcm.values())
+        logger.info(f"Decoded {len(self._pcm)} piano samples into {size} bytes of PCM")
+
+    @staticmethod
+    def sequence(pitch_numbers: Sequence[int], kind: str, play_mode: int) -> Tuple[Tuple[int, ...], bool]:
+        """
+        按题型和播放方式确定发声顺序
+
+        Returns:
+            (依次发声的音高序列, 是否同时发声)
+        """
+        pitches = tuple(pitch_numbers)
+        if kind == "interval":
+            if play_mode == PlayMode.HARMONY.index:
+                return pitches, True
+            ascending = tuple(sorted(pitches))
+            if play_mode == PlayMode.UP.index:
+                return ascending, False
+            if play_mode == PlayMode.DOWN.index:
+                return ascending[::-1], False
+            if play_mode == PlayMode.UP_DOWN.index:
+                return ascending + ascending[::-1][1:], False
+        elif kind == "chord":
+            if play_mode == ChordPlayMode.COMBINE.index:
+                return pitches, True
+            if play_mode == ChordPlayMode.SINGLE.index:
+                return pitches, False
+        raise ValueError(f"Unsupported play_mode {play_mode} for {kind}")
+
+    def mix(self, pitch_numbers: Sequence[int], kind: str, play_mode: int) -> np.ndarray:
+        """混音，返回 float32 PCM"""
+        order, simultaneous = self.sequence(pitch_numbers, kind, play_mode)
+        notes = [self.pcm(number) for number in order]
+        step = 0 if simultaneous else int(settings.AUDIO_RENDER_NOTE_SPACING * self.sample_rate)
+        offsets = np.arange(len(notes)) * step
+        out = np.zeros(int(max(offset + len(note) for offset, note in zip(offsets, notes))), dtype=np.float32)
+        # 同时发声的音按 1/sqrt(n) 衰减，避免叠加后削波
+        gain = np.float32(1.0 / np.sqrt(len(notes)) if simultaneous else 1.0)
+        for offset, note in zip(offsets, notes):
+            out[offset:offset + len(note)] += note * gain
+        peak = float(np.abs(out).max()) if len(out) else 0.0
+        if peak > 0.99:
+            out *= np.float32(0.99 / peak)
+        return out
+
+    def encode(self, samples: np.ndarray, fmt: str) -> bytes:
+        container, subtype, _ = RENDER_FORMATS[fmt]
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, self.sample_rate, format=container, subtype=subtype)
+        return buffer.getvalue()
+
+    def render(self, pitch_numbers: Sequence[int], kind: str, play_mode: int, fmt: Optional[str] = None) -> RenderedClip:
+        """渲染题目音频，相同参数直接返回缓存"""
+        fmt = fmt or settings.AUDIO_RENDER_FORMAT
+        if kind not in RENDER_KINDS or fmt not in RENDER_FORMATS:
+            raise ValueError(f"Unsupported render request {kind}/{fmt}")
+        key = (tuple(pitch_numbers), kind, play_mode, fmt)
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is not None:
+                self._clips.move_to_end(key)
+                self.hits += 1
+                return clip
+        self.misses += 1
+        data = self.encode(self.mix(pitch_numbers, kind, play_mode), fmt)
+        clip = RenderedClip(data=data, media_type=RENDER_FORMATS[fmt][2],
+                            digest=hashlib.sha256(data).hexdigest()[:16])
+        with self._lock:
+            self._clips[key] = clip
+            while len(self._clips) > settings.AUDIO_RENDER_CACHE_SIZE:
+                self._clips.popitem(last=False)
+        return clip
+
+
+# 创建全局题目音频渲染实例
+audio_render_service = AudioRenderService()
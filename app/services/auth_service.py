@@ -2,11 +2,17 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-import requests
 from app.core.config import settings
+from app.core.http_client import http_client
+from app.core.logger import logger
+from app.models.user import CombineUser
+from app.models.vip import VipLevel
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# 令牌中VIP声明的版本号，结构变化时递增，旧版本声明会被忽略
+VIP_CLAIMS_VERSION = 1
+
 
 class AuthService:
     def __init__(self):
@@ -20,14 +26,17 @@ class AuthService:
         """生成密码哈希"""
         return self.pwd_context.hash(password)
     
-    def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None) -> str:
-        """创建访问令牌"""
+    def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None, combine_user: Optional[CombineUser] = None) -> str:
+        """创建访问令牌，传入combine_user时嵌入VIP声明"""
         to_encode = data.copy()
+        now = datetime.utcnow()
         if expires_delta:
-            expire = datetime.utcnow() + expires_delta
+            expire = now + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=15)
-        to_encode.update({"exp": expire})
+            expire = now + timedelta(minutes=15)
+        to_encode.update({"exp": expire, "iat": now})
+        if combine_user is not None:
+            to_encode["vip"] = self.build_vip_claims(combine_user)
         encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
         return encoded_jwt
     
@@ -39,6 +48,68 @@ class AuthService:
         except JWTError:
             return None
     
+    def build_vip_claims(self, combine_user: CombineUser) -> dict:
+        """
+        构建VIP声明，get_current_user_vip可以直接从令牌授权而无需查询数据库
+
+        声明只在VIP_CLAIMS_TTL_MINUTES内有效，过期后回退到数据库查询，客户端通过刷新接口重新获取
+        """
+        valid_until = datetime.now() + timedelta(minutes=settings.VIP_CLAIMS_TTL_MINUTES)
+        return {
+            "v": VIP_CLAIMS_VERSION,
+            "epoch": settings.TOKEN_REVOCATION_EPOCH,
+            "until": int(valid_until.timestamp()),
+            "ver": combine_user.token_version,
+            "openid": combine_user.wechat_openid,
+            "active": combine_user.is_active,
+            "admin": combine_user.is_super_admin,
+            "is_vip": combine_user.is_vip,
+            "start": int(combine_user.vip_start_date.timestamp()) if combine_user.vip_start_date else None,
+            "expire": int(combine_user.vip_expire_date.timestamp()) if combine_user.vip_expire_date else None,
+            "vip_id": combine_user.vip_id,
+            "level": combine_user.vip_level.value if combine_user.vip_level else None,
+            "order_id": combine_user.order_id,
+        }
+
+    def combine_user_from_claims(self, payload: dict, token_version: int) -> Optional[CombineUser]:
+        """
+        从令牌的VIP声明构建CombineUser，声明缺失、版本不符、已过期或已吊销时返回None
+
+        Args:
+            payload: 令牌内容
+            token_version: 数据库中用户当前的 token_version，与声明的 ver 不同说明签发后VIP状态已变更
+        """
+        claims = payload.get("vip")
+        if not claims or claims.get("v") != VIP_CLAIMS_VERSION:
+            return None
+        if claims.get("epoch") != settings.TOKEN_REVOCATION_EPOCH:
+            return None
+        if claims.get("ver") != token_version:
+            return None
+        now = datetime.now()
+        if claims.get("until", 0) < now.timestamp():
+            return None
+        # 与数据库查询条件一致：VIP过期的用户不能通过
+        if claims.get("expire") is None or claims["expire"] < now.timestamp():
+            return None
+
+        combine_user = CombineUser(
+            id=int(payload["sub"]),
+            wechat_openid=claims.get("openid"),
+            is_active=claims.get("active"),
+            is_super_admin=claims.get("admin"),
+            is_vip=claims.get("is_vip"),
+            vip_start_date=datetime.fromtimestamp(claims["start"]) if claims.get("start") else None,
+            vip_expire_date=datetime.fromtimestamp(claims["expire"]),
+            token_version=token_version,
+        )
+        if claims.get("order_id") is not None:
+            combine_user.order_id = claims["order_id"]
+        if claims.get("vip_id") is not None:
+            combine_user.vip_id = claims["vip_id"]
+            combine_user.vip_level = VipLevel(claims["level"])
+        return combine_user
+
     async def verify_wechat_code(self, code: str) -> Optional[dict]:
         """验证微信小程序登录码"""
         url = f"https://api.weixin.qq.com/sns/jscode2session"
@@ -50,7 +121,7 @@ class AuthService:
         }
         
         try:
-            response = requests.get(url, params=params)
+            response = await http_client.get("wechat", url, params=params)
             response.raise_for_status()
             result = response.json()
             
@@ -61,5 +132,6 @@ class AuthService:
                 "openid": result.get("openid"),
                 "session_key": result.get("session_key")
             }
-        except Exception:
+        except Exception as e:
+            logger.error(f"Failed to verify wechat code: {e!r}")
             return None 
\ No newline at end of file
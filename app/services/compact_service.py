@@ -0,0 +1,171 @@
+from typing import List, Optional, Any, Dict
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+
+from app.api.v1.schemas.response.pitch_response import RhythmQuestionResponse, MelodyQuestionResponse, \
+    MelodyScorePitch
+from app.models.exam_all import ExamData
+
+# 紧凑格式的媒体类型，客户端可以通过 Accept 头选择
+COMPACT_MEDIA_TYPE = "application/vnd.lianer.compact+json"
+# 每个四分音符的tick数（与MIDI常用的PPQ一致）
+TICKS_PER_QUARTER = 480
+
+# 音符标记位
+FLAG_REST = 1
+FLAG_DOTTED = 2
+FLAG_TIED = 4
+
+
+def vary_accept(response: Response) -> None:
+    """
+    路由依赖：响应格式随 Accept 头变化的接口在默认JSON响应上也加 Vary: Accept，
+    否则共享缓存可能把JSON返回给要求紧凑格式的客户端（或反过来）
+    """
+    response.headers["Vary"] = "Accept"
+
+
+def is_compact_request(request: Optional[Request]) -> bool:
+    """判断请求是否要求紧凑格式：?format=compact 或 Accept 头包含紧凑媒体类型"""
+    if request is None:
+        return False
+    if request.query_params.get("format", "").lower() == "compact":
+        return True
+    accept = request.headers.get("accept", "")
+    return COMPACT_MEDIA_TYPE in accept.lower()
+
+
+class CompactFormatService:
+    """
+    题目的紧凑传输格式
+
+    - 音高只发送 pitch_number（客户端已有完整音高目录）
+    - 时值以 tick 表示，TICKS_PER_QUARTER 个 tick 为一个四分音符
+    - 选项只发送与正确答案不同的小节
+    """
+
+    def duration_to_ticks(self, duration: float) -> int:
+        return int(round(duration * TICKS_PER_QUARTER))
+
+    def note_flags(self, note) -> int:
+        flags = 0
+        if note.is_rest:
+            flags |= FLAG_REST
+        if note.is_dotted:
+            flags |= FLAG_DOTTED
+        if note.tied_to_next:
+            flags |= FLAG_TIED
+        return flags
+
+    def encode_rhythm_measure(self, measure) -> List[List[int]]:
+        """节奏小节: [[ticks, flags], ...]"""
+        return [[self.duration_to_ticks(n.duration), self.note_flags(n)] for n in measure.notes]
+
+    def encode_melody_measure(self, measure) -> List[List[int]]:
+        """旋律小节: [[pitch_number, ticks, flags], ...]"""
+        return [
+            [n.pitch.pitch_number, self.duration_to_ticks(n.duration), self.note_flags(n)]
+            for n in measure.notes
+        ]
+
+    def encode_measures(self, score) -> List[List[List[List[int]]]]:
+        encode = self.encode_melody_measure if isinstance(score, MelodyScorePitch) else self.encode_rhythm_measure
+        return [[encode(measure) for measure in measure_group] for measure_group in score.measures]
+
+    def encode_score(self, score) -> Dict[str, Any]:
+        return {
+            "measures": self.encode_measures(score),
+            "time_signature": score.time_signature.value,
+            "tempo": score.tempo,
+        }
+
+    def diff_measures(self, base: List, other: List) -> Optional[List]:
+        """
+        计算选项相对正确答案的小节差异
+
+        Returns:
+            [[group_index, measure_index, measure], ...]，结构不一致时返回None
+        """
+        if len(base) != len(other):
+            return None
+        diff = []
+        for gi, (base_group, other_group) in enumerate(zip(base, other)):
+            if len(base_group) != len(other_group):
+                return None
+            for mi, (base_measure, other_measure) in enumerate(zip(base_group, other_group)):
+                if base_measure != other_measure:
+                    diff.append([gi, mi, other_measure])
+        return diff
+
+    def encode_question(self, response) -> Dict[str, Any]:
+        """编码节奏/旋律题目，选项以差异形式发送"""
+        correct_index = ord(response.correct_answer) - 65
+        correct_measures = self.encode_measures(response.options[correct_index])
+
+        options = []
+        for index, option in enumerate(response.options):
+            if index == correct_index:
+                options.append({"diff": []})
+                continue
+            measures = self.encode_measures(option)
+            diff = self.diff_measures(correct_measures, measures)
+            if diff is None:
+                options.append({"measures": measures})
+            else:
+                options.append({"diff": diff})
+
+        return {
+            "format": "compact",
+            "ticks_per_quarter": TICKS_PER_QUARTER,
+            "correct_answer": response.correct_answer,
+            "answer": {"measures": correct_measures},
+            "options": options,
+            "tempo": int(response.tempo),
+            "time_signature": response.time_signature.value,
+            "measures_count": int(response.measures_count),
+            "difficulty": response.difficulty.value,
+        }
+
+    def encode_rhythm_question(self, response: RhythmQuestionResponse) -> Dict[str, Any]:
+        return self.encode_question(response)
+
+    def encode_melody_question(self, response: MelodyQuestionResponse) -> Dict[str, Any]:
+        return self.encode_question(response)
+
+    def encode_exam(self, exam: ExamData) -> Dict[str, Any]:
+        """编码综合考试，音高全部以 pitch_number 表示"""
+        return {
+            "format": "compact",
+            "ticks_per_quarter": TICKS_PER_QUARTER,
+            "single": {
+                "exam_type": exam.single.exam_type,
+                "questions": [q.pitch.pitch_number for q in exam.single.questions],
+            },
+            "group": {
+                "exam_type": exam.group.exam_type,
+                "questions": [[p.pitch_number for p in q.pitches] for q in exam.group.questions],
+            },
+            "interval": {
+                "exam_type": exam.interval.exam_type,
+                "questions": [
+                    [q.answer_id, q.answer_name, q.question.first.pitch_number, q.question.second.pitch_number]
+                    for q in exam.interval.questions
+                ],
+            },
+            "chord": {
+                "exam_type": exam.chord.exam_type,
+                "questions": [
+                    [q.answer_id, q.answer_name, q.play_mode, q.transfer_set, [p.pitch_number for p in q.question]]
+                    for q in exam.chord.questions
+                ],
+            },
+            "rhythm": self.encode_score(exam.rhythm),
+            "melody": self.encode_score(exam.melody),
+        }
+
+    def response(self, content: Dict[str, Any]) -> JSONResponse:
+        return JSONResponse(content=content, media_type=COMPACT_MEDIA_TYPE, headers={"Vary": "Accept"})
+
+
+compact_service = CompactFormatService()
@@ -8,6 +8,8 @@ import soundfile as sf
 import io
 import aubio
 
+from app.core import music_math
+
 logger = logging.getLogger(__name__)
 
 class FastAudioProcessor:
@@ -164,21 +166,9 @@ class FastAudioProcessor:
             frequency: 频率
             
         Returns:
-            str: 音符名称
+            str: 音符名称，频率无效时为空字符串
         """
-        if frequency <= 0:
-            return ""
-            
-        # 计算与A4(440Hz)的半音距离
-        n = 12 * np.log2(frequency / 440.0)
-        # 四舍五入到最近的半音
-        n = round(n)
-        # 计算音符名称
-        notes = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-        note = notes[n % 12]
-        # 计算八度
-        octave = 4 + (n + 9) // 12
-        return f"{note}{octave}"
+        return music_math.hz_to_note(frequency)
     
     def note_to_hz(self, note: str) -> float:
         """将音符名称转换为频率
@@ -191,22 +181,7 @@ class FastAudioProcessor:
         """
         if not note:
             return 0.0
-            
-        # 解析音符名称
-        note_name = note[0]
-        if len(note) > 1 and note[1] == "#":
-            note_name += "#"
-            octave = int(note[2:])
-        else:
-            octave = int(note[1:])
-            
-        # 计算与A4(440Hz)的半音距离
-        notes = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
-        n = notes.index(note_name) - 9  # A4是第9个音符
-        n += 12 * (octave - 4)
-        
-        # 计算频率
-        return 440.0 * (2.0 ** (n / 12.0))
+        return music_math.note_to_hz(note)
 
 
 fast_audio_processor = FastAudioProcessor() 
\ No newline at end of file
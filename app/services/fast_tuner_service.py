@@ -2,6 +2,7 @@ from typing import Dict, Any, List, Optional, Tuple
 
 import librosa
 
+from app.core import music_math
 from app.services.fast_audio_processing import FastAudioProcessor, fast_audio_processor
 from app.services.pitch_service import pitch_service
 import logging
@@ -38,12 +39,8 @@ class FastTunerService:
             # 转换为音符名称
             note_name = self.audio_processor.hz_to_note(main_frequency)
             
-            # 获取最接近的钢琴音高
-            nearest_pitch, min_cents_diff = self.get_nearest_piano_pitch(main_frequency)
-            
-            # 计算音分偏差
-            target_hz = self.audio_processor.note_to_hz(nearest_pitch.name)
-            cents_diff = 1200 * np.log2(main_frequency / target_hz)
+            # 最接近的钢琴键位及音分偏差
+            _, cents_diff = music_math.nearest_key(main_frequency)
             
             return note_name, main_frequency, cents_diff
             
@@ -60,22 +57,9 @@ class FastTunerService:
         Returns:
             Tuple[Any, float]: (最接近的钢琴音高, 最小音分偏差)
         """
-        # 获取所有钢琴音高
-        pitches = pitch_service.get_all_pitch()
-        
-        # 计算与每个音高的音分偏差
-        min_cents_diff = float('inf')
-        nearest_pitch = None
-        
-        for pitch in pitches:
-            target_hz = self.audio_processor.note_to_hz(pitch.name)
-            cents_diff = abs(1200 * np.log2(frequency / target_hz))
-            
-            if cents_diff < min_cents_diff:
-                min_cents_diff = cents_diff
-                nearest_pitch = pitch
-        
-        return nearest_pitch, min_cents_diff
+        # 直接由频率算出键位号，不再逐个比较88个音高
+        key, cents_diff = music_math.nearest_key(frequency)
+        return pitch_service.get_pitch_by_number(key), abs(cents_diff)
     
     def get_tuning_status(self, frequency: float) -> str:
         """获取调音状态
@@ -106,12 +90,11 @@ class FastTunerService:
         Returns:
             str: 调音方向
         """
-        nearest_pitch, _ = self.get_nearest_piano_pitch(frequency)
-        target_hz = self.audio_processor.note_to_hz(nearest_pitch.name)
+        _, cents_diff = music_math.nearest_key(frequency)
         
-        if frequency > target_hz:
+        if cents_diff > 0:
             return "higher"
-        elif frequency < target_hz:
+        elif cents_diff < 0:
             return "lower"
         else:
             return "in_tune"
@@ -121,15 +104,7 @@ class FastTunerService:
 
     # 音高频率到音名的映射
     def freq_to_note_name(self, frequency):
-        if frequency <= 0:
-            return "Unknown"
-
-        A4 = 440.0
-        note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        semitones_from_A4 = round(12 * np.log2(frequency / A4))
-        note_index = (semitones_from_A4 + 9) % 12  # A=0 -> C=9
-        octave = 4 + ((semitones_from_A4 + 9) // 12)
-        return f"{note_names[note_index]}{octave}"
+        return music_math.hz_to_note(frequency, unknown="Unknown")
 
     # Service 方法
     async def analyze_pitch_from_bytes(self, file_bytes):
@@ -162,7 +137,7 @@ class FastTunerService:
 
         avg_freq = np.median(frequencies)
         note_name = self.freq_to_note_name(avg_freq)
-        cents_diff = 1200 * np.log2(avg_freq / 440.0) if avg_freq > 0 else 0.0
+        cents_diff = music_math.cents(avg_freq, music_math.A4_FREQUENCY) if avg_freq > 0 else 0.0
 
         return note_name, avg_freq, cents_diff
 
@@ -0,0 +1,193 @@
+import asyncio
+import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update, func, or_, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.job import Job, JobStatus
+
+JobHandler = Callable[[AsyncSession, Dict[str, Any]], Awaitable[None]]
+
+
+class JobQueueService:
+    """
+    基于数据库表的持久化任务队列
+
+    入队只插入一行并立即返回；worker用 SELECT ... FOR UPDATE SKIP LOCKED 领取任务，
+    多个worker（包括多个进程）互不阻塞、不会重复领取。
+    任务失败后按指数退避重试，超过最大次数后标记为死信（status=dead）保留在表中以便排查。
+    worker崩溃时，超过 JOB_LOCK_TIMEOUT 仍处于running的任务会被重新领取。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobQueueService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self._handlers: Dict[str, JobHandler] = {}
+            self._wakeup: Optional[asyncio.Event] = None
+
+    def register(self, queue: str, handler: JobHandler) -> None:
+        """注册队列的处理函数，处理函数抛出异常表示需要重试"""
+        self._handlers[queue] = handler
+
+    @property
+    def wakeup(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    async def enqueue(
+            self,
+            db: AsyncSession,
+            queue: str,
+            payload: Dict[str, Any],
+            dedup_key: Optional[str] = None,
+            max_attempts: Optional[int] = None
+    ) -> None:
+        """插入任务并提交；相同去重键的任务已存在时忽略，已进入死信时用新的payload重新排队"""
+        dialect = db.get_bind().dialect.name
+        insert = pg_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(Job).values(
+            queue=queue,
+            dedup_key=dedup_key,
+            payload=payload,
+            status=JobStatus.PENDING,
+            attempts=0,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            run_at=datetime.datetime.now(),
+        )
+        if dedup_key is not None:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["queue", "dedup_key"],
+                set_={
+                    "payload": stmt.excluded.payload,
+                    "status": JobStatus.PENDING,
+                    "attempts": 0,
+                    "max_attempts": stmt.excluded.max_attempts,
+                    "run_at": stmt.excluded.run_at,
+                    "locked_at": None,
+                    "last_error": None,
+                },
+                where=Job.status == JobStatus.DEAD,
+            )
+        await db.execute(stmt)
+        await db.commit()
+        # 唤醒本进程空闲的worker，不必等到下次轮询
+        self.wakeup.set()
+
+    async def claim(self, db: AsyncSession, queue: str) -> Optional[Job]:
+        """
+        领取一个到期任务
+
+        子查询 FOR UPDATE SKIP LOCKED 跳过其他worker正在领取的行；
+        UPDATE 再次检查状态，不支持行锁的数据库（SQLite）上也不会重复领取。
+        """
+        now = datetime.datetime.now()
+        claimable = or_(
+            and_(Job.status == JobStatus.PENDING, Job.run_at <= now),
+            and_(Job.status == JobStatus.RUNNING,
+                 Job.locked_at < now - datetime.timedelta(seconds=settings.JOB_LOCK_TIMEOUT)),
+        )
+        candidate = (
+            select(Job.id)
+            .where(Job.queue == queue, claimable)
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            update(Job)
+            .where(Job.id == candidate, claimable)
+            .values(status=JobStatus.RUNNING, locked_at=now, attempts=Job.attempts + 1)
+            .returning(Job.id, Job.payload, Job.attempts, Job.max_attempts)
+        )
+        row = result.first()
+        await db.commit()
+        if row is None:
+            return None
+        return Job(id=row.id, queue=queue, payload=row.payload, attempts=row.attempts, max_attempts=row.max_attempts)
+
+    async def complete(self, db: AsyncSession, job: Job) -> None:
+        await db.execute(
+            update(Job).where(Job.id == job.id).values(status=JobStatus.DONE, locked_at=None, last_error=None)
+        )
+        await db.commit()
+
+    async def fail(self, db: AsyncSession, job: Job, error: str) -> None:
+        """失败后按指数退避重新排队，超过最大次数进入死信"""
+        if job.attempts >= job.max_attempts:
+            logger.error(f"Job {job.id} in queue {job.queue} dead after {job.attempts} attempts: {error}")
+            values = {"status": JobStatus.DEAD}
+        else:
+            delay = min(settings.JOB_RETRY_BACKOFF_BASE * (2 ** (job.attempts - 1)), settings.JOB_RETRY_BACKOFF_MAX)
+            logger.warning(f"Job {job.id} in queue {job.queue} failed (attempt {job.attempts}), retry in {delay}s: {error}")
+            values = {"status": JobStatus.PENDING, "run_at": datetime.datetime.now() + datetime.timedelta(seconds=delay)}
+        await db.execute(
+            update(Job).where(Job.id == job.id).values(locked_at=None, last_error=error[:2000], **values)
+        )
+        await db.commit()
+
+    async def run_once(self, session_factory, queue: str) -> bool:
+        """领取并执行一个任务，没有可执行的任务时返回False"""
+        async with session_factory() as db:
+            job = await self.claim(db, queue)
+        if job is None:
+            return False
+        try:
+            async with session_factory() as db:
+                await self._handlers[queue](db, job.payload)
+        except Exception as e:
+            async with session_factory() as db:
+                await self.fail(db, job, f"{type(e).__name__}: {str(e)}")
+        else:
+            async with session_factory() as db:
+                await self.complete(db, job)
+        return True
+
+    async def run_worker(self, session_factory, queue: str) -> None:
+        """worker循环：有任务就连续执行，队列为空时等待唤醒或轮询间隔"""
+        while True:
+            try:
+                if await self.run_once(session_factory, queue):
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker for queue {queue} failed: {str(e)}", exc_info=True)
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, session_factory, concurrency: Optional[int] = None) -> List[asyncio.Task]:
+        """为每个已注册的队列启动 concurrency 个worker"""
+        concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        return [
+            asyncio.create_task(self.run_worker(session_factory, queue))
+            for queue in self._handlers
+            for _ in range(concurrency)
+        ]
+
+    async def stats(self, db: AsyncSession, queue: str) -> Dict[str, int]:
+        """各状态的任务数量"""
+        result = await db.execute(
+            select(Job.status, func.count()).where(Job.queue == queue).group_by(Job.status)
+        )
+        return {status: count for status, count in result.all()}
+
+
+# 创建全局任务队列实例
+job_queue_service = JobQueueService()
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Any, Optional
+
+from app.core.config import settings
+from app.core.http_client import http_client
+from app.core.logger import logger
+
+
+class LLMRateLimitError(Exception):
+    """用户请求过于频繁"""
+
+
+class LLMClient:
+    """
+    DeepSeek 异步客户端
+
+    - 流式读取补全结果（SSE），调用方可以边接收边解析
+    - 全局信号量限制同时进行的补全数量
+    - 按用户的滑动窗口限流
+    - 相同提示词的并发请求只发起一次上游调用
+    """
+
+    def __init__(self):
+        self.api_url = settings.DEEPSEEK_API_URL
+        self.api_key = settings.DEEPSEEK_API_KEY
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._user_requests: Dict[Any, Deque[float]] = {}
+        self._last_sweep = time.monotonic()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.DEEPSEEK_MAX_CONCURRENCY)
+        return self._semaphore
+
+    def check_rate_limit(self, user_id: Any) -> None:
+        """每个用户每分钟最多 DEEPSEEK_USER_RATE_PER_MINUTE 次"""
+        if user_id is None or settings.DEEPSEEK_USER_RATE_PER_MINUTE <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_sweep >= 60:
+            self._sweep(now)
+        window = self._user_requests.setdefault(user_id, deque())
+        while window and now - window[0] >= 60:
+            window.popleft()
+        if len(window) >= settings.DEEPSEEK_USER_RATE_PER_MINUTE:
+            raise LLMRateLimitError(f"User {user_id} exceeded {settings.DEEPSEEK_USER_RATE_PER_MINUTE} requests/minute")
+        window.append(now)
+
+    def _sweep(self, now: float) -> None:
+        """移除窗口内已经没有请求的用户，避免每个来过的用户都常驻内存"""
+        for user_id in [u for u, window in self._user_requests.items() if not window or now - window[-1] >= 60]:
+            del self._user_requests[user_id]
+        self._last_sweep = now
+
+    async def run_deduplicated(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """相同key的并发调用共享同一个结果"""
+        future = self._in_flight.get(key)
+        if future is not None:
+            logger.info(f"Joining in-flight LLM request {key[:12]}")
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await factory()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    def _build_body(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        return {
+            "model": settings.DEEPSEEK_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.5,
+            "max_tokens": settings.DEEPSEEK_MAX_TOKENS,
+            "stream": stream,
+            "top_p": 0.9,
+        }
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    async def chat(self, prompt: str) -> Dict[str, Any]:
+        """非流式补全，返回完整的响应JSON"""
+        async with self.semaphore:
+            response = await http_client.post(
+                "deepseek",
+                self.api_url,
+                headers=self._headers(),
+                json=self._build_body(prompt, stream=False),
+                timeout=settings.DEEPSEEK_TIMEOUT
+            )
+        if response.status_code != 200:
+            logger.error(f"DeepSeek API error: {response.text}")
+            raise Exception(f"DeepSeek API error: {response.text}")
+        return response.json()
+
+    async def stream_chat(self, prompt: str) -> AsyncIterator[str]:
+        """流式补全，逐段产出 content 增量；调用方提前结束迭代时连接会被关闭"""
+        breaker = http_client.breaker("deepseek")
+        breaker.before_request()
+        failure_recorded = False
+        async with self.semaphore:
+            try:
+                async with http_client.client.stream(
+                    "POST",
+                    self.api_url,
+                    headers=self._headers(),
+                    json=self._build_body(prompt, stream=True),
+                    timeout=settings.DEEPSEEK_TIMEOUT,
+                ) as response:
+                    if response.status_code != 200:
+                        text = (await response.aread()).decode("utf-8", "replace")
+                        failure_recorded = True
+                        breaker.record_failure()
+                        logger.error(f"DeepSeek API error: {text}")
+                        raise Exception(f"DeepSeek API error: {text}")
+                    breaker.record_success()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            return
+                        chunk = json.loads(data)
+                        choices = chunk.get("choices") or []
+                        if not choices:
+                            continue
+                        delta = choices[0].get("delta", {}).get("content")
+                        if delta:
+                            yield delta
+            except Exception:
+                # 每次调用只记一次失败；半开状态的试探失败同样要记录，否则试探名额要等超时才释放
+                if not failure_recorded:
+                    breaker.record_failure()
+                raise
+
+
+class StreamingJsonArrayParser:
+    """
+    增量解析JSON中指定键对应数组的元素
+
+    例如在 {"measures": [[...], [...]]} 中，每当 "measures" 数组的一个元素完整到达时立即返回该元素，
+    无需等待整个补全结束。
+    """
+
+    def __init__(self, key: str):
+        self.marker = f'"{key}"'
+        self.buffer = ""
+        self.pos = 0
+        self.array_depth: Optional[int] = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.element_start: Optional[int] = None
+        self.done = False
+
+    def feed(self, text: str) -> List[Any]:
+        self.buffer += text
+        elements = []
+        if self.done:
+            return elements
+
+        if self.array_depth is None:
+            index = self.buffer.find(self.marker)
+            if index < 0:
+                return elements
+            bracket = self.buffer.find("[", index + len(self.marker))
+            if bracket < 0:
+                return elements
+            # 从数组起始处开始扫描
+            self.pos = bracket + 1
+            self.depth = 1
+            self.array_depth = 1
+
+        buffer = self.buffer
+        while self.pos < len(buffer):
+            ch = buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+                if self.depth == self.array_depth and self.element_start is None:
+                    self.element_start = self.pos
+            elif ch in "[{":
+                if self.depth == self.array_depth and self.element_start is None:
+                    self.element_start = self.pos
+                self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if self.depth == self.array_depth and self.element_start is not None:
+                    elements.append(json.loads(buffer[self.element_start:self.pos + 1]))
+                    self.element_start = None
+                elif self.depth < self.array_depth:
+                    self.done = True
+                    self.pos += 1
+                    break
+            self.pos += 1
+        return elements
+
+
+# 创建全局LLM客户端实例
+llm_client = LLMClient()
@@ -0,0 +1,285 @@
+from dataclasses import dataclass
+from math import gcd
+from typing import BinaryIO, Tuple
+
+import librosa
+import numpy as np
+import soundfile as sf
+from scipy.ndimage import median_filter
+from scipy.signal import resample_poly
+
+from app.api.v1.schemas.response.pitch_response import MelodyScorePitch, MelodyAssessmentNote, \
+    MelodyAssessmentResponse
+from app.core import music_math
+from app.core.config import settings
+from app.services.score_render_service import ScoreRenderService
+
+# 人声范围（C2 ~ C6）
+MIN_FREQUENCY = 65.0
+MAX_FREQUENCY = 1050.0
+FRAME_LENGTH = 1024  # 11025Hz下约93毫秒，覆盖最低音C2的两个周期以上
+SILENCE_RATIO = 0.1  # RMS低于最大值的该比例视为无声
+PITCH_JUMP = 0.8  # 相邻帧音高跳变超过该半音数时分段
+MIN_NOTE_SECONDS = 0.08
+# 对齐代价：音高差（半音，封顶）和相对起点的时间差（拍，封顶）
+PITCH_COST_CAP = 6.0
+TIMING_COST_CAP = 2.0
+TIMING_COST_WEIGHT = 0.5
+OCTAVE_SHIFTS = (-24, -12, 0, 12, 24)
+
+
+def resample(y: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    if sample_rate == target_rate:
+        return y.astype(np.float32, copy=False)
+    divisor = gcd(sample_rate, target_rate)
+    return resample_poly(y, target_rate // divisor, sample_rate // divisor).astype(np.float32)
+
+
+def read_audio(file: BinaryIO, sample_rate: int, max_seconds: float) -> np.ndarray:
+    """
+    解码上传的录音为单声道 float32 并重采样；无法解析或超长时抛出 ValueError
+
+    先读文件头检查时长，再最多解码 max_seconds 秒：压缩格式（ogg/flac）体积很小也可能解码出
+    几小时的音频，不能先整体解码再检查。
+    """
+    try:
+        info = sf.info(file)
+        file.seek(0)
+        if info.frames > max_seconds * info.samplerate:
+            raise ValueError("Recording is too long")
+        # 文件头中的帧数不可信时（如流式写出的文件）解码量同样受限
+        data, source_rate = sf.read(file, frames=int(max_seconds * info.samplerate) + 1, dtype="float32",
+                                    always_2d=True)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Failed to read audio file: {str(e)}")
+    if len(data) > max_seconds * source_rate:
+        raise ValueError("Recording is too long")
+    return resample(data.mean(axis=1), source_rate, sample_rate)
+
+
+@dataclass
+class SungNotes:
+    onsets: np.ndarray  # 秒
+    offsets: np.ndarray
+    midi: np.ndarray  # 分段内浊音帧的中位数（可为小数）
+
+
+@dataclass
+class TargetNotes:
+    onsets: np.ndarray  # 相对第一个音的秒数
+    durations: np.ndarray
+    pitch_numbers: np.ndarray
+    beat_seconds: float
+
+    @property
+    def midi(self) -> np.ndarray:
+        return music_math.key_to_midi(self.pitch_numbers.astype(np.float64))
+
+
+class MelodyAssessmentService:
+    """
+    视唱评分服务
+
+    对录音只做一次逐帧分析（YIN基频、RMS、起音强度），按起音、浊音区间和音高跳变切分出唱出的音，
+    再用DTW把唱出的音与目标旋律（MelodyScorePitch）对齐，给出每个音的音分误差和节奏误差。
+    - 允许整体移八度演唱（如男声低八度），取对齐代价最小的八度
+    - 节奏误差以中位数起点偏移为基准，整体早唱或晚唱不计入误差
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MelodyAssessmentService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.sample_rate = settings.MELODY_ASSESS_SAMPLE_RATE
+            self.hop_length = settings.MELODY_ASSESS_HOP_LENGTH
+
+    def decode(self, file: BinaryIO) -> np.ndarray:
+        """解码录音为单声道 float32，并重采样到分析采样率"""
+        return read_audio(file, self.sample_rate, settings.MELODY_ASSESS_MAX_SECONDS)
+
+    def resample(self, y: np.ndarray, sample_rate: int) -> np.ndarray:
+        return resample(y, sample_rate, self.sample_rate)
+
+    def analyze(self, y: np.ndarray) -> SungNotes:
+        """逐帧计算基频和起音，切分出唱出的音"""
+        sr, hop = self.sample_rate, self.hop_length
+        if len(y) < FRAME_LENGTH:
+            y = np.pad(y, (0, FRAME_LENGTH - len(y)))
+        f0 = librosa.yin(y, fmin=MIN_FREQUENCY, fmax=MAX_FREQUENCY, sr=sr, frame_length=FRAME_LENGTH, hop_length=hop)
+        rms = self._rms(y, hop)
+        envelope = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop)
+        frames = min(len(f0), len(rms), len(envelope))
+        f0, rms, envelope = f0[:frames], rms[:frames], envelope[:frames]
+
+        midi = music_math.hz_to_midi(f0)
+        smooth = median_filter(midi, size=5, mode="nearest")
+        voiced = (rms > rms.max() * SILENCE_RATIO) & (np.abs(midi - smooth) < 1.0) if rms.max() > 0 \
+            else np.zeros(frames, dtype=bool)
+
+        onset_frames = librosa.onset.onset_detect(onset_envelope=envelope, sr=sr, hop_length=hop)
+        boundary = np.zeros(frames, dtype=bool)
+        boundary[onset_frames[onset_frames < frames]] = True
+        boundary[1:] |= voiced[1:] != voiced[:-1]
+        boundary[1:] |= np.abs(np.diff(smooth)) > PITCH_JUMP
+        segment_ids = np.cumsum(boundary)
+
+        # 只保留足够长的浊音分段；按分段ID分组取中位数
+        ids = segment_ids[voiced]
+        voiced_midi = smooth[voiced]
+        voiced_frames = np.flatnonzero(voiced)
+        unique_ids, starts, counts = np.unique(ids, return_index=True, return_counts=True)
+        min_frames = max(1, int(MIN_NOTE_SECONDS * sr / hop))
+        keep = counts >= min_frames
+        medians = np.array([np.median(voiced_midi[start:start + count])
+                            for start, count in zip(starts[keep], counts[keep])])
+        frame_seconds = hop / sr
+        onsets = voiced_frames[starts[keep]] * frame_seconds
+        offsets = (voiced_frames[starts[keep] + counts[keep] - 1] + 1) * frame_seconds
+        return self._merge_repeats(SungNotes(onsets=onsets, offsets=offsets, midi=medians), envelope, frame_seconds)
+
+    @staticmethod
+    def _rms(y: np.ndarray, hop: int) -> np.ndarray:
+        """以帧中心对齐的滑动RMS，用累加和一次算出（与 librosa center=True 的帧对齐）"""
+        padded = np.pad(y.astype(np.float64), FRAME_LENGTH // 2)
+        energy = np.concatenate([[0.0], np.cumsum(padded ** 2)])
+        starts = np.arange(0, len(padded) - FRAME_LENGTH + 1, hop)
+        return np.sqrt(np.maximum(energy[starts + FRAME_LENGTH] - energy[starts], 0.0) / FRAME_LENGTH)
+
+    @staticmethod
+    def _merge_repeats(notes: SungNotes, envelope: np.ndarray, frame_seconds: float) -> SungNotes:
+        """相邻、同音高且之间没有明显起音的分段（颤音、换气噪声切开的）合并为一个音"""
+        if len(notes.midi) < 2:
+            return notes
+        threshold = np.median(envelope) + 2 * np.std(envelope)
+        gap_start = (notes.offsets[:-1] / frame_seconds).astype(int)
+        gap_end = (notes.onsets[1:] / frame_seconds).astype(int) + 1
+        attack = np.array([envelope[start:end + 1].max(initial=0.0) > threshold
+                           for start, end in zip(gap_start, gap_end)])
+        same = (np.abs(np.diff(notes.midi)) < 0.5) & (notes.onsets[1:] - notes.offsets[:-1] < 0.05) & ~attack
+        group = np.concatenate([[0], np.cumsum(~same)])
+        first = np.flatnonzero(np.concatenate([[True], ~same]))
+        last = np.concatenate([first[1:] - 1, [len(group) - 1]])
+        weights = notes.offsets - notes.onsets
+        midi = np.bincount(group, weights=notes.midi * weights) / np.bincount(group, weights=weights)
+        return SungNotes(onsets=notes.onsets[first], offsets=notes.offsets[last], midi=midi)
+
+    @staticmethod
+    def targets(score: MelodyScorePitch) -> TargetNotes:
+        """目标旋律的音（连音线合并、去掉休止符），时间相对第一个音"""
+        if score.tempo <= 0:
+            raise ValueError(f"Invalid tempo {score.tempo}")
+        timeline = ScoreRenderService.timeline(score, click=False)
+        notes = [(start, duration, pitch) for start, duration, pitch in timeline.notes if pitch is not None]
+        if not notes:
+            raise ValueError("Score has no notes")
+        beat_seconds = 60.0 / score.tempo
+        starts = np.array([note[0] for note in notes]) * beat_seconds
+        return TargetNotes(
+            onsets=starts - starts[0],
+            durations=np.array([note[1] for note in notes]) * beat_seconds,
+            pitch_numbers=np.array([note[2] for note in notes]),
+            beat_seconds=beat_seconds,
+        )
+
+    @staticmethod
+    def _cost(sung: SungNotes, target: TargetNotes, shift: int) -> np.ndarray:
+        """代价矩阵（唱出的音 × 目标音），用广播一次算出"""
+        pitch = np.minimum(np.abs(sung.midi[:, None] - shift - target.midi[None, :]), PITCH_COST_CAP) / PITCH_COST_CAP
+        sung_time = (sung.onsets - sung.onsets[0]) / target.beat_seconds
+        target_time = target.onsets / target.beat_seconds
+        timing = np.minimum(np.abs(sung_time[:, None] - target_time[None, :]), TIMING_COST_CAP) / TIMING_COST_CAP
+        return pitch + TIMING_COST_WEIGHT * timing
+
+    def align(self, sung: SungNotes, target: TargetNotes) -> Tuple[np.ndarray, int]:
+        """
+        DTW对齐
+
+        Returns:
+            (每个目标音对应的唱出音下标，未唱出为-1, 演唱相对目标移动的半音数)
+        """
+        matches = np.full(len(target.midi), -1, dtype=np.int64)
+        if len(sung.midi) == 0:
+            return matches, 0
+        best = None
+        for shift in OCTAVE_SHIFTS:
+            cost = self._cost(sung, target, shift)
+            accumulated, path = librosa.sequence.dtw(C=cost)
+            total = accumulated[-1, -1]
+            if best is None or total < best[0]:
+                best = (total, shift, cost, path[::-1])
+        _, shift, cost, path = best
+
+        # 一个目标音可能对到多个唱出的音，取代价最小的；一个唱出的音只分给一个目标音
+        used = np.zeros(len(sung.midi), dtype=bool)
+        for j in range(len(target.midi)):
+            candidates = path[path[:, 1] == j, 0]
+            candidates = candidates[~used[candidates]]
+            if len(candidates) == 0:
+                continue
+            i = candidates[np.argmin(cost[candidates, j])]
+            if abs(sung.midi[i] - shift - target.midi[j]) < PITCH_COST_CAP:
+                matches[j] = i
+                used[i] = True
+        return matches, shift
+
+    def assess(self, y: np.ndarray, score: MelodyScorePitch) -> MelodyAssessmentResponse:
+        target = self.targets(score)
+        sung = self.analyze(y)
+        return self.grade(sung, target)
+
+    def grade(self, sung: SungNotes, target: TargetNotes) -> MelodyAssessmentResponse:
+        """对齐并统计每个音的音分误差、节奏误差"""
+        matches, shift = self.align(sung, target)
+        matched = matches >= 0
+        index = matches[matched]
+
+        cents = np.full(len(target.midi), np.nan)
+        cents[matched] = (sung.midi[index] - shift - target.midi[matched]) * 100
+        timing = np.full(len(target.midi), np.nan)
+        sung_onsets = np.full(len(target.midi), np.nan)
+        if matched.any():
+            sung_onsets[matched] = sung.onsets[index]
+            start = float(np.median(sung.onsets[index] - target.onsets[matched]))
+            timing[matched] = sung.onsets[index] - (start + target.onsets[matched])
+        else:
+            start = 0.0
+
+        pitch_ok = matched & (np.abs(np.nan_to_num(cents, nan=np.inf)) <= settings.MELODY_ASSESS_CENTS_TOLERANCE)
+        timing_ok = matched & (np.abs(np.nan_to_num(timing, nan=np.inf)) <= settings.MELODY_ASSESS_TIMING_TOLERANCE)
+        pitch_accuracy = float(pitch_ok.mean())
+        timing_accuracy = float(timing_ok.mean())
+        notes = [
+            MelodyAssessmentNote(
+                index=j,
+                pitch_number=int(target.pitch_numbers[j]),
+                expected_onset=round(float(start + target.onsets[j]), 3),
+                sung_onset=None if not matched[j] else round(float(sung_onsets[j]), 3),
+                cents_error=None if not matched[j] else round(float(cents[j]), 1),
+                timing_error=None if not matched[j] else round(float(timing[j]), 3),
+                pitch_correct=bool(pitch_ok[j]),
+                timing_correct=bool(timing_ok[j]),
+            )
+            for j in range(len(target.midi))
+        ]
+        return MelodyAssessmentResponse(
+            score=round(100 * (0.6 * pitch_accuracy + 0.4 * timing_accuracy)),
+            pitch_accuracy=round(pitch_accuracy, 3),
+            timing_accuracy=round(timing_accuracy, 3),
+            mean_abs_cents=round(float(np.nanmean(np.abs(cents))), 1) if matched.any() else None,
+            octave_shift=int(shift) // 12,
+            missed_notes=int((~matched).sum()),
+            extra_notes=int(len(sung.midi) - matched.sum()),
+            notes=notes,
+        )
+
+
+# 创建全局视唱评分实例
+melody_assessment_service = MelodyAssessmentService()
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Optional, Tuple
+
+from app.api.v1.schemas.request.pitch_request import MelodySettingRequest
+from app.api.v1.schemas.response.pitch_response import MelodyScorePitch
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.rhythm_settings import TimeSignature
+
+# 每小节的拍数（以四分音符为1）
+MEASURE_BEATS = {
+    TimeSignature.TWO_FOUR: 2.0,
+    TimeSignature.THREE_FOUR: 3.0,
+    TimeSignature.FOUR_FOUR: 4.0,
+    TimeSignature.THREE_EIGHT: 1.5,
+    TimeSignature.SIX_EIGHT: 3.0,
+}
+
+BankKey = Tuple[str, str, int, int, int]
+
+
+class MelodyBankService:
+    """
+    AI旋律库
+
+    预先调用DeepSeek生成旋律，按 (难度, 拍号, 小节数, 调性, 调式) 分桶存放，
+    出题时直接从桶里取，错误选项仍在本地生成。
+    后台任务把请求过的桶补充到高水位，只有桶为空时才实时调用AI。
+
+    旋律库保存在本地SQLite文件中，同一台机器上的多个worker进程共用：
+    - 取旋律用 DELETE ... RETURNING 原子地弹出一行，同一条旋律只会被一个进程取走，取走即持久化
+    - 补充前先领取桶的租约（UPDATE ... WHERE 租约已过期），同一时刻每个桶只有一个进程在补充，
+      持有租约的进程崩溃后租约过期由其他进程接手
+    数据库操作是阻塞的，异步调用方通过 asyncio.to_thread 执行，不阻塞事件循环。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MelodyBankService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.path = settings.MELODY_BANK_PATH
+            self._lock = threading.Lock()
+            self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # WAL模式下读写互不阻塞，适合多进程共用
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS melody_bank_bucket ("
+                "key TEXT PRIMARY KEY, "
+                "request TEXT NOT NULL, "
+                "lease_owner TEXT, "
+                "lease_until REAL NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS melody_bank ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "key TEXT NOT NULL, "
+                "melody TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_melody_bank_key ON melody_bank (key, id)")
+            self._conn.commit()
+        return self._conn
+
+    @property
+    def owner(self) -> str:
+        """租约持有者，用进程号区分共用同一文件的worker进程（fork之后取值才准确）"""
+        return str(os.getpid())
+
+    @staticmethod
+    def bucket_key(request: MelodySettingRequest) -> BankKey:
+        return (
+            request.difficulty.value,
+            request.time_signature.value,
+            int(request.measures_count),
+            request.tonality,
+            request.tonality_choice,
+        )
+
+    @classmethod
+    def _key(cls, request: MelodySettingRequest) -> str:
+        return json.dumps(cls.bucket_key(request))
+
+    def size(self, request: Optional[MelodySettingRequest] = None) -> int:
+        with self._lock:
+            if request is None:
+                return self.conn.execute("SELECT COUNT(*) FROM melody_bank").fetchone()[0]
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM melody_bank WHERE key = ?", (self._key(request),)
+            ).fetchone()[0]
+
+    def register(self, request: MelodySettingRequest) -> None:
+        """登记一个桶，后台任务会为其补充旋律"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO melody_bank_bucket (key, request) VALUES (?, ?)",
+                (self._key(request), request.json())
+            )
+            self.conn.commit()
+
+    def validate(self, melody: MelodyScorePitch, request: MelodySettingRequest) -> bool:
+        """校验小节数以及每小节时值总和是否与拍号一致"""
+        if len(melody.measures) != int(request.measures_count):
+            logger.warning(f"Melody has {len(melody.measures)} measures, expected {int(request.measures_count)}")
+            return False
+        beats = MEASURE_BEATS.get(request.time_signature)
+        for measure_group in melody.measures:
+            notes = [note for measure in measure_group for note in measure.notes]
+            if not notes:
+                logger.warning("Melody has an empty measure")
+                return False
+            if beats is not None and abs(sum(note.duration for note in notes) - beats) > 1e-6:
+                logger.warning(f"Measure duration {sum(note.duration for note in notes)} does not match {beats} beats")
+                return False
+        return True
+
+    def put(self, request: MelodySettingRequest, melody: MelodyScorePitch) -> bool:
+        """校验通过后存入对应的桶"""
+        if not self.validate(melody, request):
+            return False
+        self.register(request)
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO melody_bank (key, melody) VALUES (?, ?)", (self._key(request), melody.json())
+            )
+            self.conn.commit()
+        return True
+
+    def pop(self, request: MelodySettingRequest) -> Optional[MelodyScorePitch]:
+        """原子地取出桶中最早的一条旋律，桶为空时返回None并登记该桶"""
+        key = self._key(request)
+        with self._lock:
+            row = self.conn.execute(
+                "DELETE FROM melody_bank WHERE id = "
+                "(SELECT id FROM melody_bank WHERE key = ? ORDER BY id LIMIT 1) RETURNING melody",
+                (key,)
+            ).fetchone()
+            self.conn.commit()
+        if row is None:
+            self.register(request)
+            return None
+        melody = MelodyScorePitch(**json.loads(row[0]))
+        melody.tempo = request.tempo
+        return melody
+
+    async def take(self, request: MelodySettingRequest) -> Optional[MelodyScorePitch]:
+        """从桶中取出一条旋律，桶为空时返回None"""
+        if not settings.MELODY_BANK_ENABLED:
+            return None
+        try:
+            return await asyncio.to_thread(self.pop, request)
+        except sqlite3.Error as e:
+            # 旋律库不可用时退回实时生成
+            logger.error(f"Failed to take melody from bank: {str(e)}")
+            return None
+
+    def claim(self) -> Optional[MelodySettingRequest]:
+        """领取一个低于低水位且没有其他进程在补充的桶，返回其出题参数"""
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "UPDATE melody_bank_bucket SET lease_owner = ?, lease_until = ? WHERE key = "
+                "(SELECT b.key FROM melody_bank_bucket b WHERE b.lease_until < ? "
+                "AND (SELECT COUNT(*) FROM melody_bank m WHERE m.key = b.key) < ? ORDER BY b.key LIMIT 1) "
+                "AND lease_until < ? RETURNING request",
+                (self.owner, now + settings.MELODY_BANK_REFILL_LEASE, now,
+                 settings.MELODY_BANK_LOW_WATERMARK, now)
+            ).fetchone()
+            self.conn.commit()
+        return MelodySettingRequest(**json.loads(row[0])) if row else None
+
+    def renew(self, request: MelodySettingRequest) -> None:
+        """每生成一条旋律续一次租约"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE melody_bank_bucket SET lease_until = ? WHERE key = ? AND lease_owner = ?",
+                (time.time() + settings.MELODY_BANK_REFILL_LEASE, self._key(request), self.owner)
+            )
+            self.conn.commit()
+
+    def release(self, request: MelodySettingRequest, retry_after: float = 0.0) -> None:
+        """释放租约；补充失败时 retry_after 秒内其他进程也不再补充该桶"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE melody_bank_bucket SET lease_owner = NULL, lease_until = ? WHERE key = ? AND lease_owner = ?",
+                (time.time() + retry_after if retry_after else 0, self._key(request), self.owner)
+            )
+            self.conn.commit()
+
+    async def refill(self, generate: Callable[[MelodySettingRequest], Awaitable[MelodyScorePitch]]) -> int:
+        """把低于低水位的桶补充到高水位，返回新增的旋律数"""
+        added = 0
+        while True:
+            request = await asyncio.to_thread(self.claim)
+            if request is None:
+                break
+            failures = 0
+            try:
+                while await asyncio.to_thread(self.size, request) < settings.MELODY_BANK_HIGH_WATERMARK and failures < 3:
+                    try:
+                        melody = await generate(request)
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Failed to generate melody for bank {self.bucket_key(request)}: {str(e)}")
+                        melody = None
+                    if melody is not None and await asyncio.to_thread(self.put, request, melody):
+                        added += 1
+                        await asyncio.to_thread(self.renew, request)
+                    else:
+                        failures += 1
+            finally:
+                # 连续失败的桶等到下一轮补充再试，避免本轮反复领取
+                await asyncio.to_thread(
+                    self.release, request, settings.MELODY_BANK_REFILL_INTERVAL if failures >= 3 else 0.0
+                )
+        if added:
+            logger.info(f"Melody bank refilled {added} melodies, total {await asyncio.to_thread(self.size)}")
+        return added
+
+    async def run_worker(self, generate: Callable[[MelodySettingRequest], Awaitable[MelodyScorePitch]]) -> None:
+        """后台补充任务，随应用启动，关闭时取消"""
+        logger.info("Melody bank worker started")
+        try:
+            while True:
+                try:
+                    await self.refill(generate)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Melody bank refill failed: {str(e)}", exc_info=True)
+                await asyncio.sleep(settings.MELODY_BANK_REFILL_INTERVAL)
+        finally:
+            logger.info("Melody bank worker stopped")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 创建全局旋律库实例
+melody_bank_service = MelodyBankService()
@@ -7,21 +7,36 @@ import string
 import struct
 import time
 from datetime import  timedelta
-from typing import Optional
-import requests
+from typing import List, Optional
 from OpenSSL import crypto
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.serialization import load_pem_private_key
-from sqlalchemy import select
+from sqlalchemy import select, update, func, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.models.order import VipOrder
 from app.models.vip import VipLevel, Vip
 from app.models.user import User
 from app.core.config import settings
+from app.core.http_client import http_client
 from app.core.logger import logger
+from app.core.snowflake import snowflake
+from app.core.wechatpay_crypto import wechatpay_crypto, WeChatPayCryptoError
 from app.services.vip_service import vip_service
+from app.services.user_cache_service import user_cache_service
+from app.db.routing import replica_lag_tracker
+
+
+# 订单查询可返回的列
+ORDER_QUERY_FIELDS = (
+    "id", "trade_no", "user_id", "vip_id", "is_paid", "paid_date", "paid_amount",
+    "is_return", "return_date", "return_amount", "created_at", "updated_at",
+)
+
+
+# 支付回调结算任务队列
+PAYMENT_NOTIFY_QUEUE = "payment_notify"
+# 生成的 trade_no 与已有订单冲突时的最多尝试次数
+TRADE_NO_ATTEMPTS = 3
 
 
 class OrderService:
@@ -34,23 +49,32 @@ class OrderService:
     ) -> Optional[VipOrder]:
         """创建VIP订单"""
         try:
-            out_trade_no = int(f"{int(time.time())}{random.randint(100, 999)}")
-            # 创建订单
-            order = VipOrder(
-                user_id=user.id,
-                vip_id=vip_order.vip_id,
-                trade_no=out_trade_no,
-                is_paid=vip_order.is_paid,
-                paid_amount=vip_order.paid_amount,
-                is_return=vip_order.is_return,
-                return_amount=vip_order.return_amount,
-                return_date=vip_order.return_date,
-            )
-            db.add(order)
-            await db.commit()
-            await db.refresh(order)
-            
-            return order
+            for attempt in range(TRADE_NO_ATTEMPTS):
+                # 创建订单
+                order = VipOrder(
+                    user_id=user.id,
+                    vip_id=vip_order.vip_id,
+                    trade_no=snowflake.next_id(),
+                    is_paid=vip_order.is_paid,
+                    paid_amount=vip_order.paid_amount,
+                    is_return=vip_order.is_return,
+                    return_amount=vip_order.return_amount,
+                    return_date=vip_order.return_date,
+                )
+                db.add(order)
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    # trade_no 唯一索引冲突（worker id配置重叠等），换一个号重试
+                    await db.rollback()
+                    logger.warning(f"Duplicate trade_no {order.trade_no}, retrying ({attempt + 1}/{TRADE_NO_ATTEMPTS})")
+                    continue
+                await db.refresh(order)
+                replica_lag_tracker.mark_written(user.id)
+                return order
+
+            logger.error(f"Failed to create VIP order for user {user.id}: trade_no kept colliding")
+            return None
             
         except Exception as e:
             logger.error(f"Failed to create VIP order: {str(e)}", exc_info=True)
@@ -69,7 +93,7 @@ class OrderService:
                 "mchid": settings.WECHAT_MCH_ID,
                 "description": f"声之宝典VIP会员",
                 "out_trade_no": str(order.trade_no),  # 使用订单ID作为商户订单号
-                "notify_url": f"{settings.API_HOST}/api/v1/orders/wechat-notify",
+                "notify_url": settings.WECHAT_NOTIFY_URL,
                 "amount": {
                     "total": order.paid_amount,
                     "currency": "CNY"
@@ -81,14 +105,13 @@ class OrderService:
             body_str = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
             logger.info(f"WECHAT PAY POST body: {body_str}")
             
-            # TODO: 实现微信支付签名和认证
-
             timestamp = str(int(time.time()))
             nonce_str = self.generate_nonce_str()
 
-            headers = self._get_wechat_pay_headers(method="POST", url=url, timestamp=timestamp, nonce_str=nonce_str, body=body_str, mch_id=settings.WECHAT_MCH_ID, serial_no=settings.WECHAT_PAY_SERIAL_NO, private_key_path=settings.WECHAT_PAY_KEY_PATH)
+            headers = self._get_wechat_pay_headers(method="POST", url=url, timestamp=timestamp, nonce_str=nonce_str, body=body_str, mch_id=settings.WECHAT_MCH_ID, serial_no=wechatpay_crypto.serial_no)
             logger.info(f"WECHAT PAY POST headers: {headers}")
-            response = requests.post(url, data=body_str.encode('utf-8'), headers=headers)
+            # 下单以out_trade_no幂等，超时或5xx时可以安全重试
+            response = await http_client.post("wechatpay", url, content=body_str.encode('utf-8'), headers=headers)
             resp = response.json()
             # #TODO 模拟
             # resp = {"prepay_id": "wx19171500523387e20884ba3048ea1e0001"}
@@ -97,7 +120,7 @@ class OrderService:
             db.add(order)
             await db.commit()
 
-            paySign = self.build_pay_signature(settings.WECHAT_APP_ID, timestamp, nonce_str, resp)
+            paySign = self.build_pay_signature(settings.WECHAT_APP_ID, timestamp, nonce_str, resp.get("prepay_id"))
 
             # 开发测试时模拟返回支付参数
             result = {
@@ -115,73 +138,176 @@ class OrderService:
             logger.error(f"Failed to create WeChat payment: {str(e)}", exc_info=True)
             return None
 
+    async def download_platform_certificates(self) -> List[str]:
+        """
+        从微信支付 /v3/certificates 下载平台证书，解密后保存到平台证书目录
+
+        Returns:
+            List[str]: 保存的平台证书序列号
+        """
+        url = "https://api.mch.weixin.qq.com/v3/certificates"
+        timestamp = str(int(time.time()))
+        nonce_str = self.generate_nonce_str()
+        headers = self._get_wechat_pay_headers(method="GET", url=url, timestamp=timestamp, nonce_str=nonce_str, body="", mch_id=settings.WECHAT_MCH_ID, serial_no=wechatpay_crypto.serial_no)
+        response = await http_client.get("wechatpay", url, headers=headers)
+        if response.status_code != 200:
+            raise WeChatPayCryptoError(f"Failed to download WeChat Pay platform certificates: {response.status_code} {response.text}")
+        # 下载结果本身无法用尚未取得的平台证书验签，依赖HTTPS和APIv3密钥解密（AEAD）保证来源
+        return [
+            wechatpay_crypto.save_platform_certificate(wechatpay_crypto.decrypt(item["encrypt_certificate"]))
+            for item in response.json().get("data", [])
+        ]
+
+    async def load_platform_certificates(self) -> None:
+        """
+        启动时加载平台证书：先下载最新证书，下载失败时使用目录中已有的证书
+
+        Raises:
+            WeChatPayCryptoError: 开启了回调验签但没有可用的平台证书，所有支付回调都会被拒绝，直接中止启动
+        """
+        try:
+            serials = await self.download_platform_certificates()
+            logger.info(f"Downloaded WeChat Pay platform certificates: {serials}")
+        except Exception as e:
+            logger.error(f"Failed to download WeChat Pay platform certificates: {str(e)}", exc_info=True)
+        if not wechatpay_crypto.platform_serials():
+            raise WeChatPayCryptoError(
+                f"No WeChat Pay platform certificate in {settings.WECHAT_PAY_PLATFORM_CERT_DIR}; "
+                f"payment notifications cannot be verified (set WECHAT_PAY_VERIFY_NOTIFY=False to skip verification)"
+            )
+
     async def handle_payment_notification(
         self, 
         db: Session, 
-        order_id: int, 
+        trade_no: int, 
         payment_success: bool
     ) -> bool:
-        """处理支付回调通知"""
+        """
+        处理支付回调通知（结算）
+
+        在一个事务中完成：SELECT ... FOR UPDATE 锁定订单，已支付则直接返回（微信重复通知时幂等），
+        否则标记订单已支付，并用一条 UPDATE ... RETURNING 更新用户VIP状态。
+        VIP时长从 vip_service 缓存读取，不再查询vip表。
+
+        Args:
+            db: 数据库会话
+            trade_no: 商户订单号（out_trade_no）
+            payment_success: 微信返回的交易状态是否为SUCCESS
+
+        Returns:
+            bool: 已结算（包括重复通知）返回True，需要微信重试时返回False
+        """
+        if not payment_success:
+            logger.error(f"Payment failed for order {trade_no}")
+            return False
+
         try:
-            # order = await db.query(VipOrder).filter(VipOrder.id == order_id).first()
-            result = await db.execute(select(VipOrder).where(VipOrder.id == order_id))
+            result = await db.execute(
+                select(VipOrder).where(VipOrder.trade_no == trade_no).with_for_update()
+            )
             order = result.scalar_one_or_none()
             if not order:
-                logger.error(f"Order {order_id} not found")
+                logger.error(f"Order {trade_no} not found")
+                await db.rollback()
                 return False
 
-            if payment_success:
-                # 更新订单状态
-                order.is_paid = True
-                order.paid_date = datetime.datetime.now()
-                db.add(order)
-                await db.commit()
-                
-                # 更新用户VIP状态
-                # user = await db.query(User).filter(User.id == order.user_id).first()
-                result = await db.execute(select(User).where(User.id == order.user_id))
-                user = result.scalar_one_or_none()
-                if user:
-                    # vip = await db.query(Vip).filter(Vip.id == order.vip_id).first()
-                    result = await db.execute(select(Vip).where(Vip.id == order.vip_id))
-                    vip = result.scalar_one_or_none()
-                    if vip:
-                        user.is_vip = True
-                        if user.vip_start_date:
-                            user.vip_start_date = user.vip_start_date
-                        else:
-                            user.vip_start_date = datetime.now()
-                        # 计算到期时间
-                        duration_days = vip_service.getDaysById(order.vip_id)
-                        #TODO 2次购买计算时间从过期起算
-                        user.vip_expire_date = user.vip_start_date + timedelta(days=duration_days)
-                        db.add(user)
-                        await db.commit()
-                        await db.refresh(user)
-
-                logger.info(f"Successfully processed payment for order {order_id}")
+            if order.is_paid:
+                # 重复通知，已经结算过
+                logger.info(f"Order {trade_no} already settled")
+                await db.rollback()
                 return True
-            else:
-                logger.error(f"Payment failed for order {order_id}")
+
+            if not vip_service.contains_vip(order.vip_id):
+                logger.error(f"VIP {order.vip_id} of order {trade_no} not found in cache")
+                await db.rollback()
                 return False
+            duration_days = vip_service.getDaysById(order.vip_id)
+
+            # 更新订单状态
+            now = datetime.datetime.now()
+            order.is_paid = True
+            order.paid_date = now
+
+            # 更新用户VIP状态，开始时间为空时从现在起算
+            #TODO 2次购买计算时间从过期起算
+            start_date = func.coalesce(User.vip_start_date, now)
+            result = await db.execute(
+                update(User)
+                .where(User.id == order.user_id)
+                .values(
+                    is_vip=True,
+                    vip_start_date=start_date,
+                    vip_expire_date=self._add_days(db, start_date, duration_days),
+                    # 已签发令牌中的VIP声明随之失效
+                    token_version=User.token_version + 1,
+                )
+                .returning(User.id, User.vip_expire_date)
+            )
+            user_row = result.first()
+            await db.commit()
+
+            if user_row:
+                # VIP状态变化，清除已认证用户缓存，随后的查询走主库
+                user_cache_service.invalidate_user(user_row.id)
+                replica_lag_tracker.mark_written(user_row.id)
+                logger.info(f"User {user_row.id} VIP expires at {user_row.vip_expire_date}")
+            else:
+                logger.error(f"User {order.user_id} of order {trade_no} not found")
+
+            logger.info(f"Successfully processed payment for order {trade_no}")
+            return True
                 
         except Exception as e:
             logger.error(f"Failed to process payment notification: {str(e)}", exc_info=True)
             await db.rollback()
             return False
 
+    @staticmethod
+    def _add_days(db: Session, expr, days: int):
+        """生成 日期 + N天 的SQL表达式"""
+        if db.get_bind().dialect.name == "sqlite":
+            return func.datetime(expr, f"+{days} days")
+        return expr + timedelta(days=days)
+
 
-    def _get_wechat_pay_headers(self, method, url, timestamp, nonce_str, body, mch_id, serial_no, private_key_path) -> dict:
+    def parse_payment_notification(self, headers, body: str) -> dict:
+        """
+        校验微信支付回调通知签名并返回交易数据
+
+        加密通知（含 resource）返回解密后的交易对象，包含 out_trade_no、trade_state 等字段。
+        签名无效或无法解密时抛出 WeChatPayCryptoError。
+        """
+        if settings.WECHAT_PAY_VERIFY_NOTIFY and not wechatpay_crypto.verify_notification(headers, body):
+            raise WeChatPayCryptoError("Invalid WeChat Pay notification signature")
+        try:
+            notification = json.loads(body)
+        except ValueError as e:
+            raise WeChatPayCryptoError(f"Invalid WeChat Pay notification body: {str(e)}") from e
+        if "resource" in notification:
+            return wechatpay_crypto.decrypt_resource(notification["resource"])
+        return notification
+
+    async def process_payment_job(self, db: Session, payload: dict) -> None:
+        """
+        支付回调任务处理函数，由任务队列worker调用
+        结算失败时抛出异常，由队列按退避策略重试，多次失败后进入死信
+        """
+        if not payload["payment_success"]:
+            logger.info(f"Order {payload['trade_no']} notified with state {payload.get('trade_state')}, nothing to settle")
+            return
+        if not await self.handle_payment_notification(db, payload["trade_no"], True):
+            raise RuntimeError(f"Failed to settle order {payload['trade_no']}")
+
+    def _get_wechat_pay_headers(self, method, url, timestamp, nonce_str, body, mch_id, serial_no) -> dict:
         """获取微信支付API请求头（包含签名等信息）"""
-        # TODO: 实现微信支付API请求头生成
-        authorization = self.generate_authorization(method, url, timestamp, nonce_str, body, mch_id, serial_no, private_key_path)
+        authorization = self.generate_authorization(method, url, timestamp, nonce_str, body, mch_id, serial_no)
         return {
             "Content-Type": "application/json",
             "Accept": "application/json",
             "Authorization": authorization
         }
 
-    def generate_authorization(self, method, url, timestamp, nonce_str, body, mch_id, serial_no, private_key_path):
+    def generate_authorization(self, method, url, timestamp, nonce_str, body, mch_id, serial_no):
         """
         生成微信支付V3 API的Authorization头
         https://pay.weixin.qq.com/doc/v3/merchant/4012365336
@@ -197,7 +323,6 @@ class OrderService:
         - body: 请求体内容(JSON字符串)
         - mch_id: 商户号
         - serial_no: 商户证书序列号
-        - private_key_path: 商户私钥文件路径
 
         返回:
         - 完整的Authorization头
@@ -206,7 +331,7 @@ class OrderService:
         message = self.build_sign_message(method, url, timestamp, nonce_str, body)
 
         # 3. 生成签名
-        signature = self.sign_message(message, private_key_path)
+        signature = self.sign_message(message)
 
         # 4. 构造Authorization头
         token = f'WECHATPAY2-SHA256-RSA2048 mchid="{mch_id}",nonce_str="{nonce_str}",signature="{signature}",timestamp="{timestamp}",serial_no="{serial_no}"'
@@ -233,28 +358,16 @@ class OrderService:
         message = f"{method}\n{url_path}\n{timestamp}\n{nonce_str}\n{body}\n"
         return message
 
-    def sign_message(self, message, private_key_path):
+    def sign_message(self, message):
         """
-        使用私钥对消息进行签名
+        使用商户私钥对消息进行签名（私钥已缓存，不再每次读取文件）
         """
-        # 加载私钥
-        with open(private_key_path, 'rb') as f:
-            private_key = load_pem_private_key(f.read(), password=None)
-
-        # 对消息进行签名
-        signature = private_key.sign(
-            message.encode('utf-8'),
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
-
-        # Base64编码签名结果
-        return base64.b64encode(signature).decode('utf-8')
+        return wechatpay_crypto.sign(message)
 
     def build_pay_signature(self, appid, timestamp, nonce_str, prepay_id):
-        message = f"{appid}\n{timestamp}\n{nonce_str}\n{prepay_id}\n"
-        sign = self.sign_message(message, settings.WECHAT_PAY_KEY_PATH)
-        return sign
+        """小程序调起支付签名，package 为 prepay_id=xxx"""
+        message = f"{appid}\n{timestamp}\n{nonce_str}\nprepay_id={prepay_id}\n"
+        return self.sign_message(message)
 
     def get_serial_no_from_cert(self, cert_path):
         with open(cert_path, 'r') as f:
@@ -262,6 +375,31 @@ class OrderService:
         cert = crypto.load_certificate(crypto.FILETYPE_PEM, cert_content)
         return cert.get_serial_number()
 
+    def _order_filters(self, query_params: dict, user_id: int) -> list:
+        """根据查询参数构建过滤条件"""
+        filters = [VipOrder.user_id == user_id]
+        if query_params.get("id"):
+            filters.append(VipOrder.id == query_params["id"])
+        if query_params.get("vip_id"):
+            filters.append(VipOrder.vip_id == query_params["vip_id"])
+        if query_params.get("trade_no"):
+            filters.append(VipOrder.trade_no == query_params["trade_no"])
+        if query_params.get("prepay_id"):
+            filters.append(VipOrder.prepay_id == query_params["prepay_id"])
+        if query_params.get("is_paid") is not None:
+            filters.append(VipOrder.is_paid == query_params["is_paid"])
+        if query_params.get("is_return") is not None:
+            filters.append(VipOrder.is_return == query_params["is_return"])
+        if query_params.get("paid_date_s"):
+            filters.append(VipOrder.paid_date >= query_params["paid_date_s"])
+        if query_params.get("paid_date_e"):
+            filters.append(VipOrder.paid_date <= query_params["paid_date_e"])
+        if query_params.get("return_date_s"):
+            filters.append(VipOrder.return_date == query_params["return_date_s"])
+        if query_params.get("return_date_e"):
+            filters.append(VipOrder.return_date <= query_params["return_date_e"])
+        return filters
+
     async def get_vip_orders(
         self,
         db: Session,
@@ -280,32 +418,8 @@ class OrderService:
             list[VipOrder]: VIP订单列表
         """
         try:
-            # 构建基础查询
-            query = select(VipOrder).where(VipOrder.user_id == user_id)
-            
-            # 添加可选的过滤条件
-            if query_params.get("id"):
-                query = query.where(VipOrder.id == query_params["id"])
-            if query_params.get("vip_id"):
-                query = query.where(VipOrder.vip_id == query_params["vip_id"])
-            if query_params.get("trade_no"):
-                query = query.where(VipOrder.trade_no == query_params["trade_no"])
-            if query_params.get("prepay_id"):
-                query = query.where(VipOrder.prepay_id == query_params["prepay_id"])
-            if query_params.get("is_paid") is not None:
-                query = query.where(VipOrder.is_paid == query_params["is_paid"])
-            if query_params.get("is_return") is not None:
-                query = query.where(VipOrder.is_return == query_params["is_return"])
-            if query_params.get("paid_date_s"):
-                query = query.where(VipOrder.paid_date >= query_params["paid_date_s"])
-            if query_params.get("paid_date_e"):
-                query = query.where(VipOrder.paid_date <= query_params["paid_date_e"])
-            if query_params.get("return_date_s"):
-                query = query.where(VipOrder.return_date == query_params["return_date_s"])
-            if query_params.get("return_date_e"):
-                query = query.where(VipOrder.return_date <= query_params["return_date_e"])
-            
-            # 执行查询
+            # 构建查询并执行
+            query = select(VipOrder).where(*self._order_filters(query_params, user_id))
             result = await db.execute(query)
             orders = result.scalars().all()
             
@@ -315,6 +429,82 @@ class OrderService:
             logger.error(f"Failed to get VIP orders: {str(e)}", exc_info=True)
             return []
 
+    @staticmethod
+    def encode_cursor(created_at: datetime.datetime, order_id: int) -> str:
+        """游标：最后一条记录的 (created_at, id)"""
+        raw = json.dumps([created_at.isoformat(), order_id]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+        """解析游标，格式错误时抛出 ValueError"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            created_at, order_id = json.loads(raw)
+            return datetime.datetime.fromisoformat(created_at), int(order_id)
+        except Exception as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    async def query_vip_orders_page(
+        self,
+        db: Session,
+        query_params: dict,
+        user_id: int,
+        limit: int,
+        cursor: Optional[str] = None,
+        fields: Optional[list[str]] = None,
+        with_count: bool = False
+    ) -> dict:
+        """
+        按 (created_at, id) 倒序分页查询VIP订单（键集分页）
+
+        使用 vip_order 上 (user_id, is_paid, is_return, created_at) 的联合索引，
+        翻页时从游标位置继续扫描，不需要OFFSET。
+
+        Args:
+            db: 数据库会话
+            query_params: 查询参数字典
+            user_id: 用户ID
+            limit: 每页条数
+            cursor: 上一页返回的 next_cursor，为空时从第一页开始
+            fields: 需要返回的列，为空时返回全部列；id 和 created_at 总会返回
+            with_count: 是否同时统计符合条件的总数
+
+        Returns:
+            dict: orders（列字典列表）、next_cursor（没有下一页时为None）、total（未请求时为None）
+
+        Raises:
+            ValueError: 游标或列名无效
+        """
+        columns = list(fields or ORDER_QUERY_FIELDS)
+        invalid = [f for f in columns if f not in ORDER_QUERY_FIELDS]
+        if invalid:
+            raise ValueError(f"Invalid fields: {invalid}")
+        for required in ("created_at", "id"):
+            if required not in columns:
+                columns.append(required)
+
+        filters = self._order_filters(query_params, user_id)
+        query = select(*[getattr(VipOrder, f) for f in columns]).where(*filters)
+        if cursor:
+            created_at, order_id = self.decode_cursor(cursor)
+            query = query.where(tuple_(VipOrder.created_at, VipOrder.id) < tuple_(created_at, order_id))
+        # 多取一条用于判断是否还有下一页
+        query = query.order_by(VipOrder.created_at.desc(), VipOrder.id.desc()).limit(limit + 1)
+
+        rows = (await db.execute(query)).mappings().all()
+        orders = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = orders[-1]
+            next_cursor = self.encode_cursor(last["created_at"], last["id"])
+
+        total = None
+        if with_count:
+            total = (await db.execute(select(func.count()).select_from(VipOrder).where(*filters))).scalar_one()
+
+        return {"orders": orders, "next_cursor": next_cursor, "total": total}
+
     async def get_service_orders(
             self,
             db: Session,
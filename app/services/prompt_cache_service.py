@@ -0,0 +1,122 @@
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class PromptCacheService:
+    """
+    AI提示词/响应缓存
+
+    以规范化后提示词的哈希为键，每个键最多保存 N 个不同的响应（变体）。
+    命中时以概率 p 随机返回一个缓存的变体，否则让调用方重新请求并把新结果加入变体，
+    既减少API调用，又保持题目的多样性。
+    数据保存在本地SQLite文件中，重启后仍然有效；键数量和存活时间都有上限。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PromptCacheService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.path = settings.PROMPT_CACHE_PATH
+            self.rng = random.Random()
+            self._lock = threading.Lock()
+            self._conn: Optional[sqlite3.Connection] = None
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "key TEXT NOT NULL, "
+                "value TEXT NOT NULL, "
+                "created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_prompt_cache_key ON prompt_cache (key, created_at)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(prompt: str) -> str:
+        """规范化提示词（合并空白）后取哈希"""
+        normalized = re.sub(r"\s+", " ", prompt).strip()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """以概率 p 返回一个随机变体；没有变体或需要刷新时返回None"""
+        if not settings.PROMPT_CACHE_ENABLED:
+            return None
+        min_created_at = time.time() - settings.PROMPT_CACHE_TTL_SECONDS
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT value FROM prompt_cache WHERE key = ? AND created_at >= ?",
+                (key, min_created_at)
+            ).fetchall()
+        if rows and self.rng.random() < settings.PROMPT_CACHE_HIT_PROBABILITY:
+            self.hits += 1
+            return self.rng.choice(rows)[0]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        """加入一个新变体，只保留最新的 N 个；超过键数量上限时淘汰最久未写入的键"""
+        if not settings.PROMPT_CACHE_ENABLED:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute(
+                "INSERT INTO prompt_cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, now)
+            )
+            conn.execute(
+                "DELETE FROM prompt_cache WHERE key = ? AND id NOT IN "
+                "(SELECT id FROM prompt_cache WHERE key = ? ORDER BY id DESC LIMIT ?)",
+                (key, key, settings.PROMPT_CACHE_VARIANTS)
+            )
+            conn.execute(
+                "DELETE FROM prompt_cache WHERE created_at < ?",
+                (now - settings.PROMPT_CACHE_TTL_SECONDS,)
+            )
+            conn.execute(
+                "DELETE FROM prompt_cache WHERE key IN ("
+                "SELECT key FROM prompt_cache GROUP BY key ORDER BY MAX(id) DESC LIMIT -1 OFFSET ?)",
+                (settings.PROMPT_CACHE_MAX_KEYS,)
+            )
+            conn.commit()
+        logger.debug(f"Cached prompt variant {key[:12]}")
+
+    def count(self, key: Optional[str] = None) -> int:
+        with self._lock:
+            if key is None:
+                return self.conn.execute("SELECT COUNT(*) FROM prompt_cache").fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM prompt_cache WHERE key = ?", (key,)).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 创建全局提示词缓存实例
+prompt_cache_service = PromptCacheService()
@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+from typing import BinaryIO
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import rfft
+from scipy.ndimage import maximum_filter1d, uniform_filter1d
+
+from app.api.v1.schemas.response.pitch_response import RhythmScore, RhythmAssessmentNote, RhythmAssessmentResponse
+from app.core.config import settings
+from app.services.melody_assessment_service import read_audio, resample
+from app.services.score_render_service import ScoreRenderService
+
+TICKS_PER_BEAT = 480  # 与MIDI常用分辨率一致，能整除十六分音符和三连音
+N_FFT = 256  # 约23毫秒，窗越短起音时间越准
+LOG_COMPRESSION = 100.0  # 对数压缩系数，让弱拍和强拍的谱通量接近
+PEAK_SECONDS = 0.05  # 谱通量峰值的最小间隔（秒），一次拍手只算一个拍点
+MEAN_SECONDS = 0.1  # 自适应阈值的滑动平均半窗（秒）
+PEAK_DELTA = 0.1  # 峰值需高于滑动平均的量（相对最大通量）
+
+
+@dataclass
+class RhythmTargets:
+    ticks: np.ndarray  # 每个音的起点（tick）
+    onsets: np.ndarray  # 起点时间（秒，相对乐谱开头）
+    beat_seconds: float
+
+
+class RhythmAssessmentService:
+    """
+    节奏拍打评分服务
+
+    拍点来自上传的录音（谱通量起音检测）或客户端直接提交的时间戳，
+    按乐谱的 tempo 把每个音的 tick 位置换算成期望时间后对齐：
+    - 起点偏移取所有 (拍点 - 期望时间) 差值中最密集的一簇，学生从哪里开始拍都可以
+    - 每个期望时间只匹配一个最近的拍点，匹配窗口为到前后相邻音距离的一半
+    全程用NumPy广播计算，16小节的练习在毫秒级完成。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RhythmAssessmentService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.sample_rate = settings.RHYTHM_ASSESS_SAMPLE_RATE
+            self.hop_length = settings.RHYTHM_ASSESS_HOP_LENGTH
+
+    def decode(self, file: BinaryIO) -> np.ndarray:
+        """解码录音为单声道 float32，并重采样到检测采样率"""
+        return read_audio(file, self.sample_rate, settings.RHYTHM_ASSESS_MAX_SECONDS)
+
+    def resample(self, y: np.ndarray, sample_rate: int) -> np.ndarray:
+        return resample(y, sample_rate, self.sample_rate)
+
+    def onsets(self, y: np.ndarray) -> np.ndarray:
+        """谱通量起音检测，返回拍点时间（秒）"""
+        sr, hop = self.sample_rate, self.hop_length
+        # 帧以 i * hop 为中心
+        y = np.pad(y.astype(np.float32, copy=False), (N_FFT // 2, N_FFT // 2))
+        frames = sliding_window_view(y, N_FFT)[::hop] * np.hanning(N_FFT).astype(np.float32)
+        # scipy的rfft保持float32，比 np.fft 快一倍
+        spectrum = np.log1p(LOG_COMPRESSION * np.abs(rfft(frames, axis=1)))
+        flux = np.concatenate([[0.0], np.maximum(np.diff(spectrum, axis=0), 0.0).sum(axis=1)])
+        if flux.max() <= 0:
+            return np.empty(0)
+
+        peak_frames = max(1, int(PEAK_SECONDS * sr / hop))
+        mean_frames = max(1, int(MEAN_SECONDS * sr / hop))
+        is_peak = (flux == maximum_filter1d(flux, size=2 * peak_frames + 1)) & \
+                  (flux > uniform_filter1d(flux, size=2 * mean_frames + 1) + PEAK_DELTA * flux.max())
+        peaks = np.flatnonzero(is_peak)
+        # 平顶峰会连续多帧相等，只保留第一帧
+        if len(peaks):
+            peaks = peaks[np.concatenate([[True], np.diff(peaks) > peak_frames])]
+        return peaks * hop / sr
+
+    @staticmethod
+    def targets(score: RhythmScore) -> RhythmTargets:
+        """乐谱中每个音（连音线合并、去掉休止符）的 tick 位置和期望时间"""
+        if score.tempo <= 0:
+            raise ValueError(f"Invalid tempo {score.tempo}")
+        timeline = ScoreRenderService.timeline(score, click=False)
+        starts = np.array([start for start, _, pitch in timeline.notes if pitch is not None], dtype=np.float64)
+        if len(starts) == 0:
+            raise ValueError("Score has no notes")
+        ticks = np.rint(starts * TICKS_PER_BEAT).astype(np.int64)
+        beat_seconds = 60.0 / score.tempo
+        return RhythmTargets(ticks=ticks, onsets=ticks * (beat_seconds / TICKS_PER_BEAT), beat_seconds=beat_seconds)
+
+    @staticmethod
+    def offset(taps: np.ndarray, target: RhythmTargets) -> float:
+        """估计拍点相对乐谱开头的偏移：全部 (拍点, 期望时间) 差值中窗口内数量最多的一簇的中位数"""
+        differences = np.sort((taps[:, None] - target.onsets[None, :]).ravel())
+        tolerance = settings.RHYTHM_ASSESS_TOLERANCE
+        counts = np.searchsorted(differences, differences + tolerance, side="right") - np.arange(len(differences))
+        start = int(np.argmax(counts))
+        return float(np.median(differences[start:start + counts[start]]))
+
+    @staticmethod
+    def match(taps: np.ndarray, expected: np.ndarray, beat_seconds: float) -> np.ndarray:
+        """每个期望时间匹配的拍点下标，未匹配为-1"""
+        matches = np.full(len(expected), -1, dtype=np.int64)
+        if len(taps) == 0:
+            return matches
+        # 提前不超过到前一个音距离的一半，推迟不超过到后一个音距离的一半；首尾按半拍
+        gaps = np.diff(expected) / 2
+        before = np.concatenate([[beat_seconds / 2], gaps])
+        after = np.concatenate([gaps, [beat_seconds / 2]])
+        deviation = taps[:, None] - expected[None, :]
+        nearest = np.abs(deviation).argmin(axis=1)
+        tap_deviation = deviation[np.arange(len(taps)), nearest]
+        tap_distance = np.abs(tap_deviation)
+        inside = np.flatnonzero((tap_deviation >= -before[nearest]) & (tap_deviation <= after[nearest]))
+        # 同一个期望时间有多个拍点时取最近的
+        order = inside[np.lexsort((tap_distance[inside], nearest[inside]))]
+        targets, first = np.unique(nearest[order], return_index=True)
+        matches[targets] = order[first]
+        return matches
+
+    def assess_taps(self, taps, score: RhythmScore) -> RhythmAssessmentResponse:
+        taps = np.sort(np.asarray(taps, dtype=np.float64))
+        if not np.isfinite(taps).all():
+            raise ValueError("Tap times must be finite")
+        target = self.targets(score)
+        offset = self.offset(taps, target) if len(taps) else 0.0
+        matches = self.match(taps, offset + target.onsets, target.beat_seconds)
+        matched = matches >= 0
+        if matched.any():
+            # 用匹配上的拍点再校正一次偏移，整体早拍或晚拍不计入误差
+            offset += float(np.median(taps[matches[matched]] - offset - target.onsets[matched]))
+        return self.grade(taps, target, matches, offset)
+
+    def assess(self, y: np.ndarray, score: RhythmScore) -> RhythmAssessmentResponse:
+        return self.assess_taps(self.onsets(y), score)
+
+    @staticmethod
+    def grade(taps: np.ndarray, target: RhythmTargets, matches: np.ndarray, offset: float) -> RhythmAssessmentResponse:
+        matched = matches >= 0
+        expected = offset + target.onsets
+        deviation = np.full(len(expected), np.nan)
+        deviation[matched] = taps[matches[matched]] - expected[matched]
+        correct = matched & (np.abs(np.nan_to_num(deviation, nan=np.inf)) <= settings.RHYTHM_ASSESS_TOLERANCE)
+        extra_taps = int(len(taps) - matched.sum())
+        notes = [
+            RhythmAssessmentNote(
+                index=j,
+                tick=int(target.ticks[j]),
+                expected_onset=round(float(expected[j]), 3),
+                tapped_onset=None if not matched[j] else round(float(taps[matches[j]]), 3),
+                deviation=None if not matched[j] else round(float(deviation[j]), 3),
+                correct=bool(correct[j]),
+            )
+            for j in range(len(expected))
+        ]
+        return RhythmAssessmentResponse(
+            # 多拍的拍点和漏拍一样扣分
+            score=round(100 * int(correct.sum()) / (len(expected) + extra_taps)),
+            accuracy=round(float(correct.mean()), 3),
+            mean_abs_deviation=round(float(np.nanmean(np.abs(deviation))), 3) if matched.any() else None,
+            missed_notes=int((~matched).sum()),
+            extra_taps=extra_taps,
+            notes=notes,
+        )
+
+
+# 创建全局节奏评分实例
+rhythm_assessment_service = RhythmAssessmentService()
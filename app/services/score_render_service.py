@@ -0,0 +1,329 @@
+import hashlib
+import io
+import json
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from math import gcd
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from scipy.signal import resample_poly
+
+from app.api.v1.schemas.response.pitch_response import MelodyScorePitch, RhythmScore
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.rhythm_settings import TimeSignature
+from app.services.audio_asset_service import etag_matches
+from app.services.audio_render_service import audio_render_service, FADE_OUT_SECONDS
+from app.services.melody_bank_service import MEASURE_BEATS
+
+# 输出格式 -> (采样率, Content-Type)；Opus只支持 8k/12k/16k/24k/48k 采样率
+SCORE_FORMATS = {
+    "wav": (None, "audio/wav"),
+    "opus": (24000, "audio/ogg; codecs=opus"),
+}
+# 节拍器每拍的时值（以四分音符为1），6/8按附点四分音符打两拍
+CLICK_BEATS = {
+    TimeSignature.TWO_FOUR: 1.0,
+    TimeSignature.THREE_FOUR: 1.0,
+    TimeSignature.FOUR_FOUR: 1.0,
+    TimeSignature.THREE_EIGHT: 0.5,
+    TimeSignature.SIX_EIGHT: 1.5,
+}
+CLICK_SECONDS = 0.03
+NOTE_GAIN = 0.7
+CLICK_GAIN = 0.5
+
+Score = Union[MelodyScorePitch, RhythmScore]
+# (开始拍, 时值拍数, 键位号；休止符为None)
+TimelineNote = Tuple[float, float, Optional[int]]
+
+
+@dataclass
+class ScoreTimeline:
+    notes: List[TimelineNote]
+    clicks: List[Tuple[float, bool]]  # (开始拍, 是否强拍)
+    beats: float  # 总拍数（含预备拍）
+    tempo: int
+
+
+class _ChunkSink(io.RawIOBase):
+    """接收编码器输出，每写完一块PCM取走已生成的字节"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # 流式输出不能回写，只允许查询当前位置（libsndfile打开时会查询文件长度）
+        target = offset if whence == io.SEEK_SET else offset + self._position if whence == io.SEEK_CUR else None
+        if target != self._position and not (whence == io.SEEK_END and offset == 0):
+            raise io.UnsupportedOperation("seek")
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+class ScoreRenderService:
+    """
+    乐谱音频渲染服务
+
+    把旋律题、节奏题的乐谱按 tempo 渲染成一段音频，客户端不必逐个请求采样再自行排时间。
+    - 旋律使用 audio_render_service 缓存的钢琴PCM，连音线连接的同音合并为一个音
+    - 节奏题用固定键位的钢琴音，并叠加节拍器（强拍音高更高），开头有一小节预备拍
+    - 按块（SCORE_RENDER_CHUNK_SECONDS）混音、编码并立即输出，客户端无需等全部渲染完成即可播放
+    - 完整输出按乐谱指纹做LRU缓存（按总字节数限制，过大的结果不缓存），再次请求直接返回
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ScoreRenderService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self._pcm: Dict[Tuple[int, int], np.ndarray] = {}
+            self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+            self._cache_bytes = 0
+            self._lock = threading.Lock()
+            self.hits = 0
+            self.misses = 0
+
+    @staticmethod
+    def timeline(score: Score, click: Optional[bool] = None) -> ScoreTimeline:
+        """
+        把乐谱展开为时间线
+
+        Args:
+            score: 旋律乐谱（MelodyScorePitch）或节奏乐谱（RhythmScore）
+            click: 是否加节拍器，默认节奏乐谱加、旋律乐谱不加
+        """
+        is_rhythm = isinstance(score, RhythmScore)
+        click = is_rhythm if click is None else click
+        count_in = MEASURE_BEATS[score.time_signature] * settings.SCORE_RENDER_COUNT_IN_MEASURES if click else 0.0
+
+        notes: List[TimelineNote] = []
+        position = count_in
+        tied = False
+        for measure_group in score.measures:
+            for measure in measure_group:
+                for note in measure.notes:
+                    pitch_number = None if note.is_rest else (
+                        settings.SCORE_RENDER_RHYTHM_PITCH if is_rhythm else note.pitch.pitch_number)
+                    if tied and notes and pitch_number is not None and notes[-1][2] == pitch_number:
+                        start, duration, _ = notes[-1]
+                        notes[-1] = (start, duration + note.duration, pitch_number)
+                    else:
+                        notes.append((position, note.duration, pitch_number))
+                    position += note.duration
+                    tied = note.tied_to_next
+
+        clicks: List[Tuple[float, bool]] = []
+        if click:
+            step = CLICK_BEATS[score.time_signature]
+            per_measure = int(round(MEASURE_BEATS[score.time_signature] / step))
+            clicks = [(index * step, index % per_measure == 0) for index in range(int(np.ceil(position / step - 1e-9)))]
+        return ScoreTimeline(notes=notes, clicks=clicks, beats=position, tempo=score.tempo)
+
+    @staticmethod
+    def fingerprint(timeline: ScoreTimeline, fmt: str) -> str:
+        """乐谱指纹：只取影响发声的内容，与正确答案标记等无关"""
+        canonical = json.dumps(
+            [timeline.tempo, timeline.notes, timeline.clicks, fmt, settings.AUDIO_RENDER_SAMPLE_RATE],
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    def _note_pcm(self, pitch_number: int, sample_rate: int) -> np.ndarray:
+        """输出采样率下的钢琴PCM，需要时由缓存的PCM重采样一次"""
+        key = (pitch_number, sample_rate)
+        pcm = self._pcm.get(key)
+        if pcm is None:
+            pcm = audio_render_service.pcm(pitch_number)
+            source_rate = audio_render_service.sample_rate
+            if sample_rate != source_rate:
+                divisor = gcd(source_rate, sample_rate)
+                pcm = resample_poly(pcm, sample_rate // divisor, source_rate // divisor).astype(np.float32)
+            pcm = self._pcm.setdefault(key, pcm)
+        return pcm
+
+    @staticmethod
+    def _click_pcm(sample_rate: int, accent: bool) -> np.ndarray:
+        t = np.arange(int(CLICK_SECONDS * sample_rate), dtype=np.float32) / sample_rate
+        frequency = 2000.0 if accent else 1500.0
+        return (np.sin(2 * np.pi * frequency * t) * np.exp(-t * 150.0)).astype(np.float32)
+
+    def _events(self, timeline: ScoreTimeline, sample_rate: int) -> Tuple[List[Tuple[int, np.ndarray]], int]:
+        """时间线转为 (开始采样点, PCM) 列表和总长度"""
+        samples_per_beat = 60.0 / timeline.tempo * sample_rate
+        fade = int(FADE_OUT_SECONDS * sample_rate)
+        events: List[Tuple[int, np.ndarray]] = []
+        for start, duration, pitch_number in timeline.notes:
+            if pitch_number is None:
+                continue
+            pcm = self._note_pcm(pitch_number, sample_rate)
+            # 音符按时值截断，末尾淡出，避免与下一个音重叠
+            length = min(len(pcm), int(duration * samples_per_beat) + fade)
+            note = pcm[:length] * np.float32(NOTE_GAIN)
+            tail = min(fade, length)
+            if length < len(pcm) and tail:
+                note[-tail:] *= np.linspace(1.0, 0.0, tail, dtype=np.float32)
+            events.append((int(start * samples_per_beat), note))
+        clicks = {accent: self._click_pcm(sample_rate, accent) * np.float32(CLICK_GAIN) for accent in (True, False)}
+        events.extend((int(start * samples_per_beat), clicks[accent]) for start, accent in timeline.clicks)
+        events.sort(key=lambda event: event[0])
+        total = max([int(timeline.beats * samples_per_beat)] + [offset + len(pcm) for offset, pcm in events])
+        return events, total
+
+    @staticmethod
+    def _chunks(events: List[Tuple[int, np.ndarray]], total: int, sample_rate: int) -> Iterator[np.ndarray]:
+        """按块混音，每块只叠加与之重叠的音"""
+        chunk_size = max(1, int(settings.SCORE_RENDER_CHUNK_SECONDS * sample_rate))
+        first = 0
+        for chunk_start in range(0, total, chunk_size):
+            chunk_end = min(chunk_start + chunk_size, total)
+            out = np.zeros(chunk_end - chunk_start, dtype=np.float32)
+            # 已经结束的音不再参与后面的块
+            while first < len(events) and events[first][0] + len(events[first][1]) <= chunk_start:
+                first += 1
+            for offset, pcm in events[first:]:
+                if offset >= chunk_end:
+                    break
+                lo, hi = max(offset, chunk_start), min(offset + len(pcm), chunk_end)
+                if lo < hi:
+                    out[lo - chunk_start:hi - chunk_start] += pcm[lo - offset:hi - offset]
+            yield np.clip(out, -1.0, 1.0)
+        if total == 0:
+            yield np.zeros(0, dtype=np.float32)
+
+    @staticmethod
+    def _wav_header(sample_rate: int, frames: int) -> bytes:
+        data_size = frames * 2
+        return b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE" + \
+            b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16) + \
+            b"data" + struct.pack("<I", data_size)
+
+    def _encode(self, timeline: ScoreTimeline, fmt: str) -> Iterator[bytes]:
+        sample_rate = SCORE_FORMATS[fmt][0] or audio_render_service.sample_rate
+        events, total = self._events(timeline, sample_rate)
+        if fmt == "wav":
+            # 总长度由时值预先确定，头部可以先发
+            yield self._wav_header(sample_rate, total)
+            for chunk in self._chunks(events, total, sample_rate):
+                yield (chunk * 32767).astype("<i2").tobytes()
+            return
+        sink = _ChunkSink()
+        with sf.SoundFile(sink, "w", samplerate=sample_rate, channels=1, format="OGG", subtype="OPUS") as encoder:
+            for chunk in self._chunks(events, total, sample_rate):
+                encoder.write(chunk)
+                data = sink.drain()
+                if data:
+                    yield data
+        yield sink.drain()
+
+    def cached(self, fingerprint: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._cache.get(fingerprint)
+            if data is not None:
+                self._cache.move_to_end(fingerprint)
+                self.hits += 1
+            return data
+
+    def _store(self, fingerprint: str, data: bytes) -> None:
+        with self._lock:
+            old = self._cache.pop(fingerprint, None)
+            if old is not None:
+                self._cache_bytes -= len(old)
+            self._cache[fingerprint] = data
+            self._cache_bytes += len(data)
+            while self._cache_bytes > settings.SCORE_RENDER_CACHE_BYTES:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+
+    def stream(self, timeline: ScoreTimeline, fmt: str, fingerprint: str) -> Iterator[bytes]:
+        """边渲染边输出，完整渲染后写入缓存；超过 SCORE_RENDER_CACHE_MAX_ITEM_BYTES 时不再保留已输出的块"""
+        self.misses += 1
+        max_bytes = min(settings.SCORE_RENDER_CACHE_MAX_ITEM_BYTES, settings.SCORE_RENDER_CACHE_BYTES)
+        parts, size = [], 0
+        for data in self._encode(timeline, fmt):
+            if data:
+                size += len(data)
+                if parts is not None:
+                    parts.append(data)
+                    if size > max_bytes:
+                        parts = None
+                yield data
+        if parts is not None:
+            self._store(fingerprint, b"".join(parts))
+        logger.debug(f"Rendered score {fingerprint} ({fmt}, {size} bytes, cached: {parts is not None})")
+
+    def render(self, score: Score, fmt: Optional[str] = None,
+               click: Optional[bool] = None) -> Tuple[str, str, Union[bytes, Iterator[bytes]]]:
+        """
+        渲染乐谱
+
+        Returns:
+            (指纹, Content-Type, 缓存命中时为完整字节，否则为按块输出的迭代器)
+        """
+        fmt = fmt or settings.SCORE_RENDER_FORMAT
+        if fmt not in SCORE_FORMATS:
+            raise ValueError(f"Unsupported score format {fmt}")
+        if score.tempo <= 0:
+            raise ValueError(f"Invalid tempo {score.tempo}")
+        timeline = self.timeline(score, click)
+        if timeline.beats * 60.0 / timeline.tempo > settings.SCORE_RENDER_MAX_SECONDS:
+            raise ValueError("Score is too long to render")
+        sample_rate = SCORE_FORMATS[fmt][0] or audio_render_service.sample_rate
+        # 流式输出开始后无法再返回错误，先确认所有采样可用
+        for pitch_number in {note[2] for note in timeline.notes if note[2] is not None}:
+            self._note_pcm(pitch_number, sample_rate)
+        fingerprint = self.fingerprint(timeline, fmt)
+        media_type = SCORE_FORMATS[fmt][1]
+        data = self.cached(fingerprint)
+        if data is not None:
+            return fingerprint, media_type, data
+        return fingerprint, media_type, self.stream(timeline, fmt, fingerprint)
+
+    async def response(self, request: Request, score: Score, fmt: Optional[str] = None,
+                       click: Optional[bool] = None) -> Response:
+        """缓存命中时整体返回，否则分块流式返回；ETag为乐谱指纹"""
+        # 校验并解码/重采样钢琴采样是CPU密集的，放到线程池中，不阻塞事件循环
+        fingerprint, media_type, body = await run_in_threadpool(self.render, score, fmt, click)
+        etag = f'"{fingerprint}"'
+        headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.AUDIO_ASSET_MAX_AGE}"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if isinstance(body, bytes):
+            return Response(content=body, media_type=media_type, headers=headers)
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+# 创建全局乐谱音频渲染实例
+score_render_service = ScoreRenderService()
@@ -1,6 +1,7 @@
 import numpy as np
-import librosa
 from typing import Optional, Tuple, List, Callable, Dict, Any
+
+from app.core import music_math
 from app.services.audio_processing import AudioProcessor
 from app.models.pitch import Pitch
 from app.services.pitch_service import pitch_service
@@ -182,8 +183,7 @@ class TunerService:
         nearest_pitch, min_cents_diff = self.get_nearest_piano_pitch(main_frequency)
         
         # 计算与最接近钢琴音高的音分偏差
-        target_hz = librosa.note_to_hz(nearest_pitch.name)
-        cents_diff = 1200 * np.log2(main_frequency / target_hz)
+        cents_diff = music_math.cents(main_frequency, music_math.key_to_hz(nearest_pitch.pitch_number))
         
         # 初始化最佳匹配音高
         best_pitch = nearest_pitch
@@ -200,8 +200,8 @@ class TunerService:
                 if 0 <= possible_pitch_number <= 88:  # 确保在钢琴音域内
                     possible_pitch = pitch_service.get_pitch_by_number(possible_pitch_number)
                     if possible_pitch:
-                        possible_target_hz = librosa.note_to_hz(possible_pitch.name)
-                        possible_cents_diff = 1200 * np.log2(main_frequency / possible_target_hz)
+                        possible_target_hz = music_math.key_to_hz(possible_pitch.pitch_number)
+                        possible_cents_diff = music_math.cents(main_frequency, possible_target_hz)
                         
                         # 如果这个音高更接近，更新最佳匹配
                         if abs(possible_cents_diff) < best_cents_diff:
@@ -220,24 +220,9 @@ class TunerService:
         Returns:
             Tuple[Pitch, float]: (最接近的钢琴音高对象, 音分偏差)
         """
-        # 获取所有钢琴音高
-        piano_pitches = pitch_service.get_all_pitch()
-
-        min_cents_diff = float('inf')
-        nearest_pitch = None
-        
-        for pitch in piano_pitches:
-            # 获取目标频率
-            target_frequency = librosa.note_to_hz(pitch.name)
-            
-            # 计算音分偏差
-            cents_diff = abs(1200 * np.log2(frequency / target_frequency))
-            
-            if cents_diff < min_cents_diff:
-                min_cents_diff = cents_diff
-                nearest_pitch = pitch
-                
-        return nearest_pitch, min_cents_diff
+        # 直接由频率算出键位号，不再逐个比较88个音高
+        key, cents_diff = music_math.nearest_key(frequency)
+        return pitch_service.get_pitch_by_number(key), abs(cents_diff)
     
     async def get_tuning_status(self, frequency: float) -> str:
         """获取调音状态
@@ -266,10 +251,9 @@ class TunerService:
         Returns:
             str: 调音方向描述
         """
-        nearest_pitch, cents_diff = self.get_nearest_piano_pitch(frequency)
-        target_frequency = librosa.note_to_hz(nearest_pitch.name)
+        _, cents_diff = music_math.nearest_key(frequency)
         
-        if frequency > target_frequency:
+        if cents_diff > 0:
             return "higher"
         else:
             return "lower"
@@ -0,0 +1,128 @@
+import dataclasses
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from sqlalchemy import inspect
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.models.user import User, CombineUser
+
+
+class UserCacheService:
+    """
+    已认证用户缓存
+
+    get_current_user 的结果以 (user_id, token iat) 为键，get_current_user_vip 的结果以
+    (user_id, users.token_version) 为键，用户当前的 token_version 也缓存在这里，短TTL + LRU淘汰。
+    支付回调、用户信息更新时调用 invalidate_user 主动失效。缓存是进程内的：
+    其他进程缓存的 token_version 在TTL内过期后重新查询，VIP状态变更最多延迟一个TTL生效。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(UserCacheService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        # 单例模式，避免重复初始化
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+            self.ttl = settings.AUTH_USER_CACHE_TTL_SECONDS
+            self.max_size = settings.AUTH_USER_CACHE_MAX_SIZE
+            self._lock = threading.Lock()
+            # (kind, user_id, iat 或 token_version，version条目为0) -> (过期时间, 缓存值)
+            self._entries: "OrderedDict[Tuple[str, int, int], Tuple[float, object]]" = OrderedDict()
+            # user_id -> 该用户的全部缓存键，用于按用户失效
+            self._user_keys: Dict[int, Set[Tuple[str, int, int]]] = {}
+            self.hits = 0
+            self.misses = 0
+
+    def _get(self, kind: str, user_id: int, iat: int):
+        key = (kind, user_id, iat)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expire_at, value = entry
+            if expire_at < now:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _put(self, kind: str, user_id: int, iat: int, value: object) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        key = (kind, user_id, iat)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def _remove(self, key: Tuple[str, int, int]) -> None:
+        self._entries.pop(key, None)
+        keys = self._user_keys.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                self._user_keys.pop(key[1], None)
+
+    def get_user(self, user_id: int, iat: int) -> Optional[User]:
+        """获取缓存的用户，每次返回新的游离User对象，避免跨请求共享ORM实例"""
+        values = self._get("user", user_id, iat)
+        if values is None:
+            return None
+        return User(**values)
+
+    def put_user(self, user_id: int, iat: int, user: User) -> None:
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._put("user", user_id, iat, values)
+
+    def get_combine_user(self, user_id: int, token_version: int) -> Optional[CombineUser]:
+        """获取缓存的VIP用户信息，VIP已过期则视为未命中"""
+        combine_user = self._get("vip", user_id, token_version)
+        if combine_user is None:
+            return None
+        if combine_user.vip_expire_date is None or combine_user.vip_expire_date < datetime.datetime.now():
+            with self._lock:
+                self._remove(("vip", user_id, token_version))
+            return None
+        return dataclasses.replace(combine_user)
+
+    def put_combine_user(self, user_id: int, token_version: int, combine_user: CombineUser) -> None:
+        self._put("vip", user_id, token_version, dataclasses.replace(combine_user))
+
+    def get_token_version(self, user_id: int) -> Optional[int]:
+        """获取缓存的用户当前 token_version，未命中返回None"""
+        return self._get("version", user_id, 0)
+
+    def put_token_version(self, user_id: int, token_version: int) -> None:
+        self._put("version", user_id, 0, token_version)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """使本进程中某个用户的全部缓存失效（支付成功、用户信息变更时调用）"""
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+        logger.debug(f"Invalidated cached principal for user {user_id}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+
+# 创建全局用户缓存实例
+user_cache_service = UserCacheService()
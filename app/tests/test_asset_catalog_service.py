@@ -0,0 +1,84 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+from app.core.config import settings
+from app.services.asset_catalog_service import AssetCatalogService
+
+
+class TestAssetCatalogService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = self.tmp_dir.name
+        sf.write(os.path.join(self.directory, "tone_40_C4.wav"), np.zeros(8000, dtype=np.float32), 16000)
+        for name in ("b.txt", "a.txt"):
+            with open(os.path.join(self.directory, name), "w") as f:
+                f.write(name)
+        os.makedirs(os.path.join(self.directory, "origin"))
+
+        self.service = AssetCatalogService()
+        self._old_state = (self.service._directories, self.service._catalogs)
+        self.service._directories = {}
+        self.service._catalogs = {}
+        self.service.register("test", self.directory)
+        self.service.register("missing", os.path.join(self.directory, "missing"))
+        self.service.scan_all()
+
+    def tearDown(self):
+        (self.service._directories, self.service._catalogs) = self._old_state
+        self.tmp_dir.cleanup()
+
+    def test_scan(self):
+        """测试扫描：只列普通文件，按名称排序，记录大小、哈希和音频时长"""
+        body, etag = self.service.page("test")
+        self.assertEqual(body["total"], 3)
+        self.assertEqual([item["name"] for item in body["items"]], ["a.txt", "b.txt", "tone_40_C4.wav"])
+        self.assertEqual(body["items"][0], {"name": "a.txt", "size": 5,
+                                            "digest": hashlib.sha256(b"a.txt").hexdigest()[:16], "duration": None})
+        self.assertEqual(body["items"][2]["duration"], 0.5)
+        self.assertEqual(body["limit"], settings.ASSET_CATALOG_PAGE_SIZE)
+
+        with self.assertRaises(FileNotFoundError):
+            self.service.page("missing")
+
+    def test_page(self):
+        """测试分页和ETag"""
+        body, etag = self.service.page("test", offset=1, limit=1)
+        self.assertEqual(([item["name"] for item in body["items"]], body["total"]), (["b.txt"], 3))
+        self.assertNotEqual(self.service.page("test", offset=0, limit=1)[1], etag)
+        self.assertEqual(self.service.page("test", offset=1, limit=1)[1], etag)
+        body, _ = self.service.page("test", limit=100000)
+        self.assertEqual(body["limit"], settings.ASSET_CATALOG_MAX_PAGE_SIZE)
+
+    def test_refresh(self):
+        """测试轮询：无变化不重新扫描；新增、修改文件后更新清单，未变化的文件不重新计算哈希"""
+        _, etag = self.service.page("test")
+        self.assertFalse(self.service.refresh("test"))
+        unchanged = self.service.get("test").entries[0]
+
+        with open(os.path.join(self.directory, "c.txt"), "w") as f:
+            f.write("c")
+        path = os.path.join(self.directory, "b.txt")
+        with open(path, "w") as f:
+            f.write("changed")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        self.assertTrue(self.service.refresh("test"))
+
+        body, new_etag = self.service.page("test")
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual([item["name"] for item in body["items"]], ["a.txt", "b.txt", "c.txt", "tone_40_C4.wav"])
+        self.assertEqual(body["items"][1]["digest"], hashlib.sha256(b"changed").hexdigest()[:16])
+        self.assertIs(self.service.get("test").entries[0], unchanged)
+
+        os.makedirs(os.path.join(self.directory, "missing"))
+        self.assertTrue(self.service.refresh("missing"))
+        self.assertEqual(self.service.page("missing")[0]["total"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
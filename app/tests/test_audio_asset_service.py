@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import unittest
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.services.audio_asset_service import AudioAssetService, SampleResponse, IMMUTABLE_CACHE_CONTROL, \
+    ZEROCOPY_EXTENSION
+
+
+class TestAudioAssetService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.data = bytes(range(256)) * 40
+        for name, content in (("tone_40_C4.mp3", self.data), ("tone_40_C4.wav", b"wav"),
+                              ("tone_41_C#4_Db4.mp3", b"other"), ("readme.txt", b"x")):
+            with open(os.path.join(self.tmp_dir.name, name), "wb") as f:
+                f.write(content)
+        self.service = AudioAssetService()
+        self._old_state = (self.service.directory, self.service._by_pitch, self.service._by_digest,
+                           self.service._loaded, self.service._stats)
+        self._old_store = settings.AUDIO_ASSET_STORE
+        self.service._stats = {}
+        self.service.load(self.tmp_dir.name)
+
+        app = FastAPI()
+
+        @app.get("/audio/{number}")
+        async def audio(request: Request, number: int):
+            return self.service.response(request, self.service.get(number))
+
+        @app.get("/asset/{digest}")
+        async def asset(request: Request, digest: str):
+            found = self.service.get_by_digest(digest)
+            if not found:
+                raise HTTPException(status_code=404)
+            return self.service.response(request, found, immutable=True)
+
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        (self.service.directory, self.service._by_pitch, self.service._by_digest,
+         self.service._loaded, self.service._stats) = self._old_state
+        settings.AUDIO_ASSET_STORE = self._old_store
+        self.tmp_dir.cleanup()
+
+    def test_scan(self):
+        """测试启动扫描：按键位号索引，优先mp3，预先计算哈希和大小"""
+        assets = self.service.all()
+        self.assertEqual([asset.pitch_number for asset in assets], [40, 41])
+        self.assertEqual(assets[0].filename, "tone_40_C4.mp3")
+        self.assertEqual(assets[0].size, len(self.data))
+        self.assertEqual(assets[0].digest, hashlib.sha256(self.data).hexdigest()[:16])
+        self.assertTrue(self.service.url_for(assets[0]).endswith(f"/piano/pitch/audio/asset/{assets[0].digest}"))
+
+    def test_etag_and_304(self):
+        """测试ETag与If-None-Match"""
+        response = self.client.get("/audio/40")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.data)
+        self.assertEqual(response.headers["content-type"], "audio/mpeg")
+        etag = response.headers["etag"]
+
+        response = self.client.get("/audio/40", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        response = self.client.get("/audio/40", headers={"If-None-Match": f'"other", W/{etag}'})
+        self.assertEqual(response.status_code, 304)
+
+    def test_range(self):
+        """测试Range请求：普通范围、后缀范围、无法满足的范围、无效范围和未知单位、If-Range不匹配"""
+        response = self.client.get("/audio/40", headers={"Range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.data[10:20])
+        self.assertEqual(response.headers["content-range"], f"bytes 10-19/{len(self.data)}")
+
+        response = self.client.get("/audio/40", headers={"Range": "bytes=-5"})
+        self.assertEqual(response.content, self.data[-5:])
+
+        response = self.client.get("/audio/40", headers={"Range": f"bytes={len(self.data)}-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers["content-range"], f"bytes */{len(self.data)}")
+
+        # 语法无效的范围和未知单位忽略Range头，返回完整内容
+        for header in ("bytes=10-5", "items=0-1", "bytes=-"):
+            response = self.client.get("/audio/40", headers={"Range": header})
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(response.content, self.data)
+
+        response = self.client.get("/audio/40", headers={"Range": "bytes=0-1", "If-Range": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.content), len(self.data))
+
+    def test_immutable_hashed_url(self):
+        """测试哈希URL返回不可变缓存头"""
+        digest = self.service.get(41).digest
+        response = self.client.get(f"/asset/{digest}")
+        self.assertEqual(response.content, b"other")
+        self.assertEqual(response.headers["cache-control"], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.client.get("/asset/unknown").status_code, 404)
+
+    def test_store_modes(self):
+        """测试存储模式：热门键位常驻内存，其余内存映射；file模式按文件读取，响应内容一致"""
+        settings.AUDIO_ASSET_STORE = "mmap"
+        self.service.load(self.tmp_dir.name)
+        self.assertTrue(self.service.get(40).in_memory)
+        self.assertEqual(bytes(self.service.get(40).buffer), self.data)
+
+        for store in ("file", "memory"):
+            settings.AUDIO_ASSET_STORE = store
+            self.service.load(self.tmp_dir.name)
+            self.assertEqual(self.service.get(40).buffer is None, store == "file")
+            self.assertEqual(self.client.get("/audio/40").content, self.data)
+            self.assertEqual(self.client.get("/audio/40", headers={"Range": "bytes=5-9"}).content, self.data[5:10])
+
+    def test_chunked_and_zerocopy(self):
+        """测试按块发送memoryview切片，以及服务器支持时使用zerocopy扩展"""
+        asset = self.service.get(40)
+
+        async def collect(scope):
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            response = SampleResponse(asset, 3, len(self.data) - 1, 206, {})
+            response.chunk_size = 1000
+            await response(scope, None, send)
+            return messages
+
+        messages = asyncio.run(collect({"type": "http", "method": "GET"}))
+        self.assertEqual(b"".join(m["body"] for m in messages[1:]), self.data[3:])
+        self.assertEqual(len(messages), 1 + 11)
+        self.assertFalse(messages[-1]["more_body"])
+
+        old_sendfile = settings.AUDIO_ASSET_SENDFILE
+        settings.AUDIO_ASSET_SENDFILE = True
+        try:
+            messages = asyncio.run(collect({"type": "http", "method": "GET", "extensions": {ZEROCOPY_EXTENSION: {}}}))
+        finally:
+            settings.AUDIO_ASSET_SENDFILE = old_sendfile
+        self.assertEqual(messages[1]["type"], ZEROCOPY_EXTENSION)
+        self.assertEqual((messages[1]["offset"], messages[1]["count"]), (3, len(self.data) - 3))
+
+    def test_hit_stats(self):
+        """测试按键位统计命中"""
+        self.client.get("/audio/40")
+        etag = self.client.get("/audio/40", headers={"Range": "bytes=0-9"}).headers["etag"]
+        self.client.get("/audio/40", headers={"If-None-Match": etag})
+        self.client.get("/audio/41")
+        stats = self.service.hit_stats()
+        self.assertEqual(list(stats), [40, 41])
+        self.assertEqual(stats[40], {"hits": 2, "range_hits": 1, "not_modified": 1,
+                                     "bytes_sent": len(self.data) + 10, "in_memory": True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+
+from app.core import music_math
+from app.services.audio_feature_service import AudioFeatureService, mmap_npz
+from app.utils.audio_feature_builder import build
+
+SAMPLE_RATE = 22050
+
+
+class TestAudioFeatureService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        source_dir = os.path.join(cls.tmp_dir.name, "origin")
+        os.makedirs(source_dir)
+        t = np.arange(SAMPLE_RATE * 2) / SAMPLE_RATE
+        # 键位40（C4）偏高10音分，键位76（C7）按标准频率；都带衰减的二次谐波
+        for number, cents in ((40, 10.0), (49, 0.0), (76, 0.0)):
+            f0 = music_math.key_to_hz(number) * 2 ** (cents / 1200)
+            tone = (np.sin(2 * np.pi * f0 * t) + 0.5 * np.sin(2 * np.pi * 2 * f0 * t)) * np.exp(-t)
+            onset = np.zeros_like(t)
+            onset[int(0.2 * SAMPLE_RATE):] = 1.0
+            sf.write(os.path.join(source_dir, f"tone_{number}_X.wav"), np.stack([tone * onset] * 2, axis=1) * 0.3,
+                     SAMPLE_RATE)
+        cls.path = os.path.join(cls.tmp_dir.name, "features.npz")
+        cls.arrays = build(source_dir, cls.path, workers=2, sample_rate=SAMPLE_RATE, hop_length=512, seconds=1.0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def setUp(self):
+        self.service = AudioFeatureService()
+        self._old_state = (self.service.path, self.service._arrays, self.service._index, self.service._log_f0,
+                           self.service.sample_rate, self.service.hop_length)
+        self.service.load(self.path)
+
+    def tearDown(self):
+        (self.service.path, self.service._arrays, self.service._index, self.service._log_f0,
+         self.service.sample_rate, self.service.hop_length) = self._old_state
+
+    def test_mmap_npz(self):
+        """测试未压缩npz的各个数组被内存映射，内容与np.load一致"""
+        mapped = mmap_npz(self.path)
+        with np.load(self.path) as loaded:
+            self.assertEqual(sorted(mapped), sorted(loaded.files))
+            for key in loaded.files:
+                np.testing.assert_array_equal(mapped[key], loaded[key])
+        self.assertIsInstance(mapped["f0_track"], np.memmap)
+        self.assertEqual(mapped["f0_track"].shape, (3, 1 + SAMPLE_RATE // 512))
+
+    def test_features(self):
+        """测试实测基频、谐波谱、起音包络和RMS"""
+        c4 = self.service.get(40)
+        self.assertAlmostEqual(c4.cents_offset, 10.0, delta=2.0)
+        self.assertAlmostEqual(self.service.get(76).cents_offset, 0.0, delta=2.0)
+        np.testing.assert_allclose(c4.harmonics[:3], [1.0, 0.5, 0.0], atol=0.05)
+
+        # 0.2秒前静音：f0为NaN，起音包络峰值在0.2秒附近
+        times = self.service.frame_times()
+        self.assertTrue(np.isnan(c4.f0_track[times < 0.15]).all())
+        self.assertAlmostEqual(float(times[np.argmax(c4.onset_envelope)]), 0.2, delta=0.05)
+        self.assertLess(float(c4.rms[0]), 1e-4)
+        with self.assertRaises(KeyError):
+            self.service.get(1)
+
+    def test_lookup(self):
+        """测试批量查询参考基频、最近键位和音分偏差"""
+        f0 = self.service.f0([49, 40])
+        self.assertAlmostEqual(float(f0[0]), 440.0, delta=1.0)
+        np.testing.assert_array_equal(self.service.nearest([445.0, 262.0, 2100.0]), [49, 40, 76])
+        self.assertAlmostEqual(float(self.service.cents_from_reference(49, 440.0 * 2 ** (25 / 1200))), 25.0, delta=2.0)
+        self.assertAlmostEqual(self.service.harmonic_similarity(40, [1.0, 0.5]), 1.0, places=2)
+
+    def test_missing_file(self):
+        """测试特征文件未生成时不可用"""
+        self.service.load(os.path.join(self.tmp_dir.name, "missing.npz"))
+        self.assertFalse(self.service.available)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app.services.audio_asset_service import audio_asset_service, IMMUTABLE_CACHE_CONTROL
+from app.services.audio_pack_service import AudioPackService
+from app.utils.audio_pack_builder import build, parse_profiles, MANIFEST_NAME, PackProfile, _compression_level
+
+
+class TestAudioPackService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.source_dir = os.path.join(cls.tmp_dir.name, "origin")
+        cls.output_dir = os.path.join(cls.tmp_dir.name, "packs")
+        os.makedirs(cls.source_dir)
+        t = np.arange(44100) / 44100
+        for number, frequency in ((40, 261.63), (44, 329.63), (47, 392.0)):
+            data = np.stack([np.sin(2 * np.pi * frequency * t)] * 2, axis=1) * 0.3
+            sf.write(os.path.join(cls.source_dir, f"tone_{number}_X.wav"), data, 44100)
+        with open(os.path.join(cls.source_dir, "readme.txt"), "w") as f:
+            f.write("x")
+        cls.profiles = parse_profiles("low:32:22050,high:128:44100")
+        cls.manifest = build(cls.source_dir, cls.output_dir, cls.profiles, workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def setUp(self):
+        self.service = AudioPackService()
+        self._old_state = (self.service.directory, self.service._packs, self.service._by_digest, self.service._loaded)
+        self.service.load(self.output_dir)
+
+    def tearDown(self):
+        (self.service.directory, self.service._packs, self.service._by_digest, self.service._loaded) = self._old_state
+
+    def test_build(self):
+        """测试转码为各码率、包内偏移与单个文件一致、manifest落盘"""
+        self.assertEqual(sorted(self.manifest["sources"]), ["tone_40_X.wav", "tone_44_X.wav", "tone_47_X.wav"])
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), self.manifest)
+
+        low, high = self.manifest["packs"]["low"], self.manifest["packs"]["high"]
+        self.assertLess(low["size"], high["size"])
+        with open(os.path.join(self.output_dir, high["file"]), "rb") as f:
+            pack = f.read()
+        self.assertEqual(len(pack), high["size"])
+        for entry in high["entries"]:
+            with open(os.path.join(self.output_dir, "high", entry["filename"]), "rb") as f:
+                self.assertEqual(pack[entry["offset"]:entry["offset"] + entry["length"]], f.read())
+        info = sf.info(os.path.join(self.output_dir, "low", "tone_40_X.mp3"))
+        self.assertEqual((info.samplerate, info.channels), (22050, 1))
+
+    def test_rebuild_removes_stale_packs(self):
+        """测试重新构建时删除不再引用的旧采样包"""
+        output_dir = os.path.join(self.tmp_dir.name, "rebuild")
+        os.makedirs(output_dir)
+        with open(os.path.join(output_dir, "low.0000000000000000.pack"), "wb") as f:
+            f.write(b"old")
+        manifest = build(self.source_dir, output_dir, self.profiles[:1], workers=1, seconds=0.5)
+        self.assertEqual(sorted(name for name in os.listdir(output_dir) if name.endswith(".pack")),
+                         [manifest["packs"]["low"]["file"]])
+
+    def test_compression_level(self):
+        """测试码率上下限本身可用，超出范围报错"""
+        self.assertEqual(_compression_level(PackProfile("min", 32, 44100)), 1.0)
+        self.assertEqual(_compression_level(PackProfile("max", 160, 22050)), 0.0)
+        with self.assertRaises(ValueError):
+            _compression_level(PackProfile("bad", 24, 44100))
+
+    def test_profile_for(self):
+        """测试按网络类型选择档位，未构建的档位退回最低码率"""
+        self.assertEqual(self.service.profile_for("wifi"), "high")
+        self.assertEqual(self.service.profile_for("3G"), "low")
+        # 默认档位 medium 未构建
+        self.assertEqual(self.service.profile_for("4g"), "low")
+        self.assertEqual(self.service.profile_for("wifi", profile="low"), "low")
+        self.assertIsNone(self.service.profile_for(profile="medium"))
+
+    def test_serve_pack(self):
+        """测试按索引中的哈希URL下载采样包，支持Range且不计入按键位统计"""
+        app = FastAPI()
+
+        @app.get("/pack/{digest}")
+        async def pack(request: Request, digest: str):
+            found = self.service.get_by_digest(digest)
+            if not found:
+                raise HTTPException(status_code=404)
+            return audio_asset_service.response(request, found, immutable=True)
+
+        client = TestClient(app)
+        index = self.service.index("low")
+        self.assertTrue(index["url"].endswith(f"/piano/pitch/audio/pack/{index['digest']}"))
+        self.assertEqual([entry["pitch_number"] for entry in index["entries"]], [40, 44, 47])
+
+        old_stats = audio_asset_service._stats
+        audio_asset_service._stats = {}
+        try:
+            response = client.get(f"/pack/{index['digest']}")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.content), index["size"])
+            self.assertEqual(response.headers["cache-control"], IMMUTABLE_CACHE_CONTROL)
+            entry = index["entries"][1]
+            response = client.get(f"/pack/{index['digest']}", headers={
+                "Range": f"bytes={entry['offset']}-{entry['offset'] + entry['length'] - 1}"})
+            self.assertEqual(response.status_code, 206)
+            with open(os.path.join(self.output_dir, "low", entry["filename"]), "rb") as f:
+                self.assertEqual(response.content, f.read())
+            self.assertEqual(audio_asset_service.hit_stats(), {})
+        finally:
+            audio_asset_service._stats = old_stats
+        self.assertEqual(client.get("/pack/unknown").status_code, 404)
+
+    def test_missing_manifest(self):
+        """测试尚未构建采样包时不提供采样包"""
+        self.service.load(os.path.join(self.tmp_dir.name, "missing"))
+        self.assertIsNone(self.service.profile_for("wifi"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import piano_pitch_api
+from app.api.v1.auth_api import get_current_user
+from app.core.config import settings
+from app.services.audio_asset_service import audio_asset_service
+from app.services.audio_render_service import AudioRenderService
+
+SAMPLE_RATE = 16000
+
+
+class TestAudioRenderService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp_dir.name, "origin"))
+        # 每个键位写一个恒定幅度的方波，便于检查混音结果
+        for number in (40, 44, 47):
+            data = np.full((SAMPLE_RATE * 2, 2), 0.1 * (number - 39) / 8, dtype=np.float32)
+            sf.write(os.path.join(self.tmp_dir.name, "origin", f"tone_{number}_X.wav"), data, SAMPLE_RATE)
+        self._old_assets = (audio_asset_service.directory, audio_asset_service._by_pitch,
+                            audio_asset_service._by_digest, audio_asset_service._loaded)
+        audio_asset_service.load(self.tmp_dir.name)
+        self._old_settings = (settings.AUDIO_RENDER_NOTE_SECONDS, settings.AUDIO_RENDER_NOTE_SPACING,
+                              settings.AUDIO_RENDER_CACHE_SIZE)
+        settings.AUDIO_RENDER_NOTE_SECONDS = 1.0
+        settings.AUDIO_RENDER_NOTE_SPACING = 0.5
+        settings.AUDIO_RENDER_CACHE_SIZE = 2
+
+        self.service = AudioRenderService()
+        self._old_state = (self.service.sample_rate, self.service._pcm, self.service._sources, self.service._clips)
+        self.service.sample_rate = SAMPLE_RATE // 2
+        self.service._pcm = {}
+        self.service._sources = None
+        self.service._clips = type(self.service._clips)()
+
+    def tearDown(self):
+        (self.service.sample_rate, self.service._pcm, self.service._sources, self.service._clips) = self._old_state
+        (settings.AUDIO_RENDER_NOTE_SECONDS, settings.AUDIO_RENDER_NOTE_SPACING,
+         settings.AUDIO_RENDER_CACHE_SIZE) = self._old_settings
+        (audio_asset_service.directory, audio_asset_service._by_pitch,
+         audio_asset_service._by_digest, audio_asset_service._loaded) = self._old_assets
+        self.tmp_dir.cleanup()
+
+    def test_decode_once(self):
+        """测试采样解码为单声道、重采样、截断，并只解码一次"""
+        pcm = self.service.pcm(40)
+        self.assertEqual(pcm.dtype, np.float32)
+        self.assertEqual(pcm.shape, (SAMPLE_RATE // 2,))
+        self.assertIs(self.service.pcm(40), pcm)
+        with self.assertRaises(ValueError):
+            self.service.pcm(1)
+
+    def test_sequence(self):
+        """测试各播放方式的发声顺序"""
+        self.assertEqual(self.service.sequence([47, 40], "interval", 1), ((47, 40), True))
+        self.assertEqual(self.service.sequence([47, 40], "interval", 2), ((40, 47), False))
+        self.assertEqual(self.service.sequence([47, 40], "interval", 3), ((47, 40), False))
+        self.assertEqual(self.service.sequence([47, 40], "interval", 4), ((40, 47, 40), False))
+        self.assertEqual(self.service.sequence([44, 47, 40], "chord", 2), ((44, 47, 40), False))
+        with self.assertRaises(ValueError):
+            self.service.sequence([40, 44], "chord", 3)
+
+    def test_mix(self):
+        """测试和声同时叠加、上行依次排列"""
+        rate = self.service.sample_rate
+        harmony = self.service.mix([40, 47], "interval", 1)
+        self.assertEqual(len(harmony), rate)
+        expected = (self.service.pcm(40)[100] + self.service.pcm(47)[100]) / np.sqrt(2)
+        self.assertAlmostEqual(float(harmony[100]), float(expected), places=5)
+
+        melodic = self.service.mix([47, 40], "interval", 2)
+        self.assertEqual(len(melodic), rate + rate // 2)
+        self.assertAlmostEqual(float(melodic[100]), float(self.service.pcm(40)[100]), places=5)
+        self.assertAlmostEqual(float(melodic[rate + 100]), float(self.service.pcm(47)[rate // 2 + 100]), places=5)
+
+    def test_render_cache(self):
+        """测试渲染结果编码为WAV并按LRU缓存"""
+        clip = self.service.render([40, 44, 47], "chord", 1, fmt="wav")
+        self.assertEqual(clip.media_type, "audio/wav")
+        data, rate = sf.read(io.BytesIO(clip.data))
+        self.assertEqual(rate, self.service.sample_rate)
+        self.assertIs(self.service.render([40, 44, 47], "chord", 1, fmt="wav"), clip)
+
+        self.service.render([40, 44], "interval", 2, fmt="wav")
+        self.service.render([40, 47], "interval", 2, fmt="wav")
+        self.assertNotIn(((40, 44, 47), "chord", 1, "wav"), self.service._clips)
+        self.assertEqual(len(self.service._clips), 2)
+
+        mp3 = self.service.render([40, 44], "interval", 1, fmt="mp3")
+        self.assertEqual(mp3.media_type, "audio/mpeg")
+        self.assertLess(len(mp3.data), len(clip.data))
+
+    def test_endpoint(self):
+        """测试渲染接口需要登录，If-None-Match 支持弱ETag和多个ETag"""
+        app = FastAPI()
+        app.include_router(piano_pitch_api.router)
+        client = TestClient(app)
+        url = "/piano/pitch/audio/render?pitches=40,44&kind=interval&play_mode=2"
+        self.assertEqual(client.get(url).status_code, 401)
+
+        app.dependency_overrides[get_current_user] = lambda: None
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers["etag"]
+        response = client.get(url, headers={"If-None-Match": f'"other", W/{etag}'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(client.get("/piano/pitch/audio/render?pitches=40,99").status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import datetime
+import unittest
+from contextlib import asynccontextmanager
+
+from starlette.requests import Request
+
+from app.api.v1 import auth_api
+from app.api.v1.auth_api import create_user_token, get_current_user, get_current_user_vip
+from app.models.user import CombineUser, User
+from app.services.user_cache_service import user_cache_service
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class FakeSession:
+    """记录查询次数和会话是否已关闭"""
+
+    def __init__(self, value=None):
+        self.value = value
+        self.info = {}
+        self.queries = 0
+        self.closed = False
+
+    async def execute(self, *args, **kwargs):
+        self.queries += 1
+        return FakeResult(self.value)
+
+
+class TestAuthDependencies(unittest.TestCase):
+    def setUp(self):
+        user_cache_service.clear()
+        self.sessions = []
+        self.original_read_session = auth_api.read_session
+
+        @asynccontextmanager
+        async def read_session():
+            session = FakeSession(self.row)
+            self.sessions.append(session)
+            try:
+                yield session
+            finally:
+                session.closed = True
+
+        self.row = None
+        auth_api.read_session = read_session
+        self.request = Request({"type": "http", "headers": []})
+        self.combine_user = CombineUser(
+            id=7, wechat_openid="openid-7", is_active=True, is_super_admin=False, is_vip=True,
+            vip_expire_date=datetime.datetime.now() + datetime.timedelta(days=30), token_version=4,
+        )
+
+    def tearDown(self):
+        auth_api.read_session = self.original_read_session
+        user_cache_service.clear()
+
+    def test_claims_with_cached_token_version(self):
+        """测试缓存了token_version时，携带VIP声明的令牌不查询数据库"""
+        token = create_user_token(7, self.combine_user)
+        user_cache_service.put_token_version(7, 4)
+        combine_user = asyncio.run(get_current_user_vip(self.request, token))
+        self.assertEqual((combine_user.id, combine_user.token_version), (7, 4))
+        self.assertEqual(sum(session.queries for session in self.sessions), 0)
+
+    def test_session_closed_before_handler(self):
+        """测试缓存未命中时查询用的会话在依赖返回前已关闭"""
+        self.row = 4
+        token = create_user_token(7, self.combine_user)
+        combine_user = asyncio.run(get_current_user_vip(self.request, token))
+        self.assertEqual(combine_user.id, 7)
+        self.assertEqual(user_cache_service.get_token_version(7), 4)
+        self.assertEqual([(session.queries, session.closed) for session in self.sessions], [(1, True)])
+
+        self.row = User(id=8, wechat_openid="openid-8", is_active=True)
+        user = asyncio.run(get_current_user(self.request, create_user_token(8)))
+        self.assertEqual(user.id, 8)
+        self.assertEqual([(session.queries, session.closed) for session in self.sessions[1:]], [(1, True)])
+
+
+if __name__ == '__main__':
+    unittest.main()
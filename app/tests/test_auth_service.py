@@ -0,0 +1,58 @@
+import datetime
+import unittest
+
+from app.core.config import settings
+from app.models.user import CombineUser
+from app.models.vip import VipLevel
+from app.services.auth_service import AuthService
+
+
+class TestAuthService(unittest.TestCase):
+    def setUp(self):
+        self.auth_service = AuthService()
+        self.combine_user = CombineUser(
+            id=5,
+            wechat_openid="openid-5",
+            is_active=True,
+            is_super_admin=False,
+            is_vip=True,
+            vip_start_date=datetime.datetime.now(),
+            vip_expire_date=datetime.datetime.now() + datetime.timedelta(days=30),
+            vip_id=3,
+            vip_level=VipLevel.HALF_YEAR,
+            order_id=9,
+            token_version=2,
+        )
+
+    def _payload(self):
+        token = self.auth_service.create_access_token(
+            {"sub": "5"}, datetime.timedelta(minutes=5), combine_user=self.combine_user
+        )
+        return self.auth_service.verify_token(token)
+
+    def test_vip_claims_round_trip(self):
+        """测试从令牌VIP声明还原用户"""
+        combine_user = self.auth_service.combine_user_from_claims(self._payload(), 2)
+        self.assertIsNotNone(combine_user)
+        self.assertEqual(combine_user.id, 5)
+        self.assertEqual(combine_user.vip_level, VipLevel.HALF_YEAR)
+        self.assertEqual(combine_user.order_id, 9)
+
+    def test_vip_claims_rejected(self):
+        """测试吊销纪元变化、token_version递增或VIP过期时不使用令牌声明"""
+        payload = self._payload()
+        original_epoch = settings.TOKEN_REVOCATION_EPOCH
+        settings.TOKEN_REVOCATION_EPOCH = original_epoch + 1
+        try:
+            self.assertIsNone(self.auth_service.combine_user_from_claims(payload, 2))
+        finally:
+            settings.TOKEN_REVOCATION_EPOCH = original_epoch
+
+        self.assertIsNone(self.auth_service.combine_user_from_claims(payload, 3))
+
+        self.combine_user.vip_expire_date = datetime.datetime.now() - datetime.timedelta(days=1)
+        self.assertIsNone(self.auth_service.combine_user_from_claims(self._payload(), 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
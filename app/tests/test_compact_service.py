@@ -0,0 +1,88 @@
+import datetime
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import rhythm_api
+from app.api.v1.auth_api import get_current_user_vip, get_db
+from app.api.v1.schemas.response.pitch_response import MelodyNotePitch, MelodyMeasurePitch, MelodyScorePitch, \
+    MelodyQuestionResponse, PitchResponse, RhythmNote, RhythmMeasure
+from app.models.rhythm_settings import RhythmDifficulty, TimeSignature
+from app.models.user import CombineUser
+from app.models.vip import VipLevel
+from app.services.compact_service import CompactFormatService, TICKS_PER_QUARTER, FLAG_REST, FLAG_DOTTED, \
+    COMPACT_MEDIA_TYPE
+
+
+class TestCompactFormatService(unittest.TestCase):
+    def setUp(self):
+        self.service = CompactFormatService()
+
+    def _melody(self, pitch_numbers, is_correct=False):
+        notes = [
+            MelodyNotePitch(duration=1.0, pitch=PitchResponse(id=n, pitch_number=n, name=str(n)))
+            for n in pitch_numbers
+        ]
+        return MelodyScorePitch(
+            measures=[[MelodyMeasurePitch(notes=notes[:2]), MelodyMeasurePitch(notes=notes[2:])]],
+            time_signature=TimeSignature.TWO_FOUR,
+            tempo=80,
+            is_correct=is_correct,
+        )
+
+    def test_encode_rhythm_measure(self):
+        """测试节奏小节编码为tick和标记位"""
+        measure = RhythmMeasure(notes=[
+            RhythmNote(duration=1.5, is_dotted=True),
+            RhythmNote(duration=0.5, is_rest=True),
+        ])
+        encoded = self.service.encode_rhythm_measure(measure)
+        self.assertEqual(encoded, [
+            [int(1.5 * TICKS_PER_QUARTER), FLAG_DOTTED],
+            [TICKS_PER_QUARTER // 2, FLAG_REST],
+        ])
+
+    def test_encode_melody_question_diff(self):
+        """测试旋律题目的选项只发送差异小节"""
+        correct = self._melody([40, 42, 44, 45], is_correct=True)
+        wrong = self._melody([40, 42, 44, 47])
+        response = MelodyQuestionResponse(
+            correct_answer="A",
+            options=[correct, wrong],
+            tempo=80,
+            time_signature=TimeSignature.TWO_FOUR,
+            measures_count=4,
+            difficulty=RhythmDifficulty.LOW,
+        )
+        encoded = self.service.encode_melody_question(response)
+        self.assertEqual(encoded["answer"]["measures"][0][0][0], [40, TICKS_PER_QUARTER, 0])
+        self.assertEqual(encoded["options"][0], {"diff": []})
+        self.assertEqual(encoded["options"][1]["diff"], [[0, 1, [[44, TICKS_PER_QUARTER, 0], [47, TICKS_PER_QUARTER, 0]]]])
+
+    def test_diff_structure_mismatch(self):
+        """测试结构不一致时返回None"""
+        self.assertIsNone(self.service.diff_measures([[[]]], [[[], []]]))
+
+    def test_vary_accept(self):
+        """测试按Accept协商格式的接口，默认JSON和紧凑格式响应都带 Vary: Accept"""
+        app = FastAPI()
+        app.include_router(rhythm_api.router)
+        app.dependency_overrides[get_current_user_vip] = lambda: CombineUser(
+            id=1, wechat_openid="openid-1", is_active=True, is_super_admin=False, vip_level=VipLevel.ONE_YEAR,
+            vip_expire_date=datetime.datetime.now() + datetime.timedelta(days=30))
+        app.dependency_overrides[get_db] = lambda: None
+        client = TestClient(app)
+        body = {"difficulty": "low", "time_signature": "2/4", "measures_count": 4, "tempo": 80}
+
+        response = client.post("/rhythm/generate", json=body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/json")
+        self.assertEqual(response.headers["vary"], "Accept")
+        response = client.post("/rhythm/generate", json=body, headers={"Accept": COMPACT_MEDIA_TYPE})
+        self.assertEqual(response.headers["content-type"], COMPACT_MEDIA_TYPE)
+        self.assertEqual(response.headers["vary"], "Accept")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import Column, Integer, String, insert, select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+from app.db.database import TrackedSession, has_writes
+from app.db.engine import create_engine, pool_metrics
+
+TestBase = declarative_base()
+
+
+class Item(TestBase):
+    __tablename__ = "item"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+class TestDatabaseSession(unittest.TestCase):
+    def test_write_tracking_and_lazy_checkout(self):
+        """测试只读查询不标记写操作、未执行语句时不签出连接，以及只读会话禁止flush"""
+        async def run(path):
+            engine = create_engine(f"sqlite+aiosqlite:///{path}", name="session-test")
+            async with engine.begin() as conn:
+                await conn.run_sync(TestBase.metadata.create_all)
+            Session = sessionmaker(engine, class_=AsyncSession, sync_session_class=TrackedSession,
+                                   expire_on_commit=False)
+            try:
+                checkouts = pool_metrics["session-test"].checkouts
+                async with Session() as session:
+                    self.assertFalse(has_writes(session))
+                self.assertEqual(pool_metrics["session-test"].checkouts, checkouts)
+
+                async with Session() as session:
+                    await session.execute(select(Item))
+                    self.assertFalse(has_writes(session))
+                    await session.execute(insert(Item).values(name="a"))
+                    self.assertTrue(has_writes(session))
+                    await session.commit()
+                    self.assertFalse(has_writes(session))
+
+                async with Session(info={"read_only": True}) as session:
+                    session.add(Item(name="b"))
+                    with self.assertRaises(InvalidRequestError):
+                        await session.flush()
+            finally:
+                await engine.dispose()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            asyncio.run(run(os.path.join(tmp_dir, "test.db")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.engine import create_engine, pool_limits, pool_metrics, InstrumentedAsyncQueuePool
+
+
+class TestDbEngine(unittest.TestCase):
+    def setUp(self):
+        self.original = (settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.DB_MAX_CONNECTIONS,
+                         settings.WEB_CONCURRENCY)
+
+    def tearDown(self):
+        settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.DB_MAX_CONNECTIONS, \
+            settings.WEB_CONCURRENCY = self.original
+
+    def test_pool_limits_split_across_workers(self):
+        """测试总连接数按worker数量平分"""
+        settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW = 20, 10
+        settings.DB_MAX_CONNECTIONS = 0
+        self.assertEqual(pool_limits(), (20, 10))
+
+        settings.DB_MAX_CONNECTIONS, settings.WEB_CONCURRENCY = 100, 4
+        self.assertEqual(pool_limits(), (20, 5))
+
+        settings.WEB_CONCURRENCY = 10
+        self.assertEqual(pool_limits(), (10, 0))
+
+    def test_pool_metrics(self):
+        """测试使用配置的连接池并记录签出和等待指标"""
+        settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW = 2, 1
+
+        async def run(path):
+            engine = create_engine(f"sqlite+aiosqlite:///{path}", name="test")
+            try:
+                for _ in range(3):
+                    async with engine.connect() as conn:
+                        await conn.execute(text("SELECT 1"))
+                return engine.sync_engine.pool
+            finally:
+                await engine.dispose()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pool = asyncio.run(run(os.path.join(tmp_dir, "test.db")))
+            self.assertIsInstance(pool, InstrumentedAsyncQueuePool)
+            snapshot = pool_metrics["test"].snapshot()
+            self.assertEqual(snapshot["checkouts"], 3)
+            self.assertEqual(snapshot["connects"], 1)
+            self.assertEqual(snapshot["checked_out"], 0)
+            self.assertEqual(snapshot["pool_size"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
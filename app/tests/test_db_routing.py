@@ -0,0 +1,95 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import Column, Integer, String, select
+from sqlalchemy.orm import declarative_base
+
+from app.core.config import settings
+from app.db import database
+from app.db.engine import create_engine
+from app.db.routing import read_your_writes, retry_on_primary, replica_lag_tracker
+
+TestBase = declarative_base()
+
+
+class Account(TestBase):
+    __tablename__ = "account"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+class TestDbRouting(unittest.TestCase):
+    """用两个SQLite文件代替主库和只读副本，副本中缺少刚写入主库的数据"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original = (database.engine, database.replica_engine)
+
+    def tearDown(self):
+        database.engine, database.replica_engine = self.original
+        self.tmp_dir.cleanup()
+
+    def _run(self, check):
+        async def run():
+            primary = create_engine(f"sqlite+aiosqlite:///{os.path.join(self.tmp_dir.name, 'primary.db')}", name="rt-primary")
+            replica = create_engine(f"sqlite+aiosqlite:///{os.path.join(self.tmp_dir.name, 'replica.db')}", name="rt-replica")
+            for e in (primary, replica):
+                async with e.begin() as conn:
+                    await conn.run_sync(TestBase.metadata.create_all)
+            async with primary.begin() as conn:
+                await conn.execute(Account.__table__.insert().values(id=1, name="primary"))
+            database.engine, database.replica_engine = primary, replica
+            try:
+                async with database.ReadSessionLocal() as session:
+                    await check(session)
+            finally:
+                await primary.dispose()
+                await replica.dispose()
+
+        asyncio.run(run())
+
+    def test_retry_on_primary(self):
+        """测试副本查不到时，只有用户刚写入或副本有延迟才切换到主库重查"""
+        async def check(session):
+            query = select(Account).where(Account.id == 1)
+            self.assertIsNone((await session.execute(query)).scalar_one_or_none())
+            # 副本没有延迟：查不到就是没有
+            self.assertFalse(await retry_on_primary(session, 101))
+            replica_lag_tracker._replica_lag = settings.DB_REPLICA_RETRY_LAG_SECONDS + 1
+            replica_lag_tracker._lag_checked_at = time.monotonic()
+            try:
+                self.assertTrue(await retry_on_primary(session, 101))
+            finally:
+                replica_lag_tracker._replica_lag, replica_lag_tracker._lag_checked_at = 0.0, None
+            self.assertEqual((await session.execute(query)).scalar_one().name, "primary")
+            self.assertFalse(await retry_on_primary(session, 101))
+
+            # 用户刚写入过（其他会话未走主库时）同样回主库
+            session.info.pop("use_primary")
+            replica_lag_tracker.mark_written(101)
+            self.assertTrue(await retry_on_primary(session, 101))
+
+        self._run(check)
+
+    def test_read_your_writes(self):
+        """测试用户刚写入后其只读查询直接走主库"""
+        async def check(session):
+            replica_lag_tracker.mark_written(1)
+            read_your_writes(session, 1)
+            result = await session.execute(select(Account).where(Account.id == 1))
+            self.assertEqual(result.scalar_one().name, "primary")
+
+        self._run(check)
+        original = settings.DB_REPLICA_LAG_SECONDS
+        settings.DB_REPLICA_LAG_SECONDS = 0
+        try:
+            self.assertFalse(replica_lag_tracker.is_recent(1))
+        finally:
+            settings.DB_REPLICA_LAG_SECONDS = original
+
+
+if __name__ == '__main__':
+    unittest.main()
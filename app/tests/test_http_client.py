@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core.config import settings
+from app.core.http_client import HttpClient, CircuitBreaker, CircuitOpenError
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """本地桩服务：/flaky 前两次返回503，/down 总是返回500，其余返回200"""
+    counts = {}
+
+    def do_GET(self):
+        count = self.counts.get(self.path, 0) + 1
+        self.counts[self.path] = count
+        if self.path == "/flaky" and count <= 2:
+            status = 503
+        elif self.path == "/down":
+            status = 500
+        else:
+            status = 200
+        body = json.dumps({"path": self.path, "count": count}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        StubHandler.counts.clear()
+        self.original_backoff = settings.HTTP_RETRY_BACKOFF_BASE
+        settings.HTTP_RETRY_BACKOFF_BASE = 0.0
+
+    def tearDown(self):
+        settings.HTTP_RETRY_BACKOFF_BASE = self.original_backoff
+
+    def test_retry_until_success(self):
+        """测试5xx时重试直到成功"""
+        async def run():
+            client = HttpClient()
+            try:
+                return await client.get("stub", f"{self.base_url}/flaky", retries=2)
+            finally:
+                await client.close()
+
+        response = asyncio.run(run())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 3)
+
+    def test_circuit_opens_after_failures(self):
+        """测试连续失败后熔断，不再请求上游"""
+        async def run():
+            client = HttpClient()
+            try:
+                for _ in range(settings.HTTP_CIRCUIT_FAILURE_THRESHOLD):
+                    await client.get("stub", f"{self.base_url}/down", retries=0)
+                with self.assertRaises(CircuitOpenError):
+                    await client.get("stub", f"{self.base_url}/down", retries=0)
+            finally:
+                await client.close()
+
+        asyncio.run(run())
+        self.assertEqual(StubHandler.counts["/down"], settings.HTTP_CIRCUIT_FAILURE_THRESHOLD)
+
+    def test_half_open_single_probe(self):
+        """测试半开状态只放行一个试探请求，试探结束前其余请求被拒绝"""
+        breaker = CircuitBreaker("probe", failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+
+        breaker.opened_at -= 30
+        breaker.before_request()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        breaker.opened_at -= 30
+        breaker.before_request()
+        # 试探请求迟迟没有结果时放行下一个试探
+        breaker.probe_started_at -= 30
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.before_request()
+        breaker.before_request()
+
+
+if __name__ == '__main__':
+    unittest.main()
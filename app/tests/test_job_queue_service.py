@@ -0,0 +1,174 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.engine import create_engine
+from app.models.job import Job, JobStatus
+from app.models.order import VipOrder
+from app.models.user import User
+from app.models.vip import Vip, VipLevel
+from app.services.job_queue_service import JobQueueService
+from app.services.order_service import OrderService, PAYMENT_NOTIFY_QUEUE
+from app.services.vip_service import vip_service
+
+
+class TestJobQueueService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.queue = JobQueueService()
+        self._old_handlers = dict(self.queue._handlers)
+        self._old_backoff = settings.JOB_RETRY_BACKOFF_BASE
+        settings.JOB_RETRY_BACKOFF_BASE = 0
+
+    def tearDown(self):
+        self.queue._handlers.clear()
+        self.queue._handlers.update(self._old_handlers)
+        self.queue._wakeup = None
+        settings.JOB_RETRY_BACKOFF_BASE = self._old_backoff
+        self.tmp_dir.cleanup()
+
+    def _run(self, check):
+        async def run():
+            engine = create_engine(f"sqlite+aiosqlite:///{os.path.join(self.tmp_dir.name, 'jobs.db')}", name="jobs")
+            async with engine.begin() as conn:
+                await conn.run_sync(Job.__table__.create)
+                await conn.run_sync(VipOrder.__table__.create)
+                await conn.run_sync(User.__table__.create)
+            Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            try:
+                await check(Session)
+            finally:
+                await engine.dispose()
+
+        asyncio.run(run())
+
+    def test_retry_then_dead_letter(self):
+        """测试失败任务重试，超过最大次数后进入死信"""
+        calls = []
+
+        async def handler(db, payload):
+            calls.append(payload["n"])
+            raise RuntimeError("boom")
+
+        self.queue.register("test", handler)
+
+        async def check(Session):
+            async with Session() as db:
+                await self.queue.enqueue(db, "test", {"n": 1}, max_attempts=3)
+            while await self.queue.run_once(Session, "test"):
+                pass
+            async with Session() as db:
+                job = (await db.execute(select(Job))).scalar_one()
+            self.assertEqual(calls, [1, 1, 1])
+            self.assertEqual(job.status, JobStatus.DEAD)
+            self.assertEqual(job.attempts, 3)
+            self.assertIn("boom", job.last_error)
+
+        self._run(check)
+
+    def test_dedup_key(self):
+        """测试相同去重键只入队一次"""
+        async def check(Session):
+            async with Session() as db:
+                for _ in range(3):
+                    await self.queue.enqueue(db, "test", {"n": 1}, dedup_key="k")
+                await self.queue.enqueue(db, "test", {"n": 2}, dedup_key="other")
+                self.assertEqual(await self.queue.stats(db, "test"), {JobStatus.PENDING: 2})
+
+        self._run(check)
+
+    def test_enqueue_after_dead_letter(self):
+        """测试死信任务的去重键再次入队时重新排队，而不是被忽略"""
+        calls = []
+
+        async def handler(db, payload):
+            calls.append(payload["n"])
+            if payload["n"] == 1:
+                raise RuntimeError("boom")
+
+        self.queue.register("test", handler)
+
+        async def check(Session):
+            async with Session() as db:
+                await self.queue.enqueue(db, "test", {"n": 1}, dedup_key="k", max_attempts=1)
+            while await self.queue.run_once(Session, "test"):
+                pass
+            async with Session() as db:
+                self.assertEqual(await self.queue.stats(db, "test"), {JobStatus.DEAD: 1})
+                await self.queue.enqueue(db, "test", {"n": 2}, dedup_key="k", max_attempts=1)
+            while await self.queue.run_once(Session, "test"):
+                pass
+            async with Session() as db:
+                job = (await db.execute(select(Job))).scalar_one()
+                # 已完成的任务仍按去重键忽略
+                await self.queue.enqueue(db, "test", {"n": 3}, dedup_key="k")
+                self.assertEqual(await self.queue.stats(db, "test"), {JobStatus.DONE: 1})
+            self.assertEqual(calls, [1, 2])
+            self.assertEqual((job.status, job.attempts, job.last_error), (JobStatus.DONE, 1, None))
+
+        self._run(check)
+
+    def test_burst_payment_notifications(self):
+        """负载测试：突发的支付回调（含微信重复推送）全部入队后由多个worker结算，每个订单只结算一次"""
+        order_service = OrderService()
+        self.queue.register(PAYMENT_NOTIFY_QUEUE, order_service.process_payment_job)
+        vip_service._vip_cache[1] = Vip(id=1, level=VipLevel.ONE_YEAR, name="year")
+        orders = 200
+
+        async def check(Session):
+            async with Session() as db:
+                for i in range(1, orders + 1):
+                    db.add(User(id=i, wechat_openid=f"openid-{i}", is_vip=False))
+                    db.add(VipOrder(id=i, trade_no=10000 + i, user_id=i, vip_id=1, is_paid=False, is_return=False))
+                await db.commit()
+
+            async def notify(i):
+                async with Session() as db:
+                    await self.queue.enqueue(
+                        db, PAYMENT_NOTIFY_QUEUE,
+                        {"trade_no": 10000 + i, "payment_success": True, "trade_state": "SUCCESS"},
+                        dedup_key=f"{10000 + i}:SUCCESS",
+                    )
+
+            # 每个通知推送两次，模拟微信重试
+            start = time.perf_counter()
+            await asyncio.gather(*(notify(i) for i in list(range(1, orders + 1)) * 2))
+            enqueue_seconds = time.perf_counter() - start
+
+            workers = self.queue.start(Session, concurrency=4)
+            try:
+                for _ in range(600):
+                    async with Session() as db:
+                        stats = await self.queue.stats(db, PAYMENT_NOTIFY_QUEUE)
+                    if stats == {JobStatus.DONE: orders}:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+            self.assertEqual(stats, {JobStatus.DONE: orders})
+            async with Session() as db:
+                paid = (await db.execute(select(VipOrder).where(VipOrder.is_paid.is_(True)))).scalars().all()
+                attempts = (await db.execute(select(Job.attempts))).scalars().all()
+            self.assertEqual(len(paid), orders)
+            self.assertEqual(set(attempts), {1})
+            # 入队只是一次插入，远快于结算
+            self.assertLess(enqueue_seconds, 30)
+
+        try:
+            self._run(check)
+        finally:
+            vip_service._vip_cache.pop(1, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
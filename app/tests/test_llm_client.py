@@ -0,0 +1,136 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core.config import settings
+from app.core.http_client import http_client
+from app.services.llm_client import LLMClient, LLMRateLimitError, StreamingJsonArrayParser
+
+MELODY_JSON = '```json\n{"measures": [[{"notes": [{"duration": 1, "pitch": "C4"}]}], ' \
+              '[{"notes": [{"duration": 0.5, "pitch": "D4"}, {"duration": 0.5, "pitch": "E\\"4"}]}], ' \
+              '[{"notes": [{"duration": 1, "pitch": "G4"}]}]]}\n```'
+
+
+class SSEHandler(BaseHTTPRequestHandler):
+    """本地假DeepSeek服务：把MELODY_JSON按几个字符一段以SSE流式返回"""
+    requests = 0
+
+    def do_POST(self):
+        type(self).requests += 1
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length))
+        if self.path.endswith("/error"):
+            self.send_response(500)
+            self.send_header("Content-Length", "5")
+            self.end_headers()
+            self.wfile.write(b"error")
+            return
+        assert body["stream"] is True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(0, len(MELODY_JSON), 7):
+            chunk = {"choices": [{"delta": {"content": MELODY_JSON[i:i + 7]}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestStreamingJsonArrayParser(unittest.TestCase):
+    def test_feed_in_small_chunks(self):
+        """测试逐字符输入时每个小节完整后立即返回"""
+        parser = StreamingJsonArrayParser("measures")
+        elements = []
+        for ch in MELODY_JSON:
+            elements.extend(parser.feed(ch))
+        self.assertTrue(parser.done)
+        self.assertEqual(len(elements), 3)
+        self.assertEqual(elements[1][0]["notes"][1]["pitch"], 'E"4')
+
+
+class TestLLMClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SSEHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        SSEHandler.requests = 0
+        self.client = LLMClient()
+        self.client.api_url = f"http://127.0.0.1:{self.server.server_port}/chat/completions"
+
+    def test_stream_chat(self):
+        """测试从本地SSE服务流式读取并增量解析小节"""
+        async def run():
+            parser = StreamingJsonArrayParser("measures")
+            measures = []
+            try:
+                async for chunk in self.client.stream_chat("prompt"):
+                    measures.extend(parser.feed(chunk))
+            finally:
+                await http_client.close()
+            return measures
+
+        measures = asyncio.run(run())
+        self.assertEqual([m[0]["notes"][0]["pitch"] for m in measures], ["C4", "D4", "G4"])
+
+    def test_stream_chat_failure_recorded_once(self):
+        """测试上游返回错误时熔断器只记一次失败"""
+        self.client.api_url = f"http://127.0.0.1:{self.server.server_port}/chat/error"
+        breaker = http_client.breaker("deepseek")
+        failures = breaker.failures
+
+        async def run():
+            try:
+                async for _ in self.client.stream_chat("prompt"):
+                    pass
+            finally:
+                await http_client.close()
+
+        with self.assertRaises(Exception):
+            asyncio.run(run())
+        self.assertEqual(breaker.failures, failures + 1)
+        breaker.record_success()
+
+    def test_run_deduplicated(self):
+        """测试相同key的并发请求只调用一次上游"""
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "melody"
+
+        async def run():
+            return await asyncio.gather(*[self.client.run_deduplicated("key", factory) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(run()), ["melody"] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_rate_limit(self):
+        """测试每个用户每分钟的请求次数限制"""
+        for _ in range(settings.DEEPSEEK_USER_RATE_PER_MINUTE):
+            self.client.check_rate_limit(1)
+        with self.assertRaises(LLMRateLimitError):
+            self.client.check_rate_limit(1)
+        self.client.check_rate_limit(2)
+
+        # 窗口过期的用户在下次清理时移除
+        self.client._user_requests[1] = deque([time.monotonic() - 61])
+        self.client._last_sweep -= 60
+        self.client.check_rate_limit(3)
+        self.assertEqual(set(self.client._user_requests), {2, 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import io
+import unittest
+
+import numpy as np
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import melody_api
+from app.api.v1.auth_api import get_current_user
+from app.api.v1.schemas.response.pitch_response import MelodyScorePitch
+from app.core.config import settings
+from app.services.audio_processing import audio_processor
+from app.services.melody_assessment_service import melody_assessment_service, read_audio
+
+TEMPO = 90
+PITCHES = [40, 42, 44, 45, 47, 45, 44, 40]
+DURATIONS = [1, 1, 1, 1, 2, 1, 1, 2]
+
+
+def make_score(pitches, durations, tempo=TEMPO) -> MelodyScorePitch:
+    notes = [{"duration": d, "pitch": {"id": p, "pitch_number": p, "name": str(p)}} for p, d in zip(pitches, durations)]
+    return MelodyScorePitch.model_validate(
+        {"measures": [[{"notes": notes}]], "time_signature": "4/4", "tempo": tempo, "is_correct": True})
+
+
+def sing(pitches, durations, tempo=TEMPO, sample_rate=22050, shift=0, cents=None, delays=None, skip=(), lead=0.5):
+    """合成带颤音和谐波的演唱，可指定整体移调、个别音的音分偏差、延迟和漏唱"""
+    beat = 60.0 / tempo
+    out = np.zeros(int((lead + sum(durations) * beat + 1) * sample_rate), dtype=np.float32)
+    start = lead
+    for k, (pitch, duration) in enumerate(zip(pitches, durations)):
+        if k not in skip:
+            frequency = 440 * 2 ** ((pitch + 20 + shift - 69) / 12 + (cents or {}).get(k, 0) / 1200)
+            n = int((duration * beat - 0.06) * sample_rate)
+            t = np.arange(n) / sample_rate
+            phase = 2 * np.pi * np.cumsum(frequency * (1 + 0.003 * np.sin(2 * np.pi * 5.5 * t))) / sample_rate
+            envelope = np.minimum(1, t / 0.02) * np.minimum(1, (n / sample_rate - t) / 0.03)
+            tone = (np.sin(phase) + 0.4 * np.sin(2 * phase) + 0.2 * np.sin(3 * phase)) * envelope * 0.3
+            offset = int((start + (delays or {}).get(k, 0)) * sample_rate)
+            out[offset:offset + n] += tone
+        start += duration * beat
+    return out + np.random.default_rng(0).normal(0, 0.003, len(out)).astype(np.float32)
+
+
+def to_wav(y, sample_rate=22050) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sample_rate, format="WAV")
+    return buffer.getvalue()
+
+
+class TestMelodyAssessmentService(unittest.TestCase):
+    def setUp(self):
+        self.score = make_score(PITCHES, DURATIONS)
+
+    def assess(self, y, sample_rate=22050):
+        return melody_assessment_service.assess(melody_assessment_service.resample(y, sample_rate), self.score)
+
+    def test_accurate_singing(self):
+        """测试准确演唱时全部音判为正确"""
+        result = self.assess(sing(PITCHES, DURATIONS))
+        self.assertEqual(result.score, 100)
+        self.assertEqual((result.missed_notes, result.extra_notes, result.octave_shift), (0, 0, 0))
+        self.assertLess(result.mean_abs_cents, 15)
+        self.assertAlmostEqual(result.notes[0].sung_onset, 0.5, delta=0.05)
+
+    def test_pitch_and_timing_errors(self):
+        """测试音分偏差、晚唱按音定位，整体低八度不计为错误"""
+        result = self.assess(sing(PITCHES, DURATIONS, shift=-12, cents={2: 80}, delays={7: 0.25}))
+        self.assertEqual(result.octave_shift, -1)
+        self.assertAlmostEqual(result.notes[2].cents_error, 80, delta=15)
+        self.assertFalse(result.notes[2].pitch_correct)
+        self.assertAlmostEqual(result.notes[7].timing_error, 0.25, delta=0.05)
+        self.assertFalse(result.notes[7].timing_correct)
+        self.assertEqual(sum(note.pitch_correct for note in result.notes), len(PITCHES) - 1)
+        self.assertEqual(sum(note.timing_correct for note in result.notes), len(PITCHES) - 1)
+
+    def test_missed_note(self):
+        """测试漏唱的音不与相邻音错配"""
+        result = self.assess(sing(PITCHES, DURATIONS, skip={3}))
+        self.assertEqual(result.missed_notes, 1)
+        self.assertIsNone(result.notes[3].sung_onset)
+        self.assertTrue(all(note.pitch_correct for k, note in enumerate(result.notes) if k != 3))
+
+    def test_decode(self):
+        """测试解码立体声WAV，非音频内容报错"""
+        y = sing(PITCHES[:2], DURATIONS[:2], sample_rate=44100)
+        audio = melody_assessment_service.decode(io.BytesIO(to_wav(np.stack([y, y], axis=1), 44100)))
+        self.assertAlmostEqual(len(audio), len(y) * melody_assessment_service.sample_rate / 44100, delta=1)
+        with self.assertRaises(ValueError):
+            melody_assessment_service.decode(io.BytesIO(b"not audio"))
+
+    def test_read_audio_duration_limit(self):
+        """测试超长录音在解码前按文件头时长拒绝：几十KB的FLAC可以包含一小时的静音"""
+        buffer = io.BytesIO()
+        sf.write(buffer, np.zeros(8000 * 3600, dtype=np.float32), 8000, format="FLAC")
+        self.assertLess(buffer.tell(), 1024 * 1024)
+        buffer.seek(0)
+        with self.assertRaisesRegex(ValueError, "too long"):
+            read_audio(buffer, 11025, 60)
+        buffer.seek(0)
+        self.assertEqual(len(read_audio(buffer, 8000, 3600)), 8000 * 3600)
+
+    def test_upload(self):
+        """测试以 multipart 上传旋律和录音评分；旋律无效或缺少录音返回400，超过大小限制（包括分块上传）返回413"""
+        app = FastAPI()
+        app.include_router(melody_api.router)
+        app.dependency_overrides[get_current_user] = lambda: None
+        client = TestClient(app)
+        wav = to_wav(sing(PITCHES, DURATIONS))
+
+        response = client.post("/melody/assess", data={"score": self.score.model_dump_json()},
+                               files={"file": ("take.wav", wav, "audio/wav")})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["score"], 100)
+
+        response = client.post("/melody/assess", data={"score": '{"measures": []}'},
+                               files={"file": ("take.wav", wav, "audio/wav")})
+        self.assertEqual(response.status_code, 400)
+        response = client.post("/melody/assess", data={"score": self.score.model_dump_json()})
+        self.assertEqual(response.status_code, 400)
+        response = client.post("/melody/assess", data={"score": self.score.model_dump_json()},
+                               files={"file": ("take.wav", b"not audio", "audio/wav")})
+        self.assertEqual(response.status_code, 400)
+
+        original = settings.MELODY_ASSESS_MAX_UPLOAD_BYTES
+        settings.MELODY_ASSESS_MAX_UPLOAD_BYTES = len(wav) // 2
+        try:
+            response = client.post("/melody/assess", data={"score": self.score.model_dump_json()},
+                                   files={"file": ("take.wav", wav, "audio/wav")})
+            self.assertEqual(response.status_code, 413)
+            chunks = (wav[i:i + 4096] for i in range(0, len(wav), 4096))
+            response = client.post("/melody/assess", content=chunks,
+                                   headers={"content-type": "multipart/form-data; boundary=b"})
+            self.assertEqual(response.status_code, 413)
+        finally:
+            settings.MELODY_ASSESS_MAX_UPLOAD_BYTES = original
+
+    def test_analyze_melody(self):
+        """测试 AudioProcessor.analyze_melody 按音对齐（原实现只比较了第一个音），没有对齐的音时音分偏差为NaN"""
+        pitches = PITCHES[:4]
+        y = sing(pitches, [1] * 4, sample_rate=audio_processor.sample_rate, cents={1: 40})
+        cents, timing = audio_processor.analyze_melody(y, ["C4", "D4", "E4", "F4"])
+        self.assertAlmostEqual(cents, 10, delta=8)
+        self.assertEqual(timing, 100.0)
+
+        # 没有唱出任何音时不能返回表示完全准确的0
+        cents, timing = audio_processor.analyze_melody(np.zeros(audio_processor.sample_rate, dtype=np.float32), ["C4"])
+        self.assertTrue(np.isnan(cents))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from app.api.v1.schemas.request.pitch_request import MelodySettingRequest
+from app.api.v1.schemas.response.pitch_response import MelodyScorePitch, MelodyMeasurePitch, MelodyNotePitch, \
+    PitchResponse
+from app.core.config import settings
+from app.models.rhythm_settings import RhythmDifficulty, TimeSignature, MeasureCount, Tempo
+from app.services.melody_bank_service import MelodyBankService
+
+
+def make_melody(duration: float = 1.0) -> MelodyScorePitch:
+    pitch = PitchResponse(id=40, pitch_number=40, name="C4")
+    measure = [MelodyMeasurePitch(notes=[MelodyNotePitch(duration=duration, pitch=pitch),
+                                         MelodyNotePitch(duration=duration, pitch=pitch)])]
+    return MelodyScorePitch(
+        measures=[measure] * 4,
+        time_signature=TimeSignature.TWO_FOUR,
+        tempo=80,
+        is_correct=True
+    )
+
+
+class TestMelodyBankService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.bank = MelodyBankService()
+        # 单例，每个测试使用新的数据库文件
+        self.bank.close()
+        self.bank.path = os.path.join(self.tmp_dir.name, "melody_bank.sqlite3")
+        self.request = MelodySettingRequest(
+            difficulty=RhythmDifficulty.LOW,
+            time_signature=TimeSignature.TWO_FOUR,
+            measures_count=MeasureCount.FOUR,
+            tempo=Tempo.EIGHTY,
+        )
+
+    def tearDown(self):
+        self.bank.close()
+        self.tmp_dir.cleanup()
+
+    def test_put_and_take(self):
+        """测试存入后按请求参数取出，且冷桶返回None"""
+        self.assertIsNone(asyncio.run(self.bank.take(self.request)))
+        self.assertTrue(self.bank.put(self.request, make_melody()))
+        self.assertFalse(self.bank.put(self.request, make_melody(duration=0.5)))
+
+        fast_request = self.request.copy(update={"tempo": Tempo.HUNDRED})
+        melody = asyncio.run(self.bank.take(fast_request))
+        self.assertIsNotNone(melody)
+        self.assertEqual(melody.tempo, 100)
+        self.assertEqual(melody.measures[0][0].notes[0].pitch.name, "C4")
+        self.assertEqual(self.bank.size(self.request), 0)
+
+    def test_refill_and_persisted_take(self):
+        """测试后台补充到高水位，取出的旋律重新打开文件后不会再出现"""
+        calls = []
+
+        async def generate(request):
+            calls.append(request)
+            return make_melody()
+
+        self.bank.register(self.request)
+        added = asyncio.run(self.bank.refill(generate))
+        self.assertEqual(added, settings.MELODY_BANK_HIGH_WATERMARK)
+        self.assertEqual(len(calls), settings.MELODY_BANK_HIGH_WATERMARK)
+        # 已在高水位，再次补充不调用AI
+        self.assertEqual(asyncio.run(self.bank.refill(generate)), 0)
+
+        # 多个线程并发取出，每条旋律只被取走一次
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            taken = list(pool.map(lambda _: self.bank.pop(self.request), range(4)))
+        self.assertTrue(all(melody is not None for melody in taken))
+
+        self.bank.close()
+        self.assertEqual(self.bank.size(self.request), settings.MELODY_BANK_HIGH_WATERMARK - 4)
+
+    def test_refill_lease(self):
+        """测试其他进程持有桶的租约时不重复补充，租约过期后接手"""
+        calls = []
+
+        async def generate(request):
+            calls.append(request)
+            return make_melody()
+
+        self.bank.register(self.request)
+        self.bank.conn.execute("UPDATE melody_bank_bucket SET lease_owner = 'other', lease_until = ?",
+                               (time.time() + 60,))
+        self.bank.conn.commit()
+        self.assertEqual(asyncio.run(self.bank.refill(generate)), 0)
+        self.assertEqual(calls, [])
+
+        self.bank.conn.execute("UPDATE melody_bank_bucket SET lease_until = ?", (time.time() - 1,))
+        self.bank.conn.commit()
+        self.assertEqual(asyncio.run(self.bank.refill(generate)), settings.MELODY_BANK_HIGH_WATERMARK)
+        lease = self.bank.conn.execute("SELECT lease_owner, lease_until FROM melody_bank_bucket").fetchone()
+        self.assertEqual(lease, (None, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import librosa
+import numpy as np
+
+from app.core import music_math
+from app.utils.music_math_benchmark import legacy_hz_to_note, legacy_note_to_hz, run
+
+
+class TestMusicMath(unittest.TestCase):
+    def test_scalar_and_array(self):
+        """测试标量输入返回标量，数组输入保持形状"""
+        self.assertEqual(music_math.hz_to_note(261.63), "C4")
+        self.assertIsInstance(music_math.note_to_hz("A4"), float)
+        self.assertEqual(music_math.note_to_key("C8"), 88)
+        self.assertEqual(music_math.key_to_hz(49), 440.0)
+        notes = music_math.hz_to_note(np.array([[27.5, 4186.0], [440.0, 466.16]]))
+        self.assertEqual(notes.tolist(), [["A0", "C8"], ["A4", "A#4"]])
+        np.testing.assert_array_equal(music_math.note_to_key([["A0", "Bb0"], ["A#0", "c4"]]), [[1, 2], [2, 40]])
+
+    def test_matches_librosa(self):
+        """测试与librosa及原标量实现的结果一致"""
+        frequencies = np.geomspace(27.5, 4186.0, 2000)
+        np.testing.assert_allclose(music_math.hz_to_midi(frequencies), librosa.hz_to_midi(frequencies))
+        self.assertEqual(list(music_math.hz_to_note(frequencies)), [legacy_hz_to_note(f) for f in frequencies])
+        names = ["A0", "C#4", "Db4", "Cb4", "B#3", "E♭5", "G9"]
+        np.testing.assert_allclose(music_math.note_to_hz(names), librosa.note_to_hz(names))
+        self.assertEqual(music_math.note_to_hz("F#6"), legacy_note_to_hz("F#6"))
+
+    def test_nearest_key(self):
+        """测试最接近的键位和音分偏差，超出音域取边界键位"""
+        key, cents = music_math.nearest_key(445.0)
+        self.assertEqual(key, 49)
+        self.assertAlmostEqual(cents, 1200 * np.log2(445 / 440))
+        keys, cents = music_math.nearest_key(np.array([20.0, 5000.0, 0.0, 451.0]))
+        np.testing.assert_array_equal(keys, [1, 88, 1, 49])
+        self.assertTrue(np.isnan(cents[2]))
+        self.assertAlmostEqual(cents[3], 1200 * np.log2(451 / 440))
+
+    def test_invalid(self):
+        """测试无效频率和音名"""
+        self.assertEqual(music_math.hz_to_note(0), "")
+        self.assertEqual(music_math.hz_to_note(-5.0, unknown="Unknown"), "Unknown")
+        self.assertTrue(np.isnan(music_math.hz_to_midi(0.0)))
+        self.assertTrue(np.isnan(music_math.cents(440.0, 0.0)))
+        with self.assertRaises(ValueError):
+            music_math.note_to_hz("H4")
+        with self.assertRaises(ValueError):
+            music_math.note_to_midi(["C4", "X"])
+
+    def test_benchmark(self):
+        """测试性能对比脚本可运行且结果校验通过"""
+        results = run(count=200, repeat=1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(scalar > 0 and vectorized > 0 for _, scalar, vectorized in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import asyncio
+import base64
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import httpx
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.db.engine import create_engine
+from app.models.order import VipOrder
+from app.models.user import User
+from app.models.vip import Vip, VipLevel
+from app.core.snowflake import snowflake
+from app.core.wechatpay_crypto import WeChatPayCrypto, WeChatPayCryptoError
+from app.services import order_service as order_service_module
+from app.services.order_service import OrderService
+from app.services.vip_service import vip_service
+from app.tests.test_wechatpay_crypto import API_V3_KEY, write_key_and_cert
+
+
+class TestOrderService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.order_service = OrderService()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _run(self, check):
+        async def run():
+            engine = create_engine(f"sqlite+aiosqlite:///{os.path.join(self.tmp_dir.name, 'orders.db')}", name="orders")
+            async with engine.begin() as conn:
+                await conn.run_sync(VipOrder.__table__.create)
+                await conn.run_sync(User.__table__.create)
+            Session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            try:
+                async with Session() as db:
+                    base = datetime.datetime(2025, 1, 1)
+                    for i in range(1, 8):
+                        db.add(VipOrder(id=i, trade_no=1000 + i, user_id=1 if i != 7 else 2, vip_id=1,
+                                        is_paid=i % 2 == 0, is_return=False,
+                                        # 两条订单创建时间相同，验证按id打破平局
+                                        created_at=base + datetime.timedelta(minutes=min(i, 5))))
+                    await db.commit()
+                    await check(db)
+            finally:
+                await engine.dispose()
+
+        asyncio.run(run())
+
+    def test_keyset_pages(self):
+        """测试按 (created_at, id) 倒序翻页，不重复不遗漏"""
+        async def check(db):
+            ids, cursor, pages = [], None, 0
+            while True:
+                page = await self.order_service.query_vip_orders_page(db, {}, user_id=1, limit=2, cursor=cursor)
+                ids.extend(order["id"] for order in page["orders"])
+                pages += 1
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            self.assertEqual(ids, [6, 5, 4, 3, 2, 1])
+            self.assertEqual(pages, 3)
+            self.assertIsNone(page["total"])
+
+        self._run(check)
+
+    def test_projection_and_count(self):
+        """测试只返回指定列，并按需统计总数"""
+        async def check(db):
+            page = await self.order_service.query_vip_orders_page(
+                db, {"is_paid": True}, user_id=1, limit=10, fields=["trade_no"], with_count=True
+            )
+            self.assertEqual(page["total"], 3)
+            self.assertEqual(set(page["orders"][0]), {"trade_no", "created_at", "id"})
+            with self.assertRaises(ValueError):
+                await self.order_service.query_vip_orders_page(db, {}, user_id=1, limit=10, fields=["prepay_id; --"])
+            with self.assertRaises(ValueError):
+                await self.order_service.query_vip_orders_page(db, {}, user_id=1, limit=10, cursor="bad")
+
+        self._run(check)
+
+    def test_create_order_retries_duplicate_trade_no(self):
+        """测试生成的 trade_no 与已有订单冲突时换号重试"""
+        async def check(db):
+            with mock.patch.object(snowflake, "next_id", side_effect=[1001, 1002, 5001]):
+                order = await self.order_service.create_vip_order(db, User(id=1), VipOrder(vip_id=1, paid_amount=100))
+            self.assertEqual(order.trade_no, 5001)
+            with mock.patch.object(snowflake, "next_id", return_value=1001):
+                self.assertIsNone(
+                    await self.order_service.create_vip_order(db, User(id=1), VipOrder(vip_id=1, paid_amount=100)))
+
+        self._run(check)
+
+    def test_payment_settlement_idempotent(self):
+        """测试支付结算更新订单和用户VIP，重复通知不会再次延长VIP"""
+        vip_service._vip_cache[1] = Vip(id=1, level=VipLevel.ONE_YEAR, name="year")
+
+        async def check(db):
+            start = datetime.datetime(2025, 3, 1)
+            db.add(User(id=1, wechat_openid="openid-1", is_vip=False, vip_start_date=start))
+            await db.commit()
+
+            for _ in range(2):
+                self.assertTrue(await self.order_service.handle_payment_notification(db, trade_no=1003, payment_success=True))
+            self.assertFalse(await self.order_service.handle_payment_notification(db, trade_no=9999, payment_success=True))
+
+            db.expire_all()
+            order = (await db.execute(select(VipOrder).where(VipOrder.trade_no == 1003))).scalar_one()
+            user = (await db.execute(select(User).where(User.id == 1))).scalar_one()
+            self.assertTrue(order.is_paid)
+            self.assertIsNotNone(order.paid_date)
+            self.assertTrue(user.is_vip)
+            self.assertEqual(user.vip_expire_date, start + datetime.timedelta(days=365))
+            # 结算一次，已签发令牌中的VIP声明随之失效
+            self.assertEqual(user.token_version, 1)
+
+        try:
+            self._run(check)
+        finally:
+            vip_service._vip_cache.pop(1, None)
+
+    def test_load_platform_certificates(self):
+        """测试启动时下载并保存平台证书，下载失败且没有已有证书时中止启动"""
+        key_path = os.path.join(self.tmp_dir.name, "apiclient_key.pem")
+        write_key_and_cert(key_path, os.path.join(self.tmp_dir.name, "apiclient_cert.pem"), 0xABC)
+        write_key_and_cert(os.path.join(self.tmp_dir.name, "platform_key.pem"),
+                           os.path.join(self.tmp_dir.name, "platform_cert.pem"), 0x5157F0)
+        platform_dir = os.path.join(self.tmp_dir.name, "platform")
+        crypto = WeChatPayCrypto(key_path, os.path.join(self.tmp_dir.name, "apiclient_cert.pem"), platform_dir, API_V3_KEY)
+        with open(os.path.join(self.tmp_dir.name, "platform_cert.pem"), "rb") as f:
+            ciphertext = AESGCM(API_V3_KEY.encode()).encrypt(b"abcdefghijkl", f.read(), b"certificate")
+        data = {"data": [{"serial_no": "5157F0", "encrypt_certificate": {
+            "algorithm": "AEAD_AES_256_GCM", "nonce": "abcdefghijkl", "associated_data": "certificate",
+            "ciphertext": base64.b64encode(ciphertext).decode(),
+        }}]}
+
+        async def check():
+            with mock.patch.object(order_service_module, "wechatpay_crypto", crypto), \
+                    mock.patch.object(order_service_module.http_client, "get", side_effect=httpx.ConnectError("down")):
+                with self.assertRaises(WeChatPayCryptoError):
+                    await self.order_service.load_platform_certificates()
+            with mock.patch.object(order_service_module, "wechatpay_crypto", crypto), \
+                    mock.patch.object(order_service_module.http_client, "get",
+                                      return_value=httpx.Response(200, json=data)) as get:
+                await self.order_service.load_platform_certificates()
+                self.assertTrue(get.call_args.kwargs["headers"]["Authorization"].startswith("WECHATPAY2-SHA256-RSA2048"))
+            self.assertEqual(crypto.platform_serials(), ["5157F0"])
+
+        asyncio.run(check())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from app.core.config import settings
+from app.services.prompt_cache_service import PromptCacheService
+
+
+class TestPromptCacheService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = PromptCacheService()
+        # 单例，每个测试使用独立的数据库文件
+        self.cache.close()
+        self.cache.path = os.path.join(self.tmp_dir.name, "prompt_cache.sqlite3")
+        self.original = (settings.PROMPT_CACHE_HIT_PROBABILITY, settings.PROMPT_CACHE_VARIANTS,
+                         settings.PROMPT_CACHE_MAX_KEYS)
+
+    def tearDown(self):
+        settings.PROMPT_CACHE_HIT_PROBABILITY, settings.PROMPT_CACHE_VARIANTS, \
+            settings.PROMPT_CACHE_MAX_KEYS = self.original
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_make_key_normalizes_whitespace(self):
+        """测试空白不同的提示词得到相同的键"""
+        self.assertEqual(PromptCacheService.make_key("  生成 4小节\n  旋律 "), PromptCacheService.make_key("生成 4小节 旋律"))
+
+    def test_variants_and_probability(self):
+        """测试变体数量上限，以及概率为0时总是要求刷新"""
+        settings.PROMPT_CACHE_VARIANTS = 3
+        key = PromptCacheService.make_key("prompt")
+        for i in range(5):
+            self.cache.put(key, f"melody-{i}")
+        self.assertEqual(self.cache.count(key), 3)
+
+        settings.PROMPT_CACHE_HIT_PROBABILITY = 1.0
+        self.assertIn(self.cache.get(key), {"melody-2", "melody-3", "melody-4"})
+        settings.PROMPT_CACHE_HIT_PROBABILITY = 0.0
+        self.assertIsNone(self.cache.get(key))
+
+    def test_max_keys_and_persistence(self):
+        """测试键数量上限淘汰最久未写入的键，且重新打开后数据仍在"""
+        settings.PROMPT_CACHE_MAX_KEYS = 2
+        settings.PROMPT_CACHE_HIT_PROBABILITY = 1.0
+        for name in ("a", "b", "c"):
+            self.cache.put(PromptCacheService.make_key(name), name)
+
+        self.cache.close()
+        self.assertIsNone(self.cache.get(PromptCacheService.make_key("a")))
+        self.assertEqual(self.cache.get(PromptCacheService.make_key("c")), "c")
+
+
+if __name__ == '__main__':
+    unittest.main()
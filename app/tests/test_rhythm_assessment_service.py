@@ -0,0 +1,138 @@
+import io
+import json
+import time
+import unittest
+
+import numpy as np
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import rhythm_api
+from app.api.v1.auth_api import get_current_user
+from app.api.v1.schemas.response.pitch_response import RhythmScore
+from app.core.config import settings
+from app.services.rhythm_assessment_service import rhythm_assessment_service, TICKS_PER_BEAT
+
+# 负数表示休止符
+MEASURES = [[1, 0.5, 0.5, 1, 1], [0.5, 0.5, -1, 1, 0.5, 0.5], [2, 1, 1], [0.25, 0.25, 0.5, 1, -1, 1]]
+
+
+def make_score(measures, time_signature="4/4", tempo=100) -> RhythmScore:
+    return RhythmScore.model_validate({
+        "measures": [[{"notes": [{"duration": abs(d), "is_rest": d < 0} for d in measure]}] for measure in measures],
+        "time_signature": time_signature,
+        "tempo": tempo,
+        "is_correct": True,
+    })
+
+
+def clap(times, sample_rate=44100):
+    """合成拍手声：指数衰减的白噪声"""
+    rng = np.random.default_rng(1)
+    out = np.zeros(int((times[-1] + 1) * sample_rate), dtype=np.float32)
+    n = int(0.05 * sample_rate)
+    burst = rng.normal(0, 0.4, n) * np.exp(-np.arange(n) / sample_rate / 0.008)
+    for t in times:
+        start = int(t * sample_rate)
+        out[start:start + n] += burst[:len(out) - start]
+    return out + rng.normal(0, 0.002, len(out)).astype(np.float32)
+
+
+class TestRhythmAssessmentService(unittest.TestCase):
+    def setUp(self):
+        self.score = make_score(MEASURES * 4)
+        self.target = rhythm_assessment_service.targets(self.score)
+
+    def test_targets(self):
+        """测试按tick展开音符起点，休止符不计入"""
+        self.assertEqual(len(self.target.ticks), 72)
+        np.testing.assert_array_equal(self.target.ticks[:6], np.array([0, 1, 1.5, 2, 3, 4]) * TICKS_PER_BEAT)
+        self.assertAlmostEqual(self.target.onsets[4], 3 * 0.6)
+
+    def test_taps(self):
+        """测试任意起点的拍点对齐，定位晚拍、漏拍和多拍"""
+        rng = np.random.default_rng(2)
+        taps = 12.0 + self.target.onsets + rng.normal(0, 0.01, len(self.target.onsets))
+        taps[11] += 0.15
+        taps = np.delete(taps, 20)
+        taps = np.append(taps, taps[10] + 0.5)
+        result = rhythm_assessment_service.assess_taps(taps.tolist(), self.score)
+        self.assertEqual((result.missed_notes, result.extra_taps), (1, 1))
+        self.assertIsNone(result.notes[20].tapped_onset)
+        self.assertFalse(result.notes[11].correct)
+        self.assertAlmostEqual(result.notes[11].deviation, 0.15, delta=0.03)
+        self.assertEqual(sum(note.correct for note in result.notes), 70)
+        self.assertEqual(result.score, round(100 * 70 / 73))
+        self.assertAlmostEqual(result.notes[0].expected_onset, 12.0, delta=0.02)
+
+    def test_no_taps(self):
+        """测试没有拍点时全部记为漏拍"""
+        result = rhythm_assessment_service.assess_taps([], self.score)
+        self.assertEqual((result.score, result.missed_notes), (0, 72))
+        self.assertIsNone(result.mean_abs_deviation)
+
+    def test_audio(self):
+        """测试从拍手录音检测拍点，16小节在毫秒级完成"""
+        times = 1.3 + self.target.onsets + np.random.default_rng(3).normal(0, 0.015, len(self.target.onsets))
+        buffer = io.BytesIO()
+        sf.write(buffer, clap(times), 44100, format="WAV")
+        buffer.seek(0)
+        y = rhythm_assessment_service.decode(buffer)
+
+        started = time.perf_counter()
+        result = rhythm_assessment_service.assess(y, self.score)
+        elapsed = time.perf_counter() - started
+        self.assertEqual((result.score, result.missed_notes, result.extra_taps), (100, 0, 0))
+        self.assertLess(result.mean_abs_deviation, 0.03)
+        detected = np.array([note.tapped_onset for note in result.notes])
+        self.assertLess(np.abs(detected - times).max(), 0.02)
+        self.assertLess(elapsed, 0.5)
+
+    def test_endpoint(self):
+        """测试以JSON提交拍点或multipart上传录音，非法拍点、tempo和Content-Length返回400，超过大小限制（包括分块上传）返回413"""
+        app = FastAPI()
+        app.include_router(rhythm_api.router)
+        app.dependency_overrides[get_current_user] = lambda: None
+        client = TestClient(app)
+        score = make_score([[1, 1]], time_signature="2/4", tempo=60).model_dump(mode="json")
+
+        response = client.post("/rhythm/assess", json={"score": score, "taps": [3.0, 4.05]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["score"], 100)
+        self.assertEqual([note["tick"] for note in response.json()["notes"]], [0, TICKS_PER_BEAT])
+        self.assertEqual(client.post("/rhythm/assess", json={"score": score}).status_code, 400)
+        body = json.dumps({"score": score, "taps": [3.0, float("inf")]})
+        self.assertEqual(client.post("/rhythm/assess", content=body,
+                                     headers={"content-type": "application/json"}).status_code, 400)
+        zero_tempo = {**score, "tempo": 0}
+        self.assertEqual(client.post("/rhythm/assess", json={"score": zero_tempo, "taps": [3.0]}).status_code, 400)
+        body = json.dumps({"score": score, "taps": [3.0, 4.05]})
+        self.assertEqual(client.post("/rhythm/assess", content=body,
+                                     headers={"content-type": "application/json", "content-length": "2x"}).status_code, 400)
+
+        # multipart上传拍手录音，服务端检测拍点；缺少录音返回400
+        buffer = io.BytesIO()
+        sf.write(buffer, clap([1.0, 2.0]), 44100, format="WAV")
+        score_json = json.dumps(score)
+        response = client.post("/rhythm/assess", data={"score": score_json},
+                               files={"file": ("claps.wav", buffer.getvalue(), "audio/wav")})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["score"], 100)
+        self.assertEqual(client.post("/rhythm/assess", data={"score": score_json}).status_code, 400)
+
+        original = settings.RHYTHM_ASSESS_MAX_UPLOAD_BYTES
+        settings.RHYTHM_ASSESS_MAX_UPLOAD_BYTES = 1000
+        try:
+            self.assertEqual(client.post("/rhythm/assess", json={"score": score, "taps": [3.0] * 500}).status_code, 413)
+            # 没有Content-Length的分块上传在读取过程中拒绝
+            chunks = (b"x" * 100 for _ in range(50))
+            response = client.post("/rhythm/assess", content=chunks,
+                                   headers={"content-type": "multipart/form-data; boundary=b"})
+            self.assertEqual(response.status_code, 413)
+        finally:
+            settings.RHYTHM_ASSESS_MAX_UPLOAD_BYTES = original
+
+
+if __name__ == '__main__':
+    unittest.main()
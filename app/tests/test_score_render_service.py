@@ -0,0 +1,170 @@
+import io
+import unittest
+
+import numpy as np
+import soundfile as sf
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.api.v1.schemas.response.pitch_response import MelodyScorePitch, RhythmScore
+from app.core.config import settings
+from app.services.audio_render_service import audio_render_service
+from app.services.score_render_service import ScoreRenderService
+
+SAMPLE_RATE = 8000
+
+
+def melody_score(is_correct=True, tempo=120):
+    def note(number, duration, **kwargs):
+        return {"duration": duration, "pitch": {"id": number, "pitch_number": number, "name": str(number)}, **kwargs}
+
+    return MelodyScorePitch.model_validate({
+        "measures": [[
+            {"notes": [note(40, 1.0), note(44, 1.0, tied_to_next=True), note(44, 1.0), note(47, 1.0, is_rest=True)]},
+            {"notes": [note(47, 2.0), note(40, 2.0)]},
+        ]],
+        "time_signature": "4/4",
+        "tempo": tempo,
+        "is_correct": is_correct,
+    })
+
+
+def rhythm_score(time_signature="4/4"):
+    return RhythmScore.model_validate({
+        "measures": [[{"notes": [{"duration": 1.5, "is_dotted": True}, {"duration": 0.5},
+                                 {"duration": 1.0, "is_rest": True}, {"duration": 1.0}]}]],
+        "time_signature": time_signature,
+        "tempo": 60,
+        "is_correct": True,
+    })
+
+
+class TestScoreRenderService(unittest.TestCase):
+    def setUp(self):
+        self._old_render = (audio_render_service.sample_rate, audio_render_service._pcm, audio_render_service._sources)
+        audio_render_service.sample_rate = SAMPLE_RATE
+        audio_render_service._sources = {}
+        # 每个键位一个恒定幅度的信号，便于检查时间位置
+        audio_render_service._pcm = {number: np.full(SAMPLE_RATE * 2, 0.1 * (number - 39) / 13, dtype=np.float32)
+                                     for number in (40, 44, 47, 52)}
+        self._old_settings = (settings.SCORE_RENDER_CHUNK_SECONDS, settings.SCORE_RENDER_CACHE_BYTES,
+                              settings.SCORE_RENDER_CACHE_MAX_ITEM_BYTES)
+        settings.SCORE_RENDER_CHUNK_SECONDS = 0.5
+
+        self.service = ScoreRenderService()
+        self._old_state = (self.service._pcm, self.service._cache, self.service._cache_bytes)
+        self.service._pcm = {}
+        self.service._cache = type(self.service._cache)()
+        self.service._cache_bytes = 0
+
+    def tearDown(self):
+        (self.service._pcm, self.service._cache, self.service._cache_bytes) = self._old_state
+        (settings.SCORE_RENDER_CHUNK_SECONDS, settings.SCORE_RENDER_CACHE_BYTES,
+         settings.SCORE_RENDER_CACHE_MAX_ITEM_BYTES) = self._old_settings
+        (audio_render_service.sample_rate, audio_render_service._pcm, audio_render_service._sources) = self._old_render
+
+    def test_timeline(self):
+        """测试时间线：连音线合并同音、休止符、节奏题预备拍和节拍器强拍"""
+        timeline = self.service.timeline(melody_score())
+        self.assertEqual(timeline.notes, [(0.0, 1.0, 40), (1.0, 2.0, 44), (3.0, 1.0, None),
+                                          (4.0, 2.0, 47), (6.0, 2.0, 40)])
+        self.assertEqual(timeline.clicks, [])
+        self.assertEqual(timeline.beats, 8.0)
+
+        timeline = self.service.timeline(rhythm_score())
+        self.assertEqual(timeline.notes[0], (4.0, 1.5, settings.SCORE_RENDER_RHYTHM_PITCH))
+        self.assertEqual(len(timeline.clicks), 8)
+        self.assertEqual([accent for _, accent in timeline.clicks[:5]], [True, False, False, False, True])
+
+        # 6/8 按附点四分音符打拍，每小节两拍
+        timeline = self.service.timeline(rhythm_score("6/8"))
+        self.assertEqual(timeline.clicks[:3], [(0.0, True), (1.5, False), (3.0, True)])
+
+    def test_fingerprint(self):
+        """测试指纹只与发声内容有关"""
+        fingerprint = self.service.fingerprint(self.service.timeline(melody_score()), "wav")
+        self.assertEqual(self.service.fingerprint(self.service.timeline(melody_score(is_correct=False)), "wav"),
+                         fingerprint)
+        self.assertNotEqual(self.service.fingerprint(self.service.timeline(melody_score(tempo=90)), "wav"),
+                            fingerprint)
+        self.assertNotEqual(self.service.fingerprint(self.service.timeline(melody_score()), "opus"), fingerprint)
+
+    def test_wav_stream_and_cache(self):
+        """测试WAV按块输出、头部长度正确，完整结果写入缓存后直接返回"""
+        fingerprint, media_type, body = self.service.render(melody_score(), "wav")
+        self.assertEqual(media_type, "audio/wav")
+        chunks = list(body)
+        # 头部 + 每0.5秒一块（4秒乐谱，末音截断到时值+淡出）
+        self.assertGreater(len(chunks), 8)
+        data = b"".join(chunks)
+        samples, rate = sf.read(io.BytesIO(data), dtype="float32")
+        self.assertEqual(rate, SAMPLE_RATE)
+        self.assertGreaterEqual(len(samples), 4 * SAMPLE_RATE)
+        # 第二拍开始的是44（连音线合并后持续两拍），第四拍为休止符
+        note_44 = 0.7 * 0.1 * 5 / 13
+        self.assertAlmostEqual(float(samples[int(0.75 * SAMPLE_RATE)]), note_44, places=3)
+        self.assertAlmostEqual(float(samples[int(1.6 * SAMPLE_RATE)]), 0.0, places=3)
+
+        hits = self.service.hits
+        self.assertEqual(self.service.render(melody_score(is_correct=False), "wav"), (fingerprint, media_type, data))
+        self.assertEqual(self.service.hits, hits + 1)
+
+    def test_cache_limits(self):
+        """测试缓存按总字节数淘汰，超过单项上限的结果不缓存"""
+        _, _, body = self.service.render(melody_score(), "wav")
+        wav_bytes = len(b"".join(body))
+        _, _, body = self.service.render(rhythm_score(), "opus")
+        opus_bytes = len(b"".join(body))
+        self.assertEqual(self.service._cache_bytes, wav_bytes + opus_bytes)
+
+        settings.SCORE_RENDER_CACHE_BYTES = wav_bytes + opus_bytes
+        list(self.service.render(melody_score(tempo=90), "opus")[2])
+        # 最早的WAV被淘汰
+        self.assertEqual(len(self.service._cache), 2)
+        self.assertLessEqual(self.service._cache_bytes, settings.SCORE_RENDER_CACHE_BYTES)
+        self.assertIsInstance(self.service.render(rhythm_score(), "opus")[2], bytes)
+
+        settings.SCORE_RENDER_CACHE_MAX_ITEM_BYTES = wav_bytes - 1
+        list(self.service.render(melody_score(), "wav")[2])
+        self.assertNotIsInstance(self.service.render(melody_score(), "wav")[2], bytes)
+
+    def test_opus_stream(self):
+        """测试Opus边编码边输出，可以完整解码"""
+        _, media_type, body = self.service.render(rhythm_score(), "opus")
+        self.assertTrue(media_type.startswith("audio/ogg"))
+        chunks = [chunk for chunk in body]
+        self.assertGreater(len(chunks), 2)
+        samples, rate = sf.read(io.BytesIO(b"".join(chunks)), dtype="float32")
+        self.assertEqual(rate, 24000)
+        # 一小节预备拍 + 一小节节奏，速度60
+        self.assertAlmostEqual(len(samples) / rate, 8.0, delta=0.2)
+
+    def test_response(self):
+        """测试接口响应：首次流式返回，带指纹ETag；If-None-Match返回304；缺少采样返回错误"""
+        app = FastAPI()
+
+        @app.post("/render")
+        async def render(request: Request, score: MelodyScorePitch):
+            try:
+                return await self.service.response(request, score, "wav")
+            except ValueError:
+                return {"error": True}
+
+        client = TestClient(app)
+        payload = melody_score().model_dump(mode="json")
+        response = client.post("/render", json=payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "audio/wav")
+        etag = response.headers["etag"]
+
+        cached = client.post("/render", json=payload)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(client.post("/render", json=payload, headers={"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(client.post("/render", json=payload, headers={"If-None-Match": f"W/{etag}"}).status_code, 304)
+
+        payload["measures"][0][0]["notes"][0]["pitch"]["pitch_number"] = 41
+        self.assertEqual(client.post("/render", json=payload).json(), {"error": True})
+
+
+if __name__ == '__main__':
+    unittest.main()
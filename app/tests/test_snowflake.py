@@ -0,0 +1,82 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.snowflake import SnowflakeGenerator, SEQUENCE_MASK, SnowflakeId, lease_worker_id, _leases
+
+
+class TestSnowflakeGenerator(unittest.TestCase):
+    def test_unique_and_increasing(self):
+        """测试单线程生成的ID唯一且递增，超过一毫秒的序列号容量时进入下一毫秒"""
+        generator = SnowflakeGenerator(5)
+        ids = [generator.next_id() for _ in range(3 * (SEQUENCE_MASK + 1))]
+        self.assertEqual(ids, sorted(set(ids)))
+        parts = SnowflakeGenerator.parse(ids[-1])
+        self.assertEqual(parts["worker_id"], 5)
+        self.assertGreater(ids[-1], 0)
+        self.assertLess(ids[-1], 1 << 63)
+
+    def test_batch(self):
+        """测试批量生成与逐个生成混用时不重复"""
+        generator = SnowflakeGenerator(1)
+        ids = [generator.next_id()] + generator.next_ids(10000) + [generator.next_id()]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(len(ids), 10002)
+
+    def test_threads_and_workers(self):
+        """测试多线程、多个worker id同时生成时不重复"""
+        generators = [SnowflakeGenerator(1), SnowflakeGenerator(2)]
+        results = []
+
+        def run(generator):
+            results.append([generator.next_id() for _ in range(20000)])
+
+        threads = [threading.Thread(target=run, args=(generators[i % 2],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        ids = [i for chunk in results for i in chunk]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_lease_worker_id(self):
+        """测试同一主机上的进程租用到不同的worker id，范围用完时报错"""
+        with tempfile.TemporaryDirectory() as lock_dir:
+            leased = len(_leases)
+            try:
+                self.assertEqual([lease_worker_id(8, 2, lock_dir) for _ in range(2)], [8, 9])
+                with self.assertRaises(RuntimeError):
+                    lease_worker_id(8, 2, lock_dir)
+                with mock.patch.multiple(settings, SNOWFLAKE_WORKER_ID_BASE=8, SNOWFLAKE_WORKERS_PER_HOST=3,
+                                         SNOWFLAKE_LOCK_DIR=lock_dir):
+                    generator = SnowflakeGenerator()
+                    self.assertEqual(SnowflakeGenerator.parse(generator.next_id())["worker_id"], 10)
+            finally:
+                while len(_leases) > leased:
+                    os.close(_leases.pop())
+        with self.assertRaises(ValueError):
+            lease_worker_id(1020, 8, "/tmp")
+
+    def test_json_as_string(self):
+        """测试接口中的ID以字符串输出，输入接受数字或字符串"""
+        class Order(BaseModel):
+            trade_no: SnowflakeId
+
+        trade_no = SnowflakeGenerator(3).next_id()
+        self.assertGreater(trade_no, 2 ** 53)
+        self.assertEqual(Order(trade_no=str(trade_no)).trade_no, trade_no)
+        self.assertEqual(Order(trade_no=trade_no).model_dump_json(), f'{{"trade_no":"{trade_no}"}}')
+
+    def test_invalid_worker_id(self):
+        """测试worker id超出范围"""
+        with self.assertRaises(ValueError):
+            SnowflakeGenerator(1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import asyncio
+import unittest
+
+from starlette.requests import Request
+
+from app.utils.upload_util import UploadTooLargeError, limit_request_body
+
+
+def make_request(chunks, content_length=None):
+    """按块发送请求体的ASGI请求，返回 (request, 已读取的块数)"""
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    received = []
+
+    async def receive():
+        received.append(1)
+        return messages.pop(0)
+
+    return Request({"type": "http", "method": "POST", "headers": headers}, receive), received
+
+
+class TestLimitRequestBody(unittest.TestCase):
+    def test_within_limit(self):
+        """测试未超限时完整读取请求体"""
+        request, _ = make_request([b"a" * 10, b"b" * 10], content_length=20)
+        self.assertEqual(asyncio.run(limit_request_body(request, 20).body()), b"a" * 10 + b"b" * 10)
+
+    def test_content_length(self):
+        """测试 Content-Length 超限或无效时不读取请求体直接拒绝"""
+        request, received = make_request([b"a" * 30], content_length=30)
+        with self.assertRaises(UploadTooLargeError):
+            limit_request_body(request, 20)
+        self.assertEqual(len(received), 0)
+        for value in ("-1", "2x"):
+            with self.assertRaises(ValueError):
+                limit_request_body(make_request([b""], content_length=value)[0], 20)
+
+    def test_streaming(self):
+        """测试没有 Content-Length 时读取到超限的那一块即中止"""
+        request, received = make_request([b"a" * 10] * 10)
+        with self.assertRaises(UploadTooLargeError):
+            asyncio.run(limit_request_body(request, 25).body())
+        self.assertEqual(len(received), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import datetime
+import unittest
+
+from app.models.user import User, CombineUser
+from app.services.user_cache_service import UserCacheService
+
+
+class TestUserCacheService(unittest.TestCase):
+    def setUp(self):
+        self.cache = UserCacheService()
+        self.cache.clear()
+        self.cache.ttl = 30
+        self.cache.max_size = 2
+
+    def test_put_and_get_user(self):
+        """测试按 (user_id, iat) 缓存用户"""
+        self.cache.put_user(1, 100, User(id=1, wechat_openid="openid-1", is_active=True))
+        cached = self.cache.get_user(1, 100)
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached.wechat_openid, "openid-1")
+        self.assertIsNone(self.cache.get_user(1, 101))
+
+    def test_lru_eviction(self):
+        """测试超过容量时淘汰最久未使用的条目"""
+        for user_id in (1, 2):
+            self.cache.put_user(user_id, 0, User(id=user_id))
+        self.cache.get_user(1, 0)
+        self.cache.put_user(3, 0, User(id=3))
+        self.assertIsNotNone(self.cache.get_user(1, 0))
+        self.assertIsNone(self.cache.get_user(2, 0))
+
+    def test_invalidate_and_expired_vip(self):
+        """测试主动失效（包括缓存的token_version）和VIP过期视为未命中"""
+        combine_user = CombineUser(
+            id=1, wechat_openid="openid-1", is_active=True, is_super_admin=False,
+            vip_expire_date=datetime.datetime.now() + datetime.timedelta(days=1),
+        )
+        self.cache.put_combine_user(1, 0, combine_user)
+        self.cache.put_token_version(1, 0)
+        self.assertIsNotNone(self.cache.get_combine_user(1, 0))
+        self.assertEqual(self.cache.get_token_version(1), 0)
+        self.cache.invalidate_user(1)
+        self.assertIsNone(self.cache.get_combine_user(1, 0))
+        self.assertIsNone(self.cache.get_token_version(1))
+
+        combine_user.vip_expire_date = datetime.datetime.now() - datetime.timedelta(seconds=1)
+        self.cache.put_combine_user(1, 0, combine_user)
+        self.assertIsNone(self.cache.get_combine_user(1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import base64
+import datetime
+import json
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.x509.oid import NameOID
+
+from app.core.config import settings
+from app.core.wechatpay_crypto import WeChatPayCrypto, WeChatPayCryptoError
+
+API_V3_KEY = "0123456789abcdef0123456789abcdef"
+
+
+def write_key_and_cert(key_path, cert_path, serial):
+    """生成RSA私钥和自签名证书"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(serial)
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ))
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    return key
+
+
+class TestWeChatPayCrypto(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.key_path = os.path.join(self.tmp.name, "apiclient_key.pem")
+        self.cert_path = os.path.join(self.tmp.name, "apiclient_cert.pem")
+        self.platform_dir = os.path.join(self.tmp.name, "platform")
+        os.makedirs(self.platform_dir)
+        self.merchant_key = write_key_and_cert(self.key_path, self.cert_path, 0xABC123)
+        self.platform_key = write_key_and_cert(
+            os.path.join(self.platform_dir, "platform_key.pem.bak"),
+            os.path.join(self.platform_dir, "platform_cert.pem"),
+            0x5157F09EFDC096DE15EBE81A47057A72,
+        )
+        self.platform_serial = "5157F09EFDC096DE15EBE81A47057A72"
+        self.crypto = WeChatPayCrypto(self.key_path, self.cert_path, self.platform_dir, API_V3_KEY)
+        self._old_interval = settings.WECHAT_PAY_CERT_CHECK_INTERVAL
+        self._old_serial = settings.WECHAT_PAY_SERIAL_NO
+        settings.WECHAT_PAY_CERT_CHECK_INTERVAL = 0
+        settings.WECHAT_PAY_SERIAL_NO = ""
+
+    def tearDown(self):
+        settings.WECHAT_PAY_CERT_CHECK_INTERVAL = self._old_interval
+        settings.WECHAT_PAY_SERIAL_NO = self._old_serial
+        self.tmp.cleanup()
+
+    def platform_sign(self, message):
+        signature = self.platform_key.sign(message.encode(), padding.PKCS1v15(), hashes.SHA256())
+        return base64.b64encode(signature).decode()
+
+    def test_sign_with_cached_key(self):
+        """测试签名可用商户公钥验证，且私钥只加载一次"""
+        message = "POST\n/v3/pay/transactions/jsapi\n1700000000\nnonce\n{}\n"
+        signature = self.crypto.sign(message)
+        self.merchant_key.public_key().verify(
+            base64.b64decode(signature), message.encode(), padding.PKCS1v15(), hashes.SHA256()
+        )
+        loaded = self.crypto._private_key
+        self.crypto.sign(message)
+        self.assertIs(self.crypto._private_key, loaded)
+        self.assertEqual(self.crypto.serial_no, "ABC123")
+
+    def test_reload_on_file_change(self):
+        """测试私钥文件更新后自动重新加载"""
+        self.crypto.sign("a")
+        new_key = write_key_and_cert(self.key_path, self.cert_path, 0xDEF456)
+        os.utime(self.key_path, (time.time() + 10, time.time() + 10))
+        os.utime(self.cert_path, (time.time() + 10, time.time() + 10))
+        signature = self.crypto.sign("b")
+        new_key.public_key().verify(base64.b64decode(signature), b"b", padding.PKCS1v15(), hashes.SHA256())
+        self.assertEqual(self.crypto.serial_no, "DEF456")
+
+    def test_concurrent_sign(self):
+        """测试多线程同时签名"""
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            signatures = list(pool.map(self.crypto.sign, ["same"] * 32))
+        self.assertEqual(len(set(signatures)), 1)
+
+    def test_verify_notification(self):
+        """测试回调通知验签：正确签名通过，篡改、过期、未知证书被拒绝"""
+        body = '{"id":"EV-1"}'
+        timestamp = str(int(time.time()))
+        headers = {
+            "Wechatpay-Timestamp": timestamp,
+            "Wechatpay-Nonce": "nonce",
+            "Wechatpay-Serial": self.platform_serial,
+            "Wechatpay-Signature": self.platform_sign(f"{timestamp}\nnonce\n{body}\n"),
+        }
+        self.assertTrue(self.crypto.verify_notification(headers, body))
+        self.assertFalse(self.crypto.verify_notification(headers, body.replace("1", "2")))
+        self.assertFalse(self.crypto.verify_notification({**headers, "Wechatpay-Serial": "00"}, body))
+        self.assertFalse(self.crypto.verify_notification({k: v for k, v in headers.items() if k != "Wechatpay-Nonce"}, body))
+
+        old = str(int(time.time()) - settings.WECHAT_PAY_NOTIFY_TOLERANCE - 60)
+        stale = {
+            **headers,
+            "Wechatpay-Timestamp": old,
+            "Wechatpay-Signature": self.platform_sign(f"{old}\nnonce\n{body}\n"),
+        }
+        self.assertFalse(self.crypto.verify_notification(stale, body))
+
+    def test_save_platform_certificate(self):
+        """测试保存下载的平台证书后按序列号加载"""
+        self.assertEqual(self.crypto.platform_serials(), [self.platform_serial])
+        cert_path = os.path.join(self.tmp.name, "new_cert.pem")
+        write_key_and_cert(os.path.join(self.tmp.name, "new_key.pem"), cert_path, 0x7A)
+        with open(cert_path, "rb") as f:
+            self.assertEqual(self.crypto.save_platform_certificate(f.read()), "7A")
+        self.assertEqual(self.crypto.platform_serials(), sorted([self.platform_serial, "7A"]))
+        self.assertEqual(sorted(os.listdir(self.platform_dir)), ["7A.pem", "platform_cert.pem", "platform_key.pem.bak"])
+        with self.assertRaises(ValueError):
+            self.crypto.save_platform_certificate(b"not a certificate")
+
+    def test_decrypt_resource(self):
+        """测试解密回调通知中的resource"""
+        transaction = {"out_trade_no": "1003", "trade_state": "SUCCESS"}
+        nonce = "abcdefghijkl"
+        ciphertext = AESGCM(API_V3_KEY.encode()).encrypt(
+            nonce.encode(), json.dumps(transaction).encode(), b"transaction"
+        )
+        resource = {
+            "algorithm": "AEAD_AES_256_GCM",
+            "ciphertext": base64.b64encode(ciphertext).decode(),
+            "associated_data": "transaction",
+            "nonce": nonce,
+        }
+        self.assertEqual(self.crypto.decrypt_resource(resource), transaction)
+        with self.assertRaises(WeChatPayCryptoError):
+            self.crypto.decrypt_resource({**resource, "associated_data": "other"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+钢琴采样参考特征提取工具
+
+并行读取 origin 目录下的无损WAV，为每个键位计算参考特征，写入一个未压缩的 .npz，
+服务启动时由 app.services.audio_feature_service 内存映射后按键位查询：
+    f0 / f0_nominal  实测基频与十二平均律标准频率（Hz）
+    f0_track         逐帧基频（Hz，静音帧为NaN）
+    harmonics        前 HARMONICS 个谐波的相对幅度（最大值为1）
+    onset_envelope   逐帧起音强度
+    rms              逐帧RMS
+
+用法:
+    python -m app.utils.audio_feature_builder
+    python -m app.utils.audio_feature_builder --source app/static/audio/origin --output app/data/piano_features.npz --workers 4
+"""
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import librosa
+import numpy as np
+
+from app.core import music_math
+from app.core.config import settings
+from app.services.audio_asset_service import TONE_FILE_PATTERN
+
+HARMONICS = 16
+YIN_FRAME_LENGTH = 4096
+# 计算谐波谱时跳过起音，取其后的稳定段（秒）
+STEADY_START_SECONDS = 0.05
+STEADY_SECONDS = 0.5
+REFINE_MIN_HZ = 500.0  # 高于该频率时用频谱峰值细化基频
+SILENCE_RATIO = 0.05  # RMS低于最大值的该比例视为静音帧
+
+
+def frame_count(sample_rate: int, hop_length: int, seconds: float) -> int:
+    return 1 + int(seconds * sample_rate) // hop_length
+
+
+def _steady_spectrum(y: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, float]:
+    """稳定段的幅度谱（补零4倍）和每个频点的宽度（Hz）"""
+    start = int(STEADY_START_SECONDS * sample_rate)
+    segment = y[start:start + int(STEADY_SECONDS * sample_rate)]
+    n_fft = 1 << int(np.ceil(np.log2(len(segment) * 4)))
+    return np.abs(np.fft.rfft(segment * np.hanning(len(segment)), n=n_fft)), sample_rate / n_fft
+
+
+def _refine_f0(spectrum: np.ndarray, bin_hz: float, f0: float) -> float:
+    """
+    用频谱峰值细化高音区基频
+
+    高音的周期只有几个采样点，YIN的插值误差可达几十音分；在估计值 ±3% 内取频谱峰，
+    对数幅度做抛物线插值。
+    """
+    lo = max(1, int(f0 * 0.97 / bin_hz))
+    hi = min(len(spectrum) - 1, int(np.ceil(f0 * 1.03 / bin_hz)))
+    if hi <= lo:
+        return f0
+    peak = lo + int(np.argmax(spectrum[lo:hi + 1]))
+    alpha, beta, gamma = np.log(spectrum[peak - 1:peak + 2] + 1e-12)
+    denominator = alpha - 2 * beta + gamma
+    shift = 0.5 * (alpha - gamma) / denominator if denominator != 0 else 0.0
+    return float((peak + shift) * bin_hz)
+
+
+def _harmonic_profile(spectrum: np.ndarray, bin_hz: float, sample_rate: int, f0: float) -> np.ndarray:
+    profile = np.zeros(HARMONICS, dtype=np.float32)
+    for k in range(1, HARMONICS + 1):
+        center = k * f0
+        if center >= sample_rate / 2:
+            break
+        # 在 ±3% 范围内取峰值，容忍钢琴弦的非谐性
+        lo = max(0, int(center * 0.97 / bin_hz))
+        hi = min(len(spectrum), int(np.ceil(center * 1.03 / bin_hz)) + 1)
+        profile[k - 1] = spectrum[lo:hi].max()
+    peak = profile.max()
+    return profile / peak if peak > 0 else profile
+
+
+def extract(path: str, pitch_number: int, sample_rate: int, hop_length: int, seconds: float) -> Dict[str, np.ndarray]:
+    """提取一个采样的参考特征（在子进程中执行）"""
+    y, _ = librosa.load(path, sr=sample_rate, mono=True, duration=seconds)
+    y = librosa.util.fix_length(y.astype(np.float32), size=int(seconds * sample_rate))
+    frames = frame_count(sample_rate, hop_length, seconds)
+
+    rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=hop_length)[0][:frames]
+    onset_envelope = librosa.onset.onset_strength(y=y, sr=sample_rate, hop_length=hop_length)[:frames]
+
+    # 参考采样的音高已知，只在标准频率上下半个八度内搜索，避免八度错误
+    nominal = music_math.key_to_hz(pitch_number)
+    f0_track = librosa.yin(y, fmin=nominal / 1.5, fmax=min(nominal * 1.5, sample_rate / 2 - 1), sr=sample_rate,
+                           frame_length=YIN_FRAME_LENGTH, hop_length=hop_length)[:frames].astype(np.float32)
+    f0_track[rms < rms.max() * SILENCE_RATIO] = np.nan
+    f0 = float(np.nanmedian(f0_track)) if np.isfinite(f0_track).any() else nominal
+    spectrum, bin_hz = _steady_spectrum(y, sample_rate)
+    if f0 >= REFINE_MIN_HZ:
+        f0 = _refine_f0(spectrum, bin_hz, f0)
+
+    return {
+        "f0": np.float32(f0),
+        "f0_track": f0_track,
+        "harmonics": _harmonic_profile(spectrum, bin_hz, sample_rate, f0),
+        "onset_envelope": onset_envelope.astype(np.float32),
+        "rms": rms.astype(np.float32),
+    }
+
+
+def _extract_job(job: Tuple[str, int, int, int, float]) -> Dict[str, np.ndarray]:
+    return extract(*job)
+
+
+def build(source_dir: str, output_path: str, workers: Optional[int] = None, sample_rate: Optional[int] = None,
+          hop_length: Optional[int] = None, seconds: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """提取全部采样的特征并写入 output_path，返回写入的数组"""
+    sample_rate = sample_rate or settings.AUDIO_FEATURE_SAMPLE_RATE
+    hop_length = hop_length or settings.AUDIO_FEATURE_HOP_LENGTH
+    seconds = seconds or settings.AUDIO_FEATURE_SECONDS
+    sources: Dict[int, str] = {}
+    for filename in sorted(os.listdir(source_dir)):
+        match = TONE_FILE_PATTERN.match(filename)
+        if match and filename.endswith(".wav"):
+            sources[int(match.group(1))] = os.path.join(source_dir, filename)
+    numbers = sorted(sources)
+    if not numbers:
+        raise ValueError(f"No tone_*.wav found in {source_dir}")
+
+    jobs = [(sources[number], number, sample_rate, hop_length, seconds) for number in numbers]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        features = list(executor.map(_extract_job, jobs))
+
+    digests = []
+    for number in numbers:
+        with open(sources[number], "rb") as f:
+            digests.append(hashlib.sha256(f.read()).hexdigest()[:16])
+
+    arrays = {
+        "pitch_numbers": np.array(numbers, dtype=np.int16),
+        "f0_nominal": music_math.key_to_hz(np.array(numbers)).astype(np.float32),
+        "source_digests": np.array(digests),
+        "sample_rate": np.int32(sample_rate),
+        "hop_length": np.int32(hop_length),
+    }
+    for key in ("f0", "f0_track", "harmonics", "onset_envelope", "rms"):
+        arrays[key] = np.stack([feature[key] for feature in features])
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    # 不压缩，服务端才能直接内存映射每个数组；先写临时文件再替换，运行中的进程不会读到半个文件
+    tmp_path = f"{output_path}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, output_path)
+    return arrays
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="提取钢琴采样的参考音频特征")
+    parser.add_argument("--source", default=os.path.join(settings.AUDIO_ASSET_DIR, "origin"), help="无损WAV目录")
+    parser.add_argument("--output", default=settings.AUDIO_FEATURE_PATH, help="输出的 .npz 路径")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数，默认CPU核数")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    arrays = build(args.source, args.output, args.workers)
+    cents = music_math.cents(arrays["f0"], arrays["f0_nominal"])
+    print(f"{len(arrays['pitch_numbers'])} samples, {arrays['f0_track'].shape[1]} frames each, "
+          f"tuning offset {np.median(cents):+.1f} cents (max {np.abs(cents).max():.1f})")
+    print(f"Done in {time.monotonic() - started:.1f}s, features: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+钢琴采样包构建工具（替代 doc/compress.sh）
+
+把 origin 目录下的无损WAV并行转码为多个码率的MP3，每个码率再打成一个采样包，
+同时生成带哈希的 manifest.json（含每个采样在包内的偏移），服务端据此按网络类型下发采样包。
+
+用法:
+    python -m app.utils.audio_pack_builder
+    python -m app.utils.audio_pack_builder --profiles low:32:22050,high:128:44100 --workers 4 --seconds 4
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from math import gcd
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+from app.core.config import settings
+from app.services.audio_asset_service import TONE_FILE_PATTERN
+
+MANIFEST_NAME = "manifest.json"
+FADE_OUT_SECONDS = 0.05
+
+
+@dataclass(frozen=True)
+class PackProfile:
+    name: str
+    bitrate: int  # kbps
+    sample_rate: int
+
+
+def parse_profiles(spec: str) -> List[PackProfile]:
+    """解析 "名称:码率kbps:采样率" 逗号分隔的配置"""
+    profiles = []
+    for item in spec.split(","):
+        name, bitrate, sample_rate = item.strip().split(":")
+        profiles.append(PackProfile(name=name, bitrate=int(bitrate), sample_rate=int(sample_rate)))
+    return profiles
+
+
+def _compression_level(profile: PackProfile) -> float:
+    """libsndfile按压缩级别在码率上下限之间取CBR码率：MPEG-1为32~320kbps，MPEG-2为8~160kbps"""
+    high, low = (320, 32) if profile.sample_rate >= 32000 else (160, 8)
+    if not low <= profile.bitrate <= high:
+        raise ValueError(f"Unsupported bitrate {profile.bitrate}k at {profile.sample_rate}Hz")
+    return (high - profile.bitrate) / (high - low)
+
+
+def transcode(path: str, profile: PackProfile, seconds: Optional[float] = None) -> bytes:
+    """把一个WAV转码为单声道CBR MP3（在子进程中执行）"""
+    data, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+    pcm = data.mean(axis=1)
+    if sample_rate != profile.sample_rate:
+        divisor = gcd(sample_rate, profile.sample_rate)
+        pcm = resample_poly(pcm, profile.sample_rate // divisor, sample_rate // divisor).astype(np.float32)
+    if seconds:
+        pcm = pcm[:int(seconds * profile.sample_rate)].copy()
+        fade = min(len(pcm), int(FADE_OUT_SECONDS * profile.sample_rate))
+        if fade:
+            pcm[-fade:] *= np.linspace(1.0, 0.0, fade, dtype=np.float32)
+    buffer = io.BytesIO()
+    sf.write(buffer, pcm, profile.sample_rate, format="MP3", subtype="MPEG_LAYER_III",
+             compression_level=_compression_level(profile), bitrate_mode="CONSTANT")
+    return buffer.getvalue()
+
+
+def _transcode_job(job: Tuple[str, PackProfile, Optional[float]]) -> bytes:
+    return transcode(*job)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build(source_dir: str, output_dir: str, profiles: List[PackProfile], workers: Optional[int] = None,
+          seconds: Optional[float] = None) -> dict:
+    """
+    转码并打包
+
+    输出:
+        {output_dir}/{profile}/tone_*.mp3   各码率的单个采样
+        {output_dir}/{profile}.{digest}.pack 各码率的采样包（MP3直接首尾相接）
+        {output_dir}/manifest.json          源文件哈希、每个包的哈希和偏移索引
+    Returns:
+        manifest 内容
+    """
+    sources: Dict[int, str] = {}
+    for filename in sorted(os.listdir(source_dir)):
+        match = TONE_FILE_PATTERN.match(filename)
+        if match and filename.endswith(".wav"):
+            sources[int(match.group(1))] = filename
+    numbers = sorted(sources)
+    if not numbers:
+        raise ValueError(f"No tone_*.wav found in {source_dir}")
+
+    jobs = [(os.path.join(source_dir, sources[number]), profile, seconds) for profile in profiles for number in numbers]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        encoded = list(executor.map(_transcode_job, jobs, chunksize=4))
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {
+        "built_at": int(time.time()),
+        "seconds": seconds,
+        "sources": {},
+        "packs": {},
+    }
+    for number in numbers:
+        with open(os.path.join(source_dir, sources[number]), "rb") as f:
+            manifest["sources"][sources[number]] = _sha256(f.read())[:16]
+
+    keep = {MANIFEST_NAME}
+    for profile_index, profile in enumerate(profiles):
+        profile_dir = os.path.join(output_dir, profile.name)
+        os.makedirs(profile_dir, exist_ok=True)
+        entries = []
+        offset = 0
+        parts = []
+        for number_index, number in enumerate(numbers):
+            data = encoded[profile_index * len(numbers) + number_index]
+            filename = os.path.splitext(sources[number])[0] + ".mp3"
+            _write_atomic(os.path.join(profile_dir, filename), data)
+            entries.append({
+                "pitch_number": number,
+                "filename": filename,
+                "offset": offset,
+                "length": len(data),
+                "digest": _sha256(data)[:16],
+            })
+            parts.append(data)
+            offset += len(data)
+        pack = b"".join(parts)
+        digest = _sha256(pack)[:16]
+        pack_name = f"{profile.name}.{digest}.pack"
+        _write_atomic(os.path.join(output_dir, pack_name), pack)
+        keep.update({pack_name, profile.name})
+        manifest["packs"][profile.name] = {
+            "bitrate": profile.bitrate,
+            "sample_rate": profile.sample_rate,
+            "file": pack_name,
+            "digest": digest,
+            "size": len(pack),
+            "media_type": "audio/mpeg",
+            "entries": entries,
+        }
+
+    # manifest最后写入，服务端不会读到引用了未写完采样包的索引
+    _write_atomic(os.path.join(output_dir, MANIFEST_NAME),
+                  json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+    for name in os.listdir(output_dir):
+        if name.endswith(".pack") and name not in keep:
+            os.remove(os.path.join(output_dir, name))
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="转码钢琴采样并生成多码率采样包")
+    parser.add_argument("--source", default=os.path.join(settings.AUDIO_ASSET_DIR, "origin"), help="无损WAV目录")
+    parser.add_argument("--output", default=settings.AUDIO_PACK_DIR, help="输出目录")
+    parser.add_argument("--profiles", default=settings.AUDIO_PACK_PROFILES, help="名称:码率kbps:采样率，逗号分隔")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数，默认CPU核数")
+    parser.add_argument("--seconds", type=float, default=None, help="每个采样截取的时长（秒），默认完整时长")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    manifest = build(args.source, args.output, parse_profiles(args.profiles), args.workers, args.seconds)
+    for name, pack in manifest["packs"].items():
+        print(f"{name}: {len(pack['entries'])} samples, {pack['bitrate']}k, {pack['size']} bytes -> {pack['file']}")
+    print(f"Done in {time.monotonic() - started:.1f}s, manifest: {os.path.join(args.output, MANIFEST_NAME)}")
+
+
+if __name__ == "__main__":
+    main()
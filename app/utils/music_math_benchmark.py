@@ -0,0 +1,116 @@
+"""
+音高换算性能对比
+
+把 app.core.music_math 的向量化换算与原先各服务里逐个调用的标量实现做对比，
+同时核对两者结果一致。
+
+用法:
+    python -m app.utils.music_math_benchmark
+    python -m app.utils.music_math_benchmark --count 100000 --repeat 5
+"""
+import argparse
+import time
+from typing import Callable, List, Optional, Tuple
+
+import librosa
+import numpy as np
+
+from app.core import music_math
+
+_LEGACY_NOTES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+
+
+def legacy_hz_to_note(frequency: float) -> str:
+    """原 FastAudioProcessor.hz_to_note / FastTunerService.freq_to_note_name"""
+    if frequency <= 0:
+        return ""
+    n = round(12 * np.log2(frequency / 440.0))
+    return f"{_LEGACY_NOTES[(n + 9) % 12]}{4 + (n + 9) // 12}"
+
+
+def legacy_note_to_hz(note: str) -> float:
+    """原 FastAudioProcessor.note_to_hz"""
+    if not note:
+        return 0.0
+    note_name = note[0]
+    if len(note) > 1 and note[1] == "#":
+        note_name += "#"
+        octave = int(note[2:])
+    else:
+        octave = int(note[1:])
+    n = _LEGACY_NOTES.index(note_name) - 9 + 12 * (octave - 4)
+    return 440.0 * (2.0 ** (n / 12.0))
+
+
+def legacy_nearest_key(frequency: float, names: List[str]) -> Tuple[int, float]:
+    """原 get_nearest_piano_pitch：与88个音高逐个比较音分"""
+    best_key, best_cents = 0, float("inf")
+    for key, name in enumerate(names, start=1):
+        cents_diff = abs(1200 * np.log2(frequency / legacy_note_to_hz(name)))
+        if cents_diff < best_cents:
+            best_key, best_cents = key, cents_diff
+    return best_key, best_cents
+
+
+def _timed(function: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run(count: int = 20000, repeat: int = 3, seed: int = 0) -> List[Tuple[str, float, float]]:
+    """
+    Returns:
+        [(换算名称, 标量实现耗时, 向量化耗时)]，耗时为秒
+    """
+    rng = np.random.default_rng(seed)
+    frequencies = np.exp(rng.uniform(np.log(27.5), np.log(4186.0), count))
+    keys = rng.integers(music_math.PIANO_KEY_MIN, music_math.PIANO_KEY_MAX + 1, count)
+    names = [str(name) for name in music_math.MIDI_NOTE_NAMES[keys + music_math.PIANO_KEY_OFFSET]]
+    piano_names = [str(name) for name in music_math.MIDI_NOTE_NAMES[21:109]]
+    nearest_count = max(1, count // 20)  # 逐个比较88个音高太慢，只取一部分
+
+    cases = [
+        ("hz_to_note", lambda: [legacy_hz_to_note(f) for f in frequencies],
+         lambda: music_math.hz_to_note(frequencies)),
+        ("hz_to_note (librosa)", lambda: [librosa.hz_to_note(f, unicode=False) for f in frequencies],
+         lambda: music_math.hz_to_note(frequencies)),
+        ("note_to_hz", lambda: [legacy_note_to_hz(name) for name in names],
+         lambda: music_math.note_to_hz(names)),
+        ("note_to_hz (librosa)", lambda: [librosa.note_to_hz(name) for name in names],
+         lambda: music_math.note_to_hz(names)),
+        (f"nearest_key x{nearest_count}",
+         lambda: [legacy_nearest_key(f, piano_names) for f in frequencies[:nearest_count]],
+         lambda: music_math.nearest_key(frequencies[:nearest_count])),
+    ]
+    results = []
+    for name, scalar, vectorized in cases:
+        scalar_seconds, expected = _timed(scalar, 1 if name.startswith("nearest") else repeat)
+        vector_seconds, actual = _timed(vectorized, repeat)
+        if name.startswith("hz_to_note"):
+            assert list(actual) == [str(note) for note in expected], name
+        elif name.startswith("note_to_hz"):
+            np.testing.assert_allclose(actual, expected, rtol=1e-9, err_msg=name)
+        else:
+            np.testing.assert_array_equal(actual[0], [key for key, _ in expected], err_msg=name)
+        results.append((name, scalar_seconds, vector_seconds))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="音高换算：标量实现与向量化实现的耗时对比")
+    parser.add_argument("--count", type=int, default=20000, help="每项换算的数据量")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数，取最快一次")
+    args = parser.parse_args(argv)
+
+    print(f"{'conversion':<24}{'scalar (ms)':>14}{'vectorized (ms)':>18}{'speedup':>10}")
+    for name, scalar_seconds, vector_seconds in run(args.count, args.repeat):
+        print(f"{name:<24}{scalar_seconds * 1000:>14.2f}{vector_seconds * 1000:>18.2f}"
+              f"{scalar_seconds / vector_seconds:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+from starlette.requests import Request
+from starlette.types import Message
+
+
+class UploadTooLargeError(Exception):
+    """请求体超过允许的大小"""
+
+
+def limit_request_body(request: Request, max_bytes: int) -> Request:
+    """
+    返回一个限制请求体大小的Request，后续用它读取 form()/body()
+
+    Content-Length 超限时直接拒绝；分块上传没有 Content-Length，读取过程中累计字节数，
+    超过 max_bytes 立即中止，不会把整个请求体读完。
+
+    Raises:
+        ValueError: Content-Length 不是非负整数
+        UploadTooLargeError: Content-Length 超过 max_bytes（读取时超限同样抛出）
+    """
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        declared = int(content_length)
+        if declared < 0:
+            raise ValueError(f"Invalid Content-Length {content_length}")
+        if declared > max_bytes:
+            raise UploadTooLargeError(f"Request body of {declared} bytes exceeds {max_bytes}")
+
+    received = 0
+
+    async def receive() -> Message:
+        nonlocal received
+        message = await request.receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > max_bytes:
+                raise UploadTooLargeError(f"Request body exceeds {max_bytes} bytes")
+        return message
+
+    return Request(request.scope, receive)
@@ -1,6 +1,7 @@
+import asyncio
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
@@ -8,17 +9,33 @@ from sqlalchemy.ext.asyncio import AsyncEngine
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 
 from app.core.config import settings
-from app.db.database import engine, get_db, Base
+from app.db.database import engine, get_db, Base, AsyncSessionLocal
+from app.db.engine import pool_metrics
 from app.middleware.logging import LoggingMiddleware
 from app.api.v1 import auth_api, order_api, vip_api, piano_pitch_api, rhythm_api, melody_api, tuner_api, \
     payment_api, exam_api
 from app.db.init_data import init_vip_levels, init_pitches, init_intervals, init_pitch_chord
 from app.core.logger import logger
+from app.core.http_client import http_client
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 # 导入所有模型以确保它们被注册到Base.metadata
 from app.services.pitch_service import pitch_service
 from app.services.vip_service import vip_service
+from app.services.ai_melody_service import ai_melody_service
+from app.services.prompt_cache_service import prompt_cache_service
+from app.services.melody_bank_service import melody_bank_service
+from app.services.job_queue_service import job_queue_service
+from app.services.audio_asset_service import audio_asset_service
+from app.services.audio_render_service import audio_render_service
+from app.services.audio_pack_service import audio_pack_service
+from app.services.asset_catalog_service import asset_catalog_service
+from app.services.audio_feature_service import audio_feature_service
+
+STATIC_DIR = Path(__file__).parent / "app" / "static"
+asset_catalog_service.register("audio", str(STATIC_DIR / "audio"))
+asset_catalog_service.register("compress", str(STATIC_DIR / "compress"))
 
 async def create_tables(engine: AsyncEngine):
     async with engine.begin() as conn:
@@ -69,10 +86,45 @@ async def lifespan(app: FastAPI):
         logger.error("Failed to initialize application", exc_info=True)
         raise e
 
+    if settings.WECHAT_PAY_VERIFY_NOTIFY:
+        logger.info("Loading WeChat Pay platform certificates...")
+        await order_api.order_service.load_platform_certificates()
+
+    logger.info("Loading audio assets...")
+    audio_asset_service.load()
+    audio_pack_service.load()
+    audio_feature_service.load()
+    logger.info("Scanning asset catalogs...")
+    await asyncio.to_thread(asset_catalog_service.scan_all)
+    if settings.AUDIO_RENDER_PRELOAD:
+        await asyncio.to_thread(audio_render_service.preload)
+
+    melody_bank_task = None
+    if settings.MELODY_BANK_ENABLED:
+        logger.info("Starting melody bank worker...")
+        melody_bank_task = ai_melody_service.start_bank_worker()
+
+    job_tasks = []
+    if settings.JOB_QUEUE_ENABLED:
+        logger.info("Starting job queue workers...")
+        job_tasks = job_queue_service.start(AsyncSessionLocal)
+
+    catalog_task = None
+    if settings.ASSET_CATALOG_POLL_INTERVAL > 0:
+        catalog_task = asset_catalog_service.start_poller()
+
     yield
 
     # 关闭时执行
     logger.info("Shutting down application...")
+    background_tasks = job_tasks + [task for task in (melody_bank_task, catalog_task) if task is not None]
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await http_client.close()
+    prompt_cache_service.close()
+    melody_bank_service.close()
+    await engine.dispose()
 
 
 app = FastAPI(
@@ -121,35 +173,53 @@ async def root():
     }
 
 
+@app.get("/health/db")
+async def db_pool_health():
+    """数据库连接池指标"""
+    return [metrics.snapshot() for metrics in pool_metrics.values()]
+
+
+@app.get("/health/audio")
+async def audio_asset_health():
+    """钢琴采样按键位的命中统计"""
+    return audio_asset_service.hit_stats()
+
+
 @app.get("/hello/{name}")
 async def say_hello(name: str):
     return {"message": f"Hello {name}"}
 
-@app.get("/files/audio")
-async def list_files():
-    import os
-    from pathlib import Path
 
-    static_dir = Path(__file__).parent / "app" / "static" / "audio"
-    print(f"Static dir: {static_dir}")
-
-    if not static_dir.exists():
-        raise HTTPException(status_code=500, detail=f"Static dir not found: {static_dir}")
+def catalog_response(request: Request, name: str, offset: int, limit: int):
+    """返回内存中的目录清单，If-None-Match命中时返回304"""
+    try:
+        body, etag = asset_catalog_service.page(name, offset, limit)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Static dir not found: {str(e)}")
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content=body, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
-    return os.listdir(static_dir)
 
-@app.get("/files/audio/compress")
-async def list_compress_files():
-    import os
-    from pathlib import Path
+@app.get("/files/audio")
+async def list_files(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1),
+):
+    """钢琴采样目录清单（按文件名排序，含大小、哈希和时长）"""
+    return catalog_response(request, "audio", offset, limit)
 
-    static_dir = Path(__file__).parent / "app" / "static" / "compress"
-    print(f"Static dir: {static_dir}")
 
-    if not static_dir.exists():
-        raise HTTPException(status_code=500, detail=f"Static dir not found: {static_dir}")
+@app.get("/files/audio/compress")
+async def list_compress_files(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1),
+):
+    """压缩音频目录清单"""
+    return catalog_response(request, "compress", offset, limit)
 
-    return os.listdir(static_dir)
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 